@@ -1,15 +1,15 @@
+import json
 import logging
 import os
 import time
 from collections import OrderedDict
-from datetime import date, datetime
+from datetime import date, datetime, timezone
 from functools import wraps
 from logging.handlers import RotatingFileHandler
 
-import certifi
-import pandas as pd
 from flask import (
     Flask,
+    Response,
     flash,
     jsonify,
     make_response,
@@ -18,18 +18,25 @@ from flask import (
     request,
     send_from_directory,
     session,
+    stream_with_context,
     url_for,
 )
-from pymongo import MongoClient
 from pymongo.errors import OperationFailure
 from werkzeug.utils import secure_filename
 
 import modules.preferences.preferences as pref
 from flask_session import Session
+from modules import (
+    match_jobs,
+    mongo_pool,
+    prematch_changes,
+    preview,
+    upload_cache,
+)
 from modules.fuse_date import FuseDate
-from modules.process_attachment import ProcessAttachment
+from modules.process_attachment import STATUSES, ProcessAttachment
 from modules.reminders import Reminders
-from modules.se_select import se_select
+from modules.se_select import se_rematch, se_select
 
 # pylint: disable=logging-fstring-interpolation
 
@@ -74,6 +81,10 @@ ALLOWED_EXTENSIONS = {"csv"}
 # List of admin users
 admin_users = ["admin"]
 
+# Production cluster and database used for the fuse date
+PRODUCTION_MONGOHOST = "cluster0.jzvod.mongodb.net"
+PRODUCTION_MONGODB = "fuse-cwa-se"
+
 
 def mongodb_setup_un():
     """
@@ -88,26 +99,16 @@ def mongodb_setup_un():
         user_db = "fuse-test"
 
     # Setup the MongoDB connection
-    # if mode exists in the session, get the value of mode
     if mode == "debug":
         app.logger.info("Debug mode database connection...")
-        Mongo_Connection_URI = MongoClient(
-            f"mongodb+srv://{pref.MONGOUN}:{pref.MONGO_BEARER}@{pref.MONGOHOST}/{user_db}"
-            f"?retryWrites=true&w=majority&tlsCAFile={certifi.where()}"
-            f"&serverSelectionTimeoutMS=500"
-        )
     else:
         app.logger.info("Production mode database connection...")
-        Mongo_Connection_URI = MongoClient(
-            f"mongodb+srv://{pref.MONGOUN}:{pref.MONGO_BEARER}@{pref.MONGOHOST}/{user_db}"
-            f"?retryWrites=true&w=majority&tlsCAFile={certifi.where()}"
-            f"&serverSelectionTimeoutMS=500"
-        )
 
-    try:
-        Mongo_Connection_URI.admin.command("ping")
-    except Exception as e:
-        app.logger.error(f"Error connecting to MongoDB: {e}")
+    # Both modes use the same user for this connection
+    Mongo_Connection_URI = mongo_pool.get_client(
+        user_db, mode, username=pref.MONGOUN, bearer=pref.MONGO_BEARER
+    )
+    if Mongo_Connection_URI is None:
         return None
     app.logger.info("Connected to MongoDB")
     return Mongo_Connection_URI
@@ -355,20 +356,17 @@ def home():
                 user_db = session.get("user_db")
 
         # Get user info from MongoDB in the "fuse-db" database
-        Mongo_URI = f"mongodb+srv://{pref.MONGOUSERLOOKUP}:{pref.MONGOUSERBEARER}@{pref.MONGOHOST}/fuse-db"
-
-        Mongo_Connection_URI = MongoClient(
-            f"{Mongo_URI}?retryWrites=true&w=majority",
-            tlsCAFile=certifi.where(),
-            serverSelectionTimeoutMS=500,
+        Mongo_Connection_URI = mongo_pool.get_client(
+            "fuse-db",
+            mode,
+            username=pref.MONGOUSERLOOKUP,
+            bearer=pref.MONGOUSERBEARER,
         )
 
         # Check if the connection to MongoDB is successful
-        try:
-            Mongo_Connection_URI.admin.command("ping")
-        except Exception as e:
-            app.logger.error(f"Error connecting to MongoDB: {e}")
-            return None
+        if Mongo_Connection_URI is None:
+            app.logger.error("Error connecting to MongoDB (fuse-db) for user info.")
+            return render_template("500.html", error="Database unavailable"), 500
         app.logger.info("Connected to MongoDB fuse-db for user info")
 
         try:
@@ -391,39 +389,32 @@ def home():
             # add user_db and user_area to the session
             session["user_db"] = user_db
             session["user_area"] = user_area
+            # Matching engine is chosen per area in the admins record
+            session["match_engine"] = user_info.get("match_engine", "random")
+            # Polishing adds its budget to every match, so areas opt in
+            session["polish_seconds"] = user_info.get("polish_seconds", 0)
             if "mode" not in session:
                 session["mode"] = "debug"
             app.logger.info(f"User mode is {session["mode"]} - database: {user_db}")
 
             # MongoDB connection setup for the fuse date user
-            Mongo_Uri = f"mongodb+srv://{pref.CWA_SE_USER}:{pref.CWA_SE_BEARER}@{pref.MONGOHOST}/{user_db}"
-            Mongo_Connection_URI = MongoClient(
-                f"{Mongo_Uri}?retryWrites=true&w=majority",
-                tlsCAFile=certifi.where(),
-                serverSelectionTimeoutMS=500,
-            )
-
             if mode == "production":
-                CWA_SE_USER = pref.CWA_SE_USER
-                CWA_SE_BEARER = pref.CWA_SE_BEARER
-                MONGOHOST = "cluster0.jzvod.mongodb.net"
-                MONGODB = "fuse-cwa-se"
-                MONGO_URI = (
-                    f"mongodb+srv://{CWA_SE_USER}:{CWA_SE_BEARER}@{MONGOHOST}/{MONGODB}"
+                Mongo_Connection_URI = mongo_pool.get_client(
+                    PRODUCTION_MONGODB, mode, host=PRODUCTION_MONGOHOST
                 )
-                Mongo_Connection_URI: MongoClient = MongoClient(
-                    f"{MONGO_URI}?retryWrites=true&w=majority",
-                    tlsCAFile=certifi.where(),
-                    serverSelectionTimeoutMS=500,
+            else:
+                Mongo_Connection_URI = mongo_pool.get_client(
+                    user_db,
+                    mode,
+                    username=pref.CWA_SE_USER,
+                    bearer=pref.CWA_SE_BEARER,
                 )
 
-            try:
-                Mongo_Connection_URI.admin.command("ping")
-            except Exception as e:
+            if Mongo_Connection_URI is None:
                 app.logger.error(
-                    f"Error connecting to MongoDB ({user_db}) for set fuse date route: {e}"
+                    f"Error connecting to MongoDB ({user_db}) for set fuse date route."
                 )
-                return None
+                return render_template("500.html", error="Database unavailable"), 500
             app.logger.info(
                 f"Connected to MongoDB ({user_db}) for set fuse date route."
             )
@@ -494,35 +485,20 @@ def set_fuse_date():
         session["X-FuseDate"] = new_fuse_date
 
         # MongoDB connection setup for the fuse date user
-
-        Mongo_Uri = f"mongodb+srv://{pref.MONGOUN}:{pref.MONGO_BEARER}@{pref.MONGOHOST}/{user_db}"
-        Mongo_Connection_URI = MongoClient(
-            f"{Mongo_Uri}?retryWrites=true&w=majority",
-            tlsCAFile=certifi.where(),
-            serverSelectionTimeoutMS=500,
-        )
-
         if mode == "production":
-            CWA_SE_USER = pref.CWA_SE_USER
-            CWA_SE_BEARER = pref.CWA_SE_BEARER
-            MONGOHOST = "cluster0.jzvod.mongodb.net"
-            MONGODB = "fuse-cwa-se"
-            MONGO_URI = (
-                f"mongodb+srv://{CWA_SE_USER}:{CWA_SE_BEARER}@{MONGOHOST}/{MONGODB}"
+            Mongo_Connection_URI = mongo_pool.get_client(
+                PRODUCTION_MONGODB, mode, host=PRODUCTION_MONGOHOST
             )
-            Mongo_Connection_URI: MongoClient = MongoClient(
-                f"{MONGO_URI}?retryWrites=true&w=majority",
-                tlsCAFile=certifi.where(),
-                serverSelectionTimeoutMS=500,
+        else:
+            Mongo_Connection_URI = mongo_pool.get_client(
+                user_db, mode, username=pref.MONGOUN, bearer=pref.MONGO_BEARER
             )
 
-        try:
-            Mongo_Connection_URI.admin.command("ping")
-        except Exception as e:
+        if Mongo_Connection_URI is None:
             app.logger.error(
-                f"Error connecting to MongoDB ({user_db}) for set fuse date route: {e}"
+                f"Error connecting to MongoDB ({user_db}) for set fuse date route."
             )
-            return None
+            return render_template("500.html", error="Database unavailable"), 500
         app.logger.info(f"Connected to MongoDB ({user_db}) for set fuse date route.")
 
         try:
@@ -552,21 +528,17 @@ def set_fuse_date():
 
     app.logger.info("Get fuse date route...")
 
-    Mongo_Connection_URI = mongodb_setup_un()
-
     # Get the Fuse date
     app.logger.info("Getting the Fuse date...")
     if mode == "production":
-        CWA_SE_USER = pref.CWA_SE_USER
-        CWA_SE_BEARER = pref.CWA_SE_BEARER
-        MONGOHOST = "cluster0.jzvod.mongodb.net"
-        MONGODB = "fuse-cwa-se"
-        MONGO_URI = f"mongodb+srv://{CWA_SE_USER}:{CWA_SE_BEARER}@{MONGOHOST}/{MONGODB}"
-        Mongo_Connection_URI: MongoClient = MongoClient(
-            f"{MONGO_URI}?retryWrites=true&w=majority",
-            tlsCAFile=certifi.where(),
-            serverSelectionTimeoutMS=500,
+        Mongo_Connection_URI = mongo_pool.get_client(
+            PRODUCTION_MONGODB, mode, host=PRODUCTION_MONGOHOST
         )
+    else:
+        Mongo_Connection_URI = mongodb_setup_un()
+    if Mongo_Connection_URI is None:
+        app.logger.error(f"Error connecting to MongoDB ({user_db}).")
+        return render_template("500.html", error="Database unavailable"), 500
     fuse_date = FuseDate().get_fuse_date(Mongo_Connection_URI, user_db, area, mode)
     current_date = date.today()
 
@@ -646,37 +618,60 @@ def upload_file():
             filename = secure_filename(file.filename)
             app.logger.info(f"Uploaded file: {filename}")
 
-            # Check if the uploads folder exists
-            if not os.path.exists(app.config["UPLOAD_FOLDER"]):
-                os.makedirs(app.config["UPLOAD_FOLDER"])
-
             # Record the start time
             start_time = time.time()
 
-            # If the file already exists, delete it and upload the new file
-            file_path = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-            if os.path.exists(file_path):
-                os.remove(file_path)
-
-            # Save the file to the uploads folder
-            file.save(file_path)
-
-            # Check file size
-            file_size = os.path.getsize(file_path)
-            if file_size > app.config.get("MAX_CONTENT_LENGTH", 16 * 1024 * 1024):
-                app.logger.error(f"File size exceeds the limit: {file_size}")
+            # Stream the upload to disk in chunks, hashing it on the way, then
+            # parse it from there unless the same content was parsed before
+            max_bytes = app.config.get("MAX_CONTENT_LENGTH", 16 * 1024 * 1024)
+            spool_path, upload_hash, file_size = upload_cache.spool_upload(
+                file.stream, max_bytes
+            )
+            try:
+                if file_size > max_bytes:
+                    app.logger.error(f"File size exceeds the limit: {file_size}")
+                    return render_template(
+                        "upload.html", error="File size exceeds the limit"
+                    )
+                parsed, cached = upload_cache.load_or_parse(
+                    spool_path, upload_hash, filename
+                )
+            except UnicodeDecodeError as e:
+                app.logger.error(f"Upload {filename} is not UTF-8 text: {e}")
                 return render_template(
-                    "upload.html", error="File size exceeds the limit"
+                    "upload.html", error="File is not a UTF-8 CSV file"
                 )
+            finally:
+                os.remove(spool_path)
 
-            # Read the file into a Pandas DataFrame
-            df = pd.read_csv(file_path)
+            # The parse cache is shared by every area, so "nothing changed"
+            # depends on this area's prematch record for its FUSE date
+            if session.get("mode") == "debug":
+                user_db = "fuse-test"
+            else:
+                user_db = session.get("user_db")
+            area = session.get("user_area")
+            Mongo_Connection_URI = mongo_pool.get_client(user_db, session.get("mode"))
+            already_applied = (
+                cached
+                and Mongo_Connection_URI is not None
+                and upload_cache.applied(
+                    Mongo_Connection_URI,
+                    user_db,
+                    area,
+                    FuseDate().get_fuse_date(
+                        Mongo_Connection_URI, user_db, area, session.get("mode")
+                    ),
+                    upload_hash,
+                )
+            )
 
             # Calculate the upload time with a maximum of 4 decimal places
             upload_time = round(time.time() - start_time, 4)
 
             # Set filename session cookie
             session["X-Filename"] = filename
+            session["X-Upload"] = parsed["sha256"]
             app.logger.info(f"Session cookie: {session}")
 
             # Render the upload template with the file details
@@ -684,9 +679,15 @@ def upload_file():
 
             return render_template(
                 "upload.html",
-                message="File uploaded successfully",
+                message=(
+                    "File already uploaded, nothing changed"
+                    if already_applied
+                    else "File uploaded successfully"
+                ),
                 filename=filename,
-                data=df.to_html(index=False, classes="table table-striped"),
+                # The table loads page by page from /preview/upload
+                preview_url=url_for("preview_upload"),
+                rows=len(parsed["responses"]),
                 file_size=file_size,
                 upload_time=upload_time,
                 user_db=session.get("user_db"),
@@ -753,29 +754,10 @@ def process_csv():
     area = session.get("user_area")
 
     # MongoDB connection setup for processing the CSV file
-    if mode == "debug":
-        Mongo_Uri = f"mongodb+srv://{pref.MONGOUN}:{pref.MONGO_BEARER}@{pref.MONGOHOST}/{user_db}"
-        Mongo_Connection_URI = MongoClient(
-            f"{Mongo_Uri}?retryWrites=true&w=majority",
-            tlsCAFile=certifi.where(),
-            serverSelectionTimeoutMS=500,
-        )
-    else:
-        Mongo_Uri = f"mongodb+srv://{pref.CWA_SE_USER}:{pref.CWA_SE_BEARER}@{pref.MONGOHOST}/{user_db}"
-        Mongo_Connection_URI = MongoClient(
-            f"{Mongo_Uri}?retryWrites=true&w=majority",
-            tlsCAFile=certifi.where(),
-            serverSelectionTimeoutMS=500,
-        )
-
-    try:
-        Mongo_Connection_URI.admin.command("ping")
-    except Exception as e:
-        app.logger.error(
-            f"Error connecting to MongoDB ({user_db}) for set fuse date route: {e}"
-        )
-        return None
-    app.logger.info(f"Connected to MongoDB ({user_db}) for set fuse date route.")
+    Mongo_Connection_URI = mongo_pool.get_client(user_db, mode)
+    if Mongo_Connection_URI is None:
+        app.logger.error(f"Error connecting to MongoDB ({user_db}).")
+        return render_template("500.html", error="Database unavailable"), 500
 
     # Get the Fuse date
     app.logger.info("Getting the Fuse date...")
@@ -785,9 +767,29 @@ def process_csv():
     if filename is None:
         return render_template("process_csv.html", filename="None")
 
-    accept, decline, tentative, no_response = ProcessAttachment(
+    attachment = ProcessAttachment(
         fuse_date, filename, Mongo_Connection_URI, user_db, area
-    ).process()
+    )
+    upload_hash = session.get("X-Upload")
+    parsed = upload_cache.load_parsed(upload_hash) if upload_hash else None
+    if parsed is None and upload_hash:
+        # Evicted from the parse cache since it was uploaded
+        app.logger.warning(f"Parsed upload {upload_hash} is no longer cached.")
+        return render_template(
+            "upload.html",
+            error="Upload expired, please upload the file again",
+            user_db=session.get("user_db"),
+            mode=mode,
+            admin_users=admin_users,
+        )
+    if parsed is None:
+        # Uploaded before uploads were parsed on arrival; parse the saved file
+        accept, decline, tentative, no_response = attachment.process()
+    else:
+        accept, decline, tentative, no_response = attachment.apply(
+            upload_cache.response_sets(parsed), upload_hash
+        )
+        attachment.errors = parsed["errors"]
     return render_template(
         "process_csv.html",
         filename=filename,
@@ -795,6 +797,8 @@ def process_csv():
         decline=decline,
         tentative=tentative,
         no_response=no_response,
+        skipped_rows=attachment.errors,
+        changes=attachment.changes,
         admin_users=admin_users,
         user_db=user_db,
         mode=mode,
@@ -824,6 +828,9 @@ def send_reminders():
     area = session.get("user_area")
 
     Mongo_Connection_URI = mongodb_setup_un()
+    if Mongo_Connection_URI is None:
+        app.logger.error(f"Error connecting to MongoDB ({user_db}).")
+        return render_template("500.html", error="Database unavailable"), 500
 
     reminders_result = Reminders(
         fuse_date, Mongo_Connection_URI, user_db, area
@@ -914,29 +921,10 @@ def se_attendance():
     area = session.get("user_area")
 
     # MongoDB connection setup for selecting SEs
-    if mode == "debug":
-        Mongo_Uri = f"mongodb+srv://{pref.MONGOUN}:{pref.MONGO_BEARER}@{pref.MONGOHOST}/{user_db}"
-        Mongo_Connection_URI = MongoClient(
-            f"{Mongo_Uri}?retryWrites=true&w=majority",
-            tlsCAFile=certifi.where(),
-            serverSelectionTimeoutMS=500,
-        )
-    else:
-        Mongo_Uri = f"mongodb+srv://{pref.CWA_SE_USER}:{pref.CWA_SE_BEARER}@{pref.MONGOHOST}/{user_db}"
-        Mongo_Connection_URI = MongoClient(
-            f"{Mongo_Uri}?retryWrites=true&w=majority",
-            tlsCAFile=certifi.where(),
-            serverSelectionTimeoutMS=500,
-        )
-
-    try:
-        Mongo_Connection_URI.admin.command("ping")
-    except Exception as e:
-        app.logger.error(
-            f"Error connecting to MongoDB ({user_db}) for set fuse date route: {e}"
-        )
-        return None
-    app.logger.info(f"Connected to MongoDB ({user_db}) for set fuse date route.")
+    Mongo_Connection_URI = mongo_pool.get_client(user_db, mode)
+    if Mongo_Connection_URI is None:
+        app.logger.error(f"Error connecting to MongoDB ({user_db}).")
+        return render_template("500.html", error="Database unavailable"), 500
 
     # Get the list of names from the database
     se_set = se_present(Mongo_Connection_URI, fuse_date, user_db, area)
@@ -977,29 +965,10 @@ def submit_names():
     area = session.get("user_area")
 
     # MongoDB connection setup for submitting attending SEs
-    if mode == "debug":
-        Mongo_Uri = f"mongodb+srv://{pref.MONGOUN}:{pref.MONGO_BEARER}@{pref.MONGOHOST}/{user_db}"
-        Mongo_Connection_URI = MongoClient(
-            f"{Mongo_Uri}?retryWrites=true&w=majority",
-            tlsCAFile=certifi.where(),
-            serverSelectionTimeoutMS=500,
-        )
-    else:
-        Mongo_Uri = f"mongodb+srv://{pref.CWA_SE_USER}:{pref.CWA_SE_BEARER}@{pref.MONGOHOST}/{user_db}"
-        Mongo_Connection_URI = MongoClient(
-            f"{Mongo_Uri}?retryWrites=true&w=majority",
-            tlsCAFile=certifi.where(),
-            serverSelectionTimeoutMS=500,
-        )
-
-    try:
-        Mongo_Connection_URI.admin.command("ping")
-    except Exception as e:
-        app.logger.error(
-            f"Error connecting to MongoDB ({user_db}) for set fuse date route: {e}"
-        )
-        return None
-    app.logger.info(f"Connected to MongoDB ({user_db}) for set fuse date route.")
+    Mongo_Connection_URI = mongo_pool.get_client(user_db, mode)
+    if Mongo_Connection_URI is None:
+        app.logger.error(f"Error connecting to MongoDB ({user_db}).")
+        return render_template("500.html", error="Database unavailable"), 500
 
     # Update the database with the selected names in cwa_attendance
     attendance = mongo_attendance(
@@ -1040,69 +1009,15 @@ def match():
     area = session.get("user_area")
     # mongo_db = session.get("mongo_db")
 
-    # MongoDB connection setup for processing the CSV file
-    """if mode == "debug":
-        Mongo_Uri = f"mongodb+srv://{pref.MONGOUN}:{pref.MONGO_BEARER}@{pref.MONGOHOST}/{user_db}"
-        Mongo_Connection_URI = MongoClient(
-            f"{Mongo_Uri}?retryWrites=true&w=majority",
-            tlsCAFile=certifi.where(),
-            serverSelectionTimeoutMS=500,
-        )
-    else:
-        Mongo_Uri = f"mongodb+srv://{pref.CWA_SE_USER}:{pref.CWA_SE_BEARER}@{pref.MONGOHOST}/{user_db}"
-        Mongo_Connection_URI = MongoClient(
-            f"{Mongo_Uri}?retryWrites=true&w=majority",
-            tlsCAFile=certifi.where(),
-            serverSelectionTimeoutMS=500,
-        )"""
-
-    """if mode == "production":
-        app.logger.info("Loading Production mode database connection for SE Match...")
-        # MONGODB = session.get(user_db)  # "fuse-cwa-se"
-        MONGO_URI = f"mongodb+srv://{pref.CWA_SE_USER}:{pref.CWA_SE_BEARER}@{pref.MONGOHOST}/{user_db}"
-        Mongo_Connection_URI = MongoClient(
-            f"{MONGO_URI}?retryWrites=true&w=majority",
-            tlsCAFile=certifi.where(),
-            serverSelectionTimeoutMS=500,
-        )
-    else:
-        app.logger.info("Loading Debug mode database connection for SE Match...")
-        Mongo_Uri = f"mongodb+srv://{pref.MONGOUN}:{pref.MONGO_BEARER}@{pref.MONGOHOST}/{user_db}"
-        Mongo_Connection_URI = MongoClient(
-            f"{Mongo_Uri}?retryWrites=true&w=majority",
-            tlsCAFile=certifi.where(),
-            serverSelectionTimeoutMS=500,
-        )"""
-
     # MongoDB connection setup for selecting SEs
-    if mode == "debug":
-        Mongo_Uri = f"mongodb+srv://{pref.MONGOUN}:{pref.MONGO_BEARER}@{pref.MONGOHOST}/{user_db}"
-        Mongo_Connection_URI = MongoClient(
-            f"{Mongo_Uri}?retryWrites=true&w=majority",
-            tlsCAFile=certifi.where(),
-            serverSelectionTimeoutMS=500,
-        )
-    else:
-        Mongo_Uri = f"mongodb+srv://{pref.CWA_SE_USER}:{pref.CWA_SE_BEARER}@{pref.MONGOHOST}/{user_db}"
-        Mongo_Connection_URI = MongoClient(
-            f"{Mongo_Uri}?retryWrites=true&w=majority",
-            tlsCAFile=certifi.where(),
-            serverSelectionTimeoutMS=500,
-        )
-
-    try:
-        Mongo_Connection_URI.admin.command("ping")
-    except Exception as e:
-        app.logger.error(
-            f"Error connecting to MongoDB ({user_db}) for set fuse date route: {e}"
-        )
-        return None
-    app.logger.info(f"Connected to MongoDB ({user_db}) for set fuse date route.")
+    Mongo_Connection_URI = mongo_pool.get_client(user_db, mode)
+    if Mongo_Connection_URI is None:
+        app.logger.error(f"Error connecting to MongoDB ({user_db}).")
+        return render_template("500.html", error="Database unavailable"), 500
 
     if fuse_date is None:
         app.logger.error("Fuse date not found in session")
     if request.method == "POST":
-        match_file = "NA"
         app.logger.info("SE match post route...")
         # Match attending SEs
         se_set = get_attendance(Mongo_Connection_URI, fuse_date, user_db, area)
@@ -1116,41 +1031,23 @@ def match():
             user_db = "fuse-test"
         app.logger.info(f"User DB: {user_db}")
 
-        # SE matching process. Returns the file name of the match file
+        # SE matching process runs in the background. Returns a job to poll.
         app.logger.info("Kick off SE matching process...")
-        status = se_select(fuse_date, Mongo_Connection_URI, se_set, user_db, mode)
-        if status == "NA":
-            app.logger.warning("No SEs match file created.")
-            match_file = "NA"
-            df = None
-        # check if status is a 3 digit http error code
-        elif status == "500":
-            # return errorhandler
-            app.logger.error(f"Internal Server Error: {status}")
-            return render_template("500.html", error=status), int(status)
-        else:
-            app.logger.info(f"SE match file ({status}) created.")
-            match_file = status
-            csv_file = f"match_files/{status}"
-            # Read the match file into a Pandas DataFrame
-            df = pd.read_csv(csv_file)
-        #
-        #
-        #
-        mode = session.get("mode")
-        if mode == "debug":
-            flash(f"Mode: {mode}")
-
-        return render_template(
-            "post_match.html",
-            admin_users=admin_users,
-            fuse_date=fuse_date,
-            test_mode=mode,
-            match_file=match_file,
-            user_db=user_db,
-            mode=mode,
-            data=df.to_html(index=False, classes="table table-striped"),
+        engine = session.get("match_engine", "random")
+        app.logger.info(f"Match engine: {engine}")
+        job = match_jobs.submit(
+            match_jobs.cache_key(user_db, area, fuse_date, se_set),
+            se_select,
+            fuse_date,
+            Mongo_Connection_URI,
+            set(se_set),
+            user_db,
+            mode,
+            engine=engine,
+            polish_seconds=session.get("polish_seconds", 0),
         )
+        app.logger.info(f"SE match job {job.job_id} submitted.")
+        return redirect(url_for("match_progress", job_id=job.job_id))
 
     app.logger.info("SE match get route...")
     # Get the list of names from the database
@@ -1175,11 +1072,245 @@ def match():
     )
 
 
+@app.route("/rematch", methods=["POST"])
+@login_required
+def rematch():
+    """Re-pair only the SEs whose attendance changed since the last match."""
+    app.logger.info("SE re-match route...")
+    fuse_date = session.get("X-FuseDate")
+    mode = session.get("mode")
+    if mode == "production":
+        user_db = session.get("user_db")
+    else:
+        user_db = "fuse-test"
+    area = session.get("user_area")
+
+    Mongo_Connection_URI = mongo_pool.get_client(user_db, mode)
+    if Mongo_Connection_URI is None:
+        app.logger.error(f"Error connecting to MongoDB ({user_db}).")
+        return render_template("500.html", error="Database unavailable"), 500
+
+    se_set = get_attendance(Mongo_Connection_URI, fuse_date, user_db, area)
+    engine = session.get("match_engine", "random")
+    job = match_jobs.submit(
+        match_jobs.cache_key(user_db, area, fuse_date, se_set),
+        se_rematch,
+        fuse_date,
+        Mongo_Connection_URI,
+        set(se_set),
+        user_db,
+        mode,
+        engine=engine,
+        polish_seconds=session.get("polish_seconds", 0),
+        # A re-match depends on the stored pairs, so it always runs
+        use_cache=False,
+    )
+    app.logger.info(f"SE re-match job {job.job_id} submitted.")
+    return redirect(url_for("match_progress", job_id=job.job_id))
+
+
+@app.route("/match_status/<job_id>", methods=["GET"])
+@login_required
+def match_status(job_id):
+    job = match_jobs.get_job(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job.to_dict()), 200
+
+
+@app.route("/match_events/<job_id>", methods=["GET"])
+@login_required
+def match_events(job_id):
+    """Server-sent events stream of a match job's progress."""
+    job = match_jobs.get_job(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    # EventSource sends the last id it saw when it reconnects
+    after = request.headers.get("Last-Event-ID", type=int, default=0)
+
+    def events():
+        for event in job.stream(after=after):
+            if not event:
+                yield ": keepalive\n\n"
+                continue
+            yield f"id: {event['seq']}\ndata: {json.dumps(event)}\n\n"
+        yield f"event: end\ndata: {json.dumps(job.to_dict())}\n\n"
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.route("/match_result/<job_id>", methods=["GET"])
+@login_required
+def match_result(job_id):
+    app.logger.info(f"SE match result route for job {job_id}...")
+    job = match_jobs.get_job(job_id)
+    if job is None:
+        return render_template("404.html", error="Unknown match job"), 404
+    if job.status in ("queued", "running"):
+        return redirect(url_for("match_progress", job_id=job_id))
+    if job.status == "failed":
+        app.logger.error(f"Internal Server Error: {job.error}")
+        return render_template("500.html", error=job.error), 500
+
+    fuse_date = session.get("X-FuseDate")
+    mode = session.get("mode")
+    if mode == "production":
+        user_db = session.get("user_db")
+    else:
+        user_db = "fuse-test"
+
+    status = job.result
+    if status == "NA":
+        app.logger.warning("No SEs match file created.")
+        match_file = "NA"
+        preview_url = None
+    else:
+        app.logger.info(f"SE match file ({status}) created.")
+        match_file = status
+        # The table loads page by page from /preview/match
+        preview_url = url_for("preview_match", filename=status)
+
+    if mode == "debug":
+        flash(f"Mode: {mode}")
+
+    return render_template(
+        "post_match.html",
+        admin_users=admin_users,
+        fuse_date=fuse_date,
+        test_mode=mode,
+        match_file=match_file,
+        user_db=user_db,
+        mode=mode,
+        preview_url=preview_url,
+    )
+
+
 @app.route("/download_csv/<filename>")
 def download_csv(filename):
     return send_from_directory(directory="match_files", path=filename)
 
 
+def preview_response(columns, rows):
+    """One page of a preview table, from the page/per_page/sort/order/q args."""
+    return (
+        jsonify(
+            preview.page_rows(
+                columns,
+                rows,
+                page=request.args.get("page", 1, type=int),
+                per_page=request.args.get(
+                    "per_page", preview.DEFAULT_PER_PAGE, type=int
+                ),
+                sort=request.args.get("sort"),
+                order=request.args.get("order", "asc"),
+                q=request.args.get("q"),
+            )
+        ),
+        200,
+    )
+
+
+@app.route("/preview/upload", methods=["GET"])
+@login_required
+def preview_upload():
+    """JSON pages of the session's parsed upload."""
+    parsed = upload_cache.load_parsed(session.get("X-Upload"))
+    if parsed is None:
+        return jsonify({"error": "No parsed upload"}), 404
+    return preview_response(*preview.upload_rows(parsed))
+
+
+@app.route("/preview/match/<filename>", methods=["GET"])
+@login_required
+def preview_match(filename):
+    """JSON pages of a match file."""
+    path = os.path.join("match_files", secure_filename(filename))
+    try:
+        columns, rows = preview.csv_rows(path)
+    except OSError:
+        return jsonify({"error": "Unknown match file"}), 404
+    return preview_response(columns, rows)
+
+
+def parse_utc(value):
+    """Parse an ISO 8601 time into a naive UTC datetime, as Mongo stores it."""
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def prematch_session():
+    """Return (Mongo client, user_db, area, fuse_date) for the changelog API."""
+    mode = session.get("mode")
+    if mode == "debug":
+        user_db = "fuse-test"
+    else:
+        user_db = session.get("user_db")
+    fuse_date = request.args.get("date") or session.get("X-FuseDate")
+    return (
+        mongo_pool.get_client(user_db, mode),
+        user_db,
+        session.get("user_area"),
+        fuse_date,
+    )
+
+
+@app.route("/prematch_changes", methods=["GET"])
+@login_required
+def prematch_change_list():
+    """Per-upload status deltas for a date, oldest first. ?since= limits them."""
+    Mongo_Connection_URI, user_db, area, fuse_date = prematch_session()
+    if Mongo_Connection_URI is None:
+        app.logger.error(f"Error connecting to MongoDB ({user_db}).")
+        return jsonify({"error": "Database unavailable"}), 500
+    try:
+        since = parse_utc(request.args["since"]) if "since" in request.args else None
+    except ValueError:
+        return jsonify({"error": "since must be an ISO 8601 time"}), 400
+    changes = prematch_changes.list_changes(
+        Mongo_Connection_URI, user_db, area, fuse_date, since=since
+    )
+    for change in changes:
+        change["timestamp"] = change["timestamp"].isoformat() + "Z"
+    return jsonify({"date": fuse_date, "changes": changes}), 200
+
+
+@app.route("/prematch_status", methods=["GET"])
+@login_required
+def prematch_status():
+    """Statuses for a date as they stood at ?at= (default now), from the deltas."""
+    Mongo_Connection_URI, user_db, area, fuse_date = prematch_session()
+    if Mongo_Connection_URI is None:
+        app.logger.error(f"Error connecting to MongoDB ({user_db}).")
+        return jsonify({"error": "Database unavailable"}), 500
+    try:
+        at = parse_utc(request.args["at"]) if "at" in request.args else None
+    except ValueError:
+        return jsonify({"error": "at must be an ISO 8601 time"}), 400
+    statuses = prematch_changes.status_at(
+        Mongo_Connection_URI, user_db, area, fuse_date, at=at
+    )
+    counts = {status: 0 for status in STATUSES}
+    for status in statuses.values():
+        counts[status] += 1
+    return (
+        jsonify(
+            {
+                "date": fuse_date,
+                "at": at.isoformat() + "Z" if at else None,
+                "statuses": statuses,
+                "counts": counts,
+            }
+        ),
+        200,
+    )
+
+
 @app.route("/se", methods=["GET", "POST"])
 @login_required
 def se():
@@ -1209,30 +1340,15 @@ def se():
         app.logger.info(f"Name: {name}, CCO: {cco}")
 
         # MongoDB connection setup for getting SE data
+        Mongo_Connection_URI = mongo_pool.get_client(user_db, mode)
         if mode == "debug":
-            Mongo_Uri = f"mongodb+srv://{pref.MONGOUN}:{pref.MONGO_BEARER}@{pref.MONGOHOST}/{user_db}"
-            Mongo_Connection_URI = MongoClient(
-                f"{Mongo_Uri}?retryWrites=true&w=majority",
-                tlsCAFile=certifi.where(),
-                serverSelectionTimeoutMS=500,
-            )
             user_collection = "cwa_SEs"
         else:
-            Mongo_Uri = f"mongodb+srv://{pref.CWA_SE_USER}:{pref.CWA_SE_BEARER}@{pref.MONGOHOST}/{user_db}"
-            Mongo_Connection_URI = MongoClient(
-                f"{Mongo_Uri}?retryWrites=true&w=majority",
-                tlsCAFile=certifi.where(),
-                serverSelectionTimeoutMS=500,
-            )
             user_collection = f"{session.get('user_area')}_SEs"
 
-        try:
-            Mongo_Connection_URI.admin.command("ping")
-        except Exception as e:
-            app.logger.error(
-                f"Error connecting to MongoDB ({user_db}) for se route: {e}"
-            )
-            return None
+        if Mongo_Connection_URI is None:
+            app.logger.error(f"Error connecting to MongoDB ({user_db}) for se route.")
+            return render_template("500.html", error="Database unavailable"), 500
         app.logger.info(f"Connected to MongoDB ({user_db}) for se route.")
 
         if cco:
@@ -1335,9 +1451,12 @@ def internal_server_error(e):
     return render_template("500.html", error=e), 500
 
 
-@app.route("/match_progress", methods=["GET"])
-def match_progress():
-    return render_template("match_progress.html", admin_users=admin_users)
+@app.route("/match_progress/<job_id>", methods=["GET"])
+@login_required
+def match_progress(job_id):
+    return render_template(
+        "match_progress.html", job_id=job_id, admin_users=admin_users
+    )
 
 
 if __name__ == "__main__":
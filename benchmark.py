@@ -0,0 +1,239 @@
+"""
+Benchmark se_select on synthetic data, without Atlas.
+
+Generates SEs, regions and pairing history with modules.synthetic_data, then
+times each stage of a matching run separately for every attendee count:
+
+    snapshot        match_snapshot.load_snapshot
+    se_count_dict   se_dict_util.se_count_dict
+    create_se_dict  se_select.create_se_dict
+    history         top SEs and PairHistory
+    main_loop       the match engine
+    polish          match_polish.polish (only with --polish-seconds)
+    persistence     match_writer.save_pairs
+
+When mongomock is installed the data is loaded into an in-process mongomock
+database and every stage runs against it. If modules.preferences is not set
+up, a stand-in pointing at that database takes its place so the modules that
+import it still load. Without mongomock the data goes straight into the engine
+and the database stages are reported as skipped.
+
+    python benchmark.py --sizes 50,200,1000,5000 --output bench.json
+"""
+import argparse
+import json
+import logging
+import platform
+import sys
+import types
+from datetime import datetime, timezone
+from time import perf_counter
+from typing import Any, Dict, List, Optional
+
+from modules import match_engine, match_polish, pair_history, top_ses_util
+from modules.match_score import score_pairs
+from modules.synthetic_data import SYNTHETIC_HOST, SyntheticFuse
+
+try:
+    import mongomock
+except ImportError:
+    mongomock = None
+
+BENCH_DB = "fuse-bench"
+DEFAULT_SIZES = (50, 200, 1000, 5000)
+
+
+def _use_preferences(db) -> None:
+    """
+    Make modules.preferences.preferences importable.
+
+    The deployment's module is used when it is set up; otherwise a stand-in
+    whose shared collections are db's is installed in sys.modules.
+    """
+    try:
+        import modules.preferences.preferences  # noqa: F401 pylint: disable=unused-import
+    except ImportError:
+        preferences = types.ModuleType("modules.preferences.preferences")
+        preferences.host = SYNTHETIC_HOST
+        preferences.client = db.client
+        preferences.cwa_matches = db["cwa_matches"]
+        preferences.cwa_regions = db["cwa_regions"]
+        preferences.se_info = db["cwa_SEs"]
+        package = types.ModuleType("modules.preferences")
+        package.preferences = preferences
+        sys.modules["modules.preferences"] = package
+        sys.modules["modules.preferences.preferences"] = preferences
+
+
+def _rounded(phases: Dict[str, float]) -> Dict[str, float]:
+    return {name: round(seconds, 6) for name, seconds in phases.items()}
+
+
+def run_size(attendees: int, args) -> Dict[str, Any]:
+    """Generate data for attendees SEs, run one match and time each stage."""
+    phases: Dict[str, float] = {}
+    skipped: Dict[str, str] = {}
+
+    start = perf_counter()
+    data = SyntheticFuse(
+        attendees,
+        regions=args.regions,
+        vips=args.vips,
+        ssems=args.ssems,
+        sems=args.sems,
+        sessions=args.sessions,
+        seed=args.seed,
+    )
+    phases["generate"] = perf_counter() - start
+    SEs = set(data.SEs)
+    fuse_date = data.today.strftime("%m/%d/%Y")
+
+    client = None
+    if mongomock is not None:
+        client = mongomock.MongoClient()
+        db = client[BENCH_DB]
+        start = perf_counter()
+        data.load(db)
+        phases["load"] = perf_counter() - start
+        _use_preferences(db)
+
+        from modules import match_snapshot
+
+        start = perf_counter()
+        snapshot = match_snapshot.load_snapshot(client, BENCH_DB, SEs)
+        phases["snapshot"] = perf_counter() - start
+    else:
+        skipped["load"] = skipped["snapshot"] = "mongomock is not installed"
+        snapshot = data.snapshot()
+
+    if client is not None:
+        from modules import se_dict_util, se_select
+
+        start = perf_counter()
+        se_assignment_count = se_dict_util.se_count_dict(SEs, db["cwa_matches"])
+        phases["se_count_dict"] = perf_counter() - start
+
+        start = perf_counter()
+        se_dict = se_select.create_se_dict(SEs, [], client, BENCH_DB, snapshot)
+        phases["create_se_dict"] = perf_counter() - start
+
+        sem_set = se_select.make_sem_set(SEs, db["cwa_SEs"])
+    else:
+        reason = "mongomock is not installed"
+        skipped["se_count_dict"] = skipped["create_se_dict"] = reason
+        se_assignment_count = data.assignment_counts()
+        se_dict = data.se_dict()
+        sem_set = data.sem_set
+
+    start = perf_counter()
+    percentile = round(top_ses_util.top_percentile(se_assignment_count))
+    top_ses = top_ses_util.top_ses(se_assignment_count, percentile)
+    history = pair_history.PairHistory(SEs, snapshot, today=data.today)
+    phases["history"] = perf_counter() - start
+
+    context = match_engine.MatchContext(
+        SEs,
+        se_dict,
+        sem_set,
+        se_assignment_count,
+        top_ses,
+        history,
+        snapshot,
+        data.today.replace(year=data.today.year - 1),
+    )
+
+    start = perf_counter()
+    result = match_engine.get_engine(args.engine, seed=args.seed).match(context)
+    phases["main_loop"] = perf_counter() - start
+    report: Dict[str, Any] = {
+        "attendees": len(SEs),
+        "ok": result.ok,
+        "diagnostics": result.diagnostics,
+    }
+    if not result.ok:
+        # A failed row: no pairs, so no score, polish or persistence timings
+        report.update(
+            pairs=0,
+            error=result.diagnostics.get("error", "no pairing found"),
+            phases=_rounded(phases),
+            skipped=skipped,
+        )
+        return report
+    se_pair_list = result.pairs
+    report["pairs"] = len(se_pair_list)
+
+    if args.polish_seconds > 0:
+        start = perf_counter()
+        se_pair_list, _, _ = match_polish.polish(
+            se_pair_list, context, time_budget=args.polish_seconds
+        )
+        phases["polish"] = perf_counter() - start
+    else:
+        skipped["polish"] = "--polish-seconds is 0"
+    report["score"] = score_pairs(se_pair_list, context)
+
+    if client is not None:
+        from modules import match_writer
+
+        start = perf_counter()
+        saved = match_writer.save_pairs(client, BENCH_DB, fuse_date, se_pair_list)
+        if saved["ok"]:
+            phases["persistence"] = perf_counter() - start
+        else:
+            skipped["persistence"] = f"write failed: {saved['error']}"
+    else:
+        skipped["persistence"] = "mongomock is not installed"
+
+    report["phases"] = _rounded(phases)
+    report["skipped"] = skipped
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--sizes",
+        default=",".join(str(size) for size in DEFAULT_SIZES),
+        help="comma separated attendee counts",
+    )
+    parser.add_argument("--regions", type=int, default=10)
+    parser.add_argument("--vips", type=int, default=2)
+    parser.add_argument("--ssems", type=int, default=4)
+    parser.add_argument("--sems", type=int, default=6)
+    parser.add_argument("--sessions", type=int, default=24, help="past sessions")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--engine", default="random", choices=sorted(match_engine.ENGINES)
+    )
+    parser.add_argument("--polish-seconds", type=float, default=0.0)
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--verbose", action="store_true", help="keep INFO logging")
+    args = parser.parse_args(argv)
+
+    if not args.verbose:
+        logging.disable(logging.INFO)
+
+    report: Dict[str, Any] = {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "store": "mongomock" if mongomock is not None else "memory",
+        "engine": args.engine,
+        "seed": args.seed,
+        "regions": args.regions,
+        "sessions": args.sessions,
+        "runs": [run_size(int(size), args) for size in args.sizes.split(",")],
+    }
+    report["failed"] = [run["attendees"] for run in report["runs"] if not run["ok"]]
+
+    text = json.dumps(report, indent=2, default=str)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as report_file:
+            report_file.write(text + "\n")
+    else:
+        print(text)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Match the attending SEs for an area and date from the command line.
+
+Runs the same se_select pipeline as the /match route, without a Flask session:
+attendees come from the {area}_attendance collection, or from a CSV with one
+SE per row, and the match CSV is written to --output.
+
+    python match_cli.py --db fuse-test --area cwa --date 06/14/2024 \\
+        --output matches.csv
+
+--dry-run pairs and writes the CSV but leaves cwa_matches untouched.
+--all-areas matches every area with attendance on --date concurrently, writes
+one CSV per area to --output-dir and prints a JSON timing report.
+"""
+import argparse
+import csv
+import json
+import logging
+import sys
+from typing import List, Optional, Set
+
+from modules import (
+    match_areas,
+    match_engine,
+    match_polish,
+    match_snapshot,
+    mongo_pool,
+)
+from modules.se_select import se_select
+
+# pylint: disable=logging-fstring-interpolation
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Header cells skipped when they head the first column of an attendee CSV
+CSV_HEADERS = {"se", "cco", "attended"}
+
+
+def read_attendee_csv(path: str) -> Set[str]:
+    """Return the SEs in the first column of a CSV, skipping a header row."""
+    attendees: Set[str] = set()
+    with open(path, newline="", encoding="utf-8") as attendee_file:
+        for line_number, row in enumerate(csv.reader(attendee_file), start=1):
+            se = row[0].strip() if row else ""
+            if not se or (line_number == 1 and se.lower() in CSV_HEADERS):
+                continue
+            attendees.add(se)
+    return attendees
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--db", required=True, help="user database, e.g. fuse-test")
+    parser.add_argument("--area", help="area, e.g. cwa")
+    parser.add_argument(
+        "--all-areas",
+        action="store_true",
+        help="match every area with attendance on --date at the same time",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=match_areas.MAX_AREA_WORKERS,
+        help="areas matched at once with --all-areas",
+    )
+    parser.add_argument(
+        "--output-dir",
+        default="match_files",
+        help="directory for the per-area CSVs with --all-areas",
+    )
+    parser.add_argument("--date", required=True, help="FUSE date, as stored")
+    parser.add_argument(
+        "--csv", help="read attendees from this CSV instead of {area}_attendance"
+    )
+    parser.add_argument(
+        "--output", help="match CSV to write (default: <date>-<area>-matches.csv)"
+    )
+    parser.add_argument(
+        "--mode", default="production", choices=("production", "debug")
+    )
+    parser.add_argument(
+        "--engine", default="random", choices=sorted(match_engine.ENGINES)
+    )
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument(
+        "--polish-seconds", type=float, default=match_polish.POLISH_SECONDS
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="write the CSV but do not save the pairs to cwa_matches",
+    )
+    args = parser.parse_args(argv)
+    if not args.all_areas and not args.area:
+        parser.error("--area is required unless --all-areas is given")
+    if args.all_areas and (args.csv or args.output):
+        parser.error("--csv and --output cannot be used with --all-areas")
+    return args
+
+
+def run_all_areas(args: argparse.Namespace) -> int:
+    """Match every area for args.date and print the timing report."""
+    try:
+        report = match_areas.match_areas(
+            args.date,
+            args.db,
+            args.mode,
+            workers=args.workers,
+            output_dir=args.output_dir,
+            test_mode=args.dry_run,
+            engine=args.engine,
+            seed=args.seed,
+            polish_seconds=args.polish_seconds,
+        )
+    finally:
+        mongo_pool.close_all()
+    print(json.dumps(report, indent=2))
+    return 0 if report["ok"] else 1
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    if args.all_areas:
+        return run_all_areas(args)
+    output_path = args.output or (
+        f"{args.date.replace('/', '_')}-{args.area}-matches.csv"
+    )
+
+    Mongo_Connection_URI = mongo_pool.get_client(args.db, args.mode)
+    if Mongo_Connection_URI is None:
+        logger.error(f"Error connecting to MongoDB ({args.db}).")
+        return 1
+
+    try:
+        if args.csv:
+            se_set = read_attendee_csv(args.csv)
+        else:
+            se_set = match_snapshot.load_attendance(
+                Mongo_Connection_URI, args.db, args.area, args.date
+            )
+        if len(se_set) < 2:
+            logger.error(f"Need at least 2 attendees, found {len(se_set)}.")
+            return 1
+
+        result = se_select(
+            args.date,
+            Mongo_Connection_URI,
+            se_set,
+            args.db,
+            args.mode,
+            test_mode=args.dry_run,
+            engine=args.engine,
+            seed=args.seed,
+            polish_seconds=args.polish_seconds,
+            output_path=output_path,
+        )
+    finally:
+        mongo_pool.close_all()
+
+    if result == 500:
+        logger.error("Matching failed.")
+        return 1
+    logger.info(f"Matched {len(se_set)} SEs. Pairs written to {output_path}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+import logging
+from datetime import date
+from itertools import combinations
+from logging.handlers import RotatingFileHandler
+from time import perf_counter
+from typing import Dict, List, Set
+
+import networkx as nx
+import numpy as np
+
+from modules.pair_history import NEVER
+
+# pylint: disable=logging-fstring-interpolation
+
+console_formatter = logging.Formatter(
+    "%(asctime)s - %(filename)s:%(lineno)d - %(name)s - %(levelname)s - %(message)s"
+)
+
+# Create a stream handler with the formatter
+console_handler = logging.StreamHandler()
+console_handler.setFormatter(console_formatter)
+console_handler.setLevel(logging.INFO)
+
+# Create a file handler for file logging
+file_handler = RotatingFileHandler(
+    "./logs/se_select.log", maxBytes=10 * 1024 * 1024, backupCount=5
+)  # 10 MB
+file_handler.setFormatter(console_formatter)
+file_handler.setLevel(logging.INFO)
+
+# Logging to Flask console
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+logger.addHandler(console_handler)
+logger.addHandler(file_handler)  # Add file handler to the logger
+logger.propagate = False
+
+VIP_REGION = 100
+SSEM_REGION = 0
+
+# Edge weights. Every pair gets an edge so a perfect matching always exists;
+# rule-breaking pairs only win when nothing else is left.
+BASE_WEIGHT = 1000
+ROLE_PENALTY = 900  # VIP/VIP, VIP/leader and leader/leader pairs
+SAME_REGION_PENALTY = 300
+RECENT_PAIRING_PENALTY = 600  # paired since the waterline date
+OLD_PAIRING_PENALTY = 100  # paired before the waterline, scaled by recency
+MIN_WEIGHT = 1
+
+
+def se_regions(se_dict: Dict[int, list]) -> Dict[str, int]:
+    """Map each SE in se_dict to its region index."""
+    return {se: region for region, values in se_dict.items() for se in values[1]}
+
+
+def weight_matrix(
+    history,
+    regions: Dict[str, int],
+    leaders: Set[str],
+    waterline_days: int,
+) -> np.ndarray:
+    """Score every candidate pair in the history matrix. Higher is better."""
+    ses = history.ses
+    region = np.array([regions.get(se, -1) for se in ses])
+    restricted = np.array(
+        [regions.get(se) == VIP_REGION or se in leaders for se in ses]
+    )
+    days = history.days
+
+    weights = np.full(days.shape, BASE_WEIGHT, dtype=np.int64)
+    weights -= ROLE_PENALTY * np.outer(restricted, restricted)
+    weights -= SAME_REGION_PENALTY * (
+        (region[:, None] == region[None, :]) & (region[:, None] != -1)
+    )
+
+    paired = days != NEVER
+    recent = paired & (days <= waterline_days)
+    old = paired & ~recent
+    weights -= RECENT_PAIRING_PENALTY * recent
+    # Older pairings cost less the longer ago they were
+    scaled = np.round(
+        OLD_PAIRING_PENALTY * max(waterline_days, 1) / np.maximum(days, 1)
+    ).astype(np.int64)
+    weights -= np.where(old, scaled, 0)
+
+    return np.maximum(weights, MIN_WEIGHT)
+
+
+def graph_match(
+    SEs: Set[str],
+    se_dict: Dict[int, list],
+    sem_set: Set[str],
+    history,
+    target_date: date,
+) -> List[List[str]]:
+    """
+    Pair every SE with a maximum-weight perfect matching.
+
+    Builds a complete graph over the attendees weighted by weight_matrix() and
+    solves it with the blossom algorithm. The result is deterministic and
+    needs no restarts.
+    """
+    start_graph = perf_counter()
+    regions = se_regions(se_dict)
+    zero_set = set(se_dict[SSEM_REGION][1]) if SSEM_REGION in se_dict else set()
+    leaders = zero_set | (sem_set & SEs)
+    waterline_days = (history.today - target_date).days
+    weights = weight_matrix(history, regions, leaders, waterline_days)
+
+    graph = nx.Graph()
+    idx = history.indexes(sorted(SEs))
+    graph.add_nodes_from(history.ses[i] for i in idx)
+    for a, b in combinations(idx, 2):
+        graph.add_edge(history.ses[a], history.ses[b], weight=int(weights[a, b]))
+    logger.info(
+        f" Graph built with {graph.number_of_nodes()} SEs and {graph.number_of_edges()} edges."
+    )
+
+    matching = nx.max_weight_matching(graph, maxcardinality=True)
+    se_pair_list = sorted(sorted(pair) for pair in matching)
+
+    total_weight = sum(graph[x][y]["weight"] for x, y in se_pair_list)
+    repeats = sum(1 for x, y in se_pair_list if history.paired_before(x, y))
+    same_region = sum(
+        1
+        for x, y in se_pair_list
+        if regions.get(x) is not None and regions.get(x) == regions.get(y)
+    )
+    end_graph = perf_counter()
+    logger.info(
+        f" Graph matching: {len(se_pair_list)} pairs, weight {total_weight}, "
+        f"{repeats} repeat pairings, {same_region} same-region pairs "
+        f"in {end_graph - start_graph:.6f} seconds."
+    )
+    return se_pair_list
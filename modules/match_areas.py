@@ -0,0 +1,289 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from logging.handlers import RotatingFileHandler
+from time import perf_counter
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+import modules.preferences.preferences as p
+from modules import match_polish, match_snapshot, mongo_pool
+from modules.se_select import se_select
+
+# pylint: disable=logging-fstring-interpolation
+
+console_formatter = logging.Formatter(
+    "%(asctime)s - %(filename)s:%(lineno)d - %(name)s - %(levelname)s - %(message)s"
+)
+
+# Create a stream handler with the formatter
+console_handler = logging.StreamHandler()
+console_handler.setFormatter(console_formatter)
+console_handler.setLevel(logging.INFO)
+
+# Create a file handler for file logging
+file_handler = RotatingFileHandler(
+    "./logs/se_select.log", maxBytes=10 * 1024 * 1024, backupCount=5
+)  # 10 MB
+file_handler.setFormatter(console_formatter)
+file_handler.setLevel(logging.INFO)
+
+# Logging to Flask console
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+logger.addHandler(console_handler)
+logger.addHandler(file_handler)  # Add file handler to the logger
+logger.propagate = False
+
+# Areas matched at the same time. Each holds a Mongo connection and a CPU core.
+MAX_AREA_WORKERS = 4
+ATTENDANCE_SUFFIX = "_attendance"
+
+
+def attendance_areas(Mongo_Connection_URI, user_db: str, fuse_date: str) -> List[str]:
+    """Return the areas with an {area}_attendance record for fuse_date."""
+    db = Mongo_Connection_URI[user_db]
+    areas = []
+    for name in sorted(db.list_collection_names()):
+        if not name.endswith(ATTENDANCE_SUFFIX):
+            continue
+        if db[name].find_one({"date": fuse_date}, {"_id": 1}) is not None:
+            areas.append(name[: -len(ATTENDANCE_SUFFIX)])
+    logger.info(f" Areas with attendance on {fuse_date}: {areas}")
+    return areas
+
+
+def area_output_path(output_dir: str, fuse_date: str, area: str) -> str:
+    return os.path.join(output_dir, f"{fuse_date.replace('/', '_')}-{area}-matches.csv")
+
+
+def matched_ses(se_set: Set[str]) -> Set[str]:
+    """The SEs se_select pairs for se_set: the FUSE host joins an odd count."""
+    return set(se_set) | {p.host} if len(se_set) % 2 else set(se_set)
+
+
+def overlap_groups(attendance: Dict[str, Set[str]]) -> List[List[str]]:
+    """
+    Group areas that share an SE, counting the FUSE host of odd areas.
+
+    Areas in one group write the same cwa_matches records, so they must not
+    run at the same time. Each group and the areas in it are sorted.
+    """
+    group_of = {area: area for area in attendance}
+
+    def root(area):
+        while group_of[area] != area:
+            area = group_of[area]
+        return area
+
+    owner: Dict[str, str] = {}
+    for area in sorted(attendance):
+        for se in matched_ses(attendance[area]):
+            if se in owner:
+                group_of[root(area)] = root(owner[se])
+            else:
+                owner[se] = area
+    groups: Dict[str, List[str]] = {}
+    for area in sorted(attendance):
+        groups.setdefault(root(area), []).append(area)
+    return sorted(groups.values())
+
+
+def _match_area(
+    area: str,
+    se_set,
+    fuse_date: str,
+    Mongo_Connection_URI,
+    user_db: str,
+    mode: str,
+    region_index: Dict[str, int],
+    output_path: str,
+    options: Dict[str, Any],
+) -> Dict[str, Any]:
+    """Run se_select for one area and time it, phase by phase."""
+    start_area = perf_counter()
+    phases: Dict[str, float] = {}
+
+    def progress(phase, **details):
+        phases[phase] = round(perf_counter() - start_area, 3)
+
+    result = se_select(
+        fuse_date,
+        Mongo_Connection_URI,
+        se_set,
+        user_db,
+        mode,
+        progress=progress,
+        output_path=output_path,
+        region_index=region_index,
+        **options,
+    )
+    return {
+        "area": area,
+        "attendees": len(se_set),
+        "ok": result != 500,
+        "output": output_path if result != 500 else None,
+        "seconds": round(perf_counter() - start_area, 3),
+        "phases": phases,
+    }
+
+
+def _match_group(
+    group: List[str],
+    attendance: Dict[str, Set[str]],
+    fuse_date: str,
+    Mongo_Connection_URI,
+    user_db: str,
+    mode: str,
+    region_index: Dict[str, int],
+    output_dir: str,
+    options: Dict[str, Any],
+) -> Dict[str, Dict[str, Any]]:
+    """Match the areas of one overlap group one after another."""
+    results = {}
+    for area in group:
+        try:
+            results[area] = _match_area(
+                area,
+                attendance[area],
+                fuse_date,
+                Mongo_Connection_URI,
+                user_db,
+                mode,
+                region_index,
+                area_output_path(output_dir, fuse_date, area),
+                options,
+            )
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            logger.error(f"Error matching {area}: {e}")
+            results[area] = {"area": area, "ok": False, "error": str(e)}
+        logger.info(f" Area {area} finished: {results[area]}")
+    return results
+
+
+def match_areas(
+    fuse_date: str,
+    user_db: str,
+    mode: str,
+    areas: Optional[Iterable[str]] = None,
+    workers: int = MAX_AREA_WORKERS,
+    output_dir: str = "match_files",
+    test_mode: bool = False,
+    engine: str = "random",
+    seed: Optional[int] = None,
+    polish_seconds: float = match_polish.POLISH_SECONDS,
+) -> Dict[str, Any]:
+    """
+    Match every area with a session on fuse_date at the same time.
+
+    areas defaults to every area with attendance on fuse_date. Areas run on a
+    pool of at most workers threads sharing the pooled Mongo client and one
+    read of cwa_regions; each area's CSV goes to output_dir.
+
+    Returns a report with per-area timings and the wall-clock time of the
+    whole run next to the sum of the area times. SEs attending more than one
+    area, the FUSE host of odd areas included, share one cwa_matches record.
+    They are listed under "overlaps", and areas that share any SE run one
+    after another in sorted order ("groups"), so the last area's pair is the
+    one stored, as when the areas are matched one at a time.
+    """
+    start_run = perf_counter()
+    report: Dict[str, Any] = {
+        "date": fuse_date,
+        "user_db": user_db,
+        "ok": False,
+        "areas": {},
+        "overlaps": {},
+    }
+    Mongo_Connection_URI = mongo_pool.get_client(user_db, mode)
+    if Mongo_Connection_URI is None:
+        report["error"] = f"Error connecting to MongoDB ({user_db})."
+        logger.error(report["error"])
+        return report
+
+    if areas is None:
+        areas = attendance_areas(Mongo_Connection_URI, user_db, fuse_date)
+    attendance = {
+        area: match_snapshot.load_attendance(
+            Mongo_Connection_URI, user_db, area, fuse_date
+        )
+        for area in areas
+    }
+    for area, se_set in list(attendance.items()):
+        if len(se_set) < 2:
+            logger.warning(f" Skipping {area}: {len(se_set)} attendees.")
+            report["areas"][area] = {
+                "area": area,
+                "attendees": len(se_set),
+                "ok": False,
+                "error": "fewer than 2 attendees",
+            }
+            del attendance[area]
+
+    seen: Dict[str, List[str]] = {}
+    for area, se_set in sorted(attendance.items()):
+        for se in matched_ses(se_set):
+            seen.setdefault(se, []).append(area)
+    report["overlaps"] = {
+        se: found for se, found in sorted(seen.items()) if len(found) > 1
+    }
+    groups = overlap_groups(attendance)
+    report["groups"] = groups
+    if report["overlaps"]:
+        logger.warning(
+            f" {len(report['overlaps'])} SEs attend more than one area: "
+            f"{sorted(report['overlaps'])}. Areas that share SEs run one after "
+            f"another: {[group for group in groups if len(group) > 1]}"
+        )
+
+    # cwa_regions is the same for every area, so read it once
+    region_index = match_snapshot.load_region_index(Mongo_Connection_URI, user_db)
+    os.makedirs(output_dir, exist_ok=True)
+    options = {
+        "test_mode": test_mode,
+        "engine": engine,
+        "seed": seed,
+        "polish_seconds": polish_seconds,
+    }
+
+    workers = max(1, min(workers, len(groups)))
+    report["workers"] = workers
+    with ThreadPoolExecutor(
+        max_workers=workers, thread_name_prefix="match_area"
+    ) as executor:
+        futures = {
+            executor.submit(
+                _match_group,
+                group,
+                attendance,
+                fuse_date,
+                Mongo_Connection_URI,
+                user_db,
+                mode,
+                region_index,
+                output_dir,
+                options,
+            ): group
+            for group in groups
+        }
+        for future in as_completed(futures):
+            group = futures[future]
+            try:
+                report["areas"].update(future.result())
+            except Exception as e:
+                logger.error(f"Error matching {group}: {e}")
+                for area in group:
+                    report["areas"][area] = {"area": area, "ok": False, "error": str(e)}
+
+    report["areas"] = dict(sorted(report["areas"].items()))
+    report["ok"] = bool(report["areas"]) and all(
+        result["ok"] for result in report["areas"].values()
+    )
+    report["seconds"] = round(perf_counter() - start_run, 3)
+    report["area_seconds"] = round(
+        sum(result.get("seconds", 0) for result in report["areas"].values()), 3
+    )
+    logger.info(
+        f" Matched {len(report['areas'])} areas in {report['seconds']} seconds with "
+        f"{workers} workers. Area times add up to {report['area_seconds']} seconds."
+    )
+    return report
@@ -0,0 +1,577 @@
+import logging
+import multiprocessing
+import os
+import random
+import secrets
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date
+from logging.handlers import RotatingFileHandler
+from statistics import median_high
+from time import perf_counter
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from modules import graph_match, match_score
+from modules.region_counts import RegionCounts
+from modules.se_pool import RolePools, SEPool, choice_from
+
+# pylint: disable=logging-fstring-interpolation
+
+console_formatter = logging.Formatter(
+    "%(asctime)s - %(filename)s:%(lineno)d - %(name)s - %(levelname)s - %(message)s"
+)
+
+# Create a stream handler with the formatter
+console_handler = logging.StreamHandler()
+console_handler.setFormatter(console_formatter)
+console_handler.setLevel(logging.INFO)
+
+# Create a file handler for file logging
+file_handler = RotatingFileHandler(
+    "./logs/se_select.log", maxBytes=10 * 1024 * 1024, backupCount=5
+)  # 10 MB
+file_handler.setFormatter(console_formatter)
+file_handler.setLevel(logging.INFO)
+
+# Logging to Flask console
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+logger.addHandler(console_handler)
+logger.addHandler(file_handler)  # Add file handler to the logger
+logger.propagate = False
+
+VIP_REGION = graph_match.VIP_REGION
+SSEM_REGION = graph_match.SSEM_REGION
+# Kobayashi Maru restarts allowed before a heuristic run gives up
+MAX_RESETS = 5
+# Independent attempts made by the best-of engine
+BEST_OF_ATTEMPTS = 8
+# SE-attempts (attendees x attempts) below which worker start-up costs more
+# than it saves and best-of runs in process
+PARALLEL_MIN_WORK = 50000
+# Run in process, best-of stops starting attempts once the next would take
+# it past this many times the first attempt's wall time
+SERIAL_BUDGET_ATTEMPTS = 2
+
+
+class MatchContext:
+    """
+    Everything a matching run needs, loaded before matching starts.
+
+    Engines treat the context as read-only and work on their own copies, so one
+    context can be matched many times, by several engines or threads.
+
+    Attributes:
+        SEs: attending SEs, including the FUSE host when the count is odd.
+        se_dict: {region index: [[region name], [SEs]]} for the attendees.
+        sem_set: attending SEMs.
+        se_assignment_count: {SE: number of past matches}.
+        top_ses: SEs above the assignment count percentile.
+        history: PairHistory for the attendees.
+        snapshot: MatchSnapshot the history and se_dict were built from.
+        target_date: waterline date; pairings since then count as recent.
+    """
+
+    def __init__(
+        self,
+        SEs: Iterable[str],
+        se_dict: Dict[int, list],
+        sem_set: Iterable[str],
+        se_assignment_count: Dict[str, int],
+        top_ses: Iterable[str],
+        history,
+        snapshot,
+        target_date: date,
+    ):
+        self.SEs = frozenset(SEs)
+        self.se_dict = se_dict
+        self.sem_set = frozenset(sem_set)
+        self.se_assignment_count = se_assignment_count
+        self.top_ses = frozenset(top_ses)
+        self.history = history
+        self.snapshot = snapshot
+        self.target_date = target_date
+
+
+class MatchEngineError(Exception):
+    """An engine's own state went wrong, e.g. an SE missing from its pools."""
+
+
+class MatchResult:
+    """Pairs returned by an engine, with diagnostics about the run."""
+
+    def __init__(self, pairs: Optional[List[List[str]]], diagnostics: Dict[str, Any]):
+        self.pairs = pairs
+        self.diagnostics = diagnostics
+
+    @property
+    def ok(self) -> bool:
+        return self.pairs is not None
+
+
+class MatchEngine:
+    """
+    Base class for matching strategies.
+
+    Subclasses implement pair(). All randomness must come from self.rng so a
+    run can be replayed from its seed. Deterministic engines set seeded to
+    False and leave the seed out of their diagnostics.
+    """
+
+    name = "base"
+    seeded = True
+
+    def __init__(self, seed: Optional[int] = None):
+        self.seed = seed if seed is not None else secrets.randbits(32)
+        self.rng = random.Random(self.seed)
+        self.resets = 0
+        # Engine-specific diagnostics, set by pair()
+        self.details: Dict[str, Any] = {}
+
+    def pair(
+        self, context: MatchContext, progress: Optional[Callable] = None
+    ) -> Optional[List[List[str]]]:
+        """Return the pairs for context, or None if no pairing was found."""
+        raise NotImplementedError
+
+    def match(
+        self, context: MatchContext, progress: Optional[Callable] = None
+    ) -> MatchResult:
+        """Run the engine over context and return pairs plus diagnostics."""
+        seed_note = f", seed {self.seed}" if self.seeded else ""
+        logger.info(
+            f"Matching {len(context.SEs)} SEs with {self.name} engine{seed_note}."
+        )
+        self.resets = 0
+        self.details = {}
+        start_match = perf_counter()
+        try:
+            pairs = self.pair(context, progress)
+        except MatchEngineError as e:
+            # Reported as a failed run, so callers return 500 as for no pairing
+            logger.error(f"{self.name} engine failed: {e}")
+            pairs = None
+            self.details["error"] = str(e)
+        end_match = perf_counter()
+        diagnostics = {"engine": self.name}
+        if self.seeded:
+            diagnostics["seed"] = self.seed
+        diagnostics.update(
+            resets=self.resets,
+            seconds=round(end_match - start_match, 6),
+            pairs=len(pairs) if pairs is not None else 0,
+            **self.details,
+        )
+        if pairs is not None:
+            diagnostics.update(match_score.score_pairs(pairs, context))
+        logger.info(f"Match diagnostics: {diagnostics}")
+        return MatchResult(pairs, diagnostics)
+
+
+def report_progress(progress, phase, **details) -> None:
+    """
+    Pass a progress event to the caller's hook, if one was given.
+
+    details are keyword fields such as pairs, remaining, se1, se2 or seconds.
+    """
+    if progress is not None:
+        progress(phase, **details)
+
+
+def cleanup_se(region: int, se: str, pools, region_counts) -> None:
+    """
+    Remove se from the SE pools and the region counts.
+
+    Raises MatchEngineError if se is not in the pools.
+    """
+    if se not in pools.all:
+        raise MatchEngineError(f"{se} not found in region {region}.")
+    pools.discard(se)
+    region_counts.discard(region)
+    logger.info(f" {se} removed from region {region}.")
+    if region not in region_counts:
+        logger.info(f" Region {region} has no SEs.")
+
+
+def last_match_date(se1, se2, target_date, history):
+    # Was the last match for se1 and se2 on or after the target date?
+    if history.paired_since(se1, se2, target_date):
+        logger.warning(f" {se1} and {se2} cannot be matched.")
+        return False
+    # Never matched, or last matched before target_date. Allow the match
+    logger.info(
+        f" {se1} was last matched with {se2} {history.days_since(se1, se2)} days ago."
+    )
+    return True
+
+
+class HeuristicEngine(MatchEngine):
+    """
+    The original se_select selection loop.
+
+    Picks SE1 by priority (VIPs, top SEs, leaders, the busiest region, then a
+    median-weighted random region) and SE2 from another region, avoiding past
+    partners. A dead end (Kobayashi Maru) restarts the whole run from the
+    context, up to MAX_RESETS times.
+    """
+
+    name = "random"
+
+    def pair(self, context, progress=None):
+        while True:
+            se_pair_list = self._attempt(context, progress)
+            if se_pair_list is not None:
+                return se_pair_list
+            if self.resets == MAX_RESETS:
+                logger.warning(
+                    f"Kobayashi Maru scenario encountered {MAX_RESETS} times. Exiting."
+                )
+                return None
+            self.resets += 1
+            logger.warning(
+                f"Kobayashi Maru scenario number {self.resets}. Reset and start over."
+            )
+            report_progress(progress, "kobayashi reset", pairs=0, resets=self.resets)
+
+    def _attempt(self, context, progress):
+        """One pass of the selection loop. Returns None on a Kobayashi Maru."""
+        rng = self.rng
+        history = context.history
+        # Pools start in sorted order so the same seed always walks the same path
+        pools = RolePools(context.se_dict, context.sem_set, context.top_ses)
+        se_pair_list: List[List[str]] = []
+        # Region counts are kept up to date by cleanup_se. The median of the
+        # assignment counts does not change during a run, so it is taken once.
+        se_median = (
+            median_high(list(context.se_assignment_count.values()))
+            if context.se_assignment_count
+            else None
+        )
+        region_counts = RegionCounts(context.se_dict, se_median)
+
+        while True:
+            count = region_counts.total
+            logger.info(f"SEs remaining: {count}")
+            if count == 0:
+                return se_pair_list
+
+            # The priority_region is the region with the most SEs, lowest index on a tie
+            priority_region, priority_count = region_counts.busiest()
+            priority_region_select = (
+                len(region_counts) > 2 and priority_count == count - priority_count
+            )
+            if priority_region_select:
+                logger.warning(
+                    f"Region {priority_region} has the same number of SEs as all other regions combined."
+                )
+
+            # calculate the percentage of SSEMs and SEMs to SEs
+            leader_percent = round((len(pools.ssems) + len(pools.sems)) / count * 100, 2)
+            logger.info(f" {leader_percent}% of SEs are leaders.")
+
+            if len(region_counts) == 1:
+                logger.warning(
+                    f"---> Remaining SEs are in one region: {pools.all.items}"
+                )
+                logger.warning("  *** Kobayashi Maru. Trigger reset. ***")
+                return None
+
+            # Pad with the busiest regions once enough SEs remain
+            region_plus_median = region_counts.plus_median(pad=count > 10)
+
+            """ SE1 section steps """
+
+            logger.info("SE1 selection begins.")
+
+            # Is a VIP attending?
+            if len(pools.vips) > 0:
+                se1 = pools.vips.choice(rng)
+                logger.info(f" SE1 {se1} selected as VIP from region 100.")
+
+            # Select an SE from top_ses
+            elif len(pools.top) > 0 and leader_percent <= 30:
+                se1 = pools.top.choice(rng)
+                logger.info(f" SE1 {se1} selected from top_ses.")
+
+            # If leader percentage is greater than 20%, select a leader
+            elif leader_percent > 20:
+                se1 = pools.leaders.choice(rng)
+                logger.info(" ---> High percentage of leaders. Selecting leader.")
+
+            # If priority_region_select is True, select SE1 from priority_region
+            elif priority_region_select is True:
+                se1 = pools.by_region[priority_region].choice(rng)
+                logger.info(" ----> Priority selection:")
+
+            else:
+                # Select a random SE of those remaining from region_plus_median
+                se1 = pools.by_region[rng.choice(region_plus_median)].choice(rng)
+
+            se1_region = pools.region[se1]
+            logger.info(f"SE1 {se1} selected from region {se1_region}.")
+
+            """ Profile SE1 """
+
+            if se1_region == VIP_REGION:
+                role = "VIP"
+            elif se1 in pools.ssems:
+                role = "SSEM"
+            elif se1 in pools.sems:
+                role = "SEM"
+            else:
+                role = "SE"
+            logger.info(f" --> {se1} is a {role}.")
+
+            # Clean up after selecting se1
+            cleanup_se(se1_region, se1, pools, region_counts)
+            region_plus_median = region_counts.plus_median(pad=count > 10)
+
+            """ SE2 section steps """
+            logger.info("SE2 selection begins.")
+
+            if role == "VIP":
+                # if se1 is VIP, select an se that is not a leader or VIP
+                candidates = (pools.regular,)
+            elif role in ("SSEM", "SEM"):
+                # if se1 is a leader, select an se that is not a leader
+                candidates = (pools.regular, pools.vips)
+            else:
+                # if se1 is SE, select from any other region
+                se2_region_select = [
+                    region for region in region_plus_median if region != se1_region
+                ]
+                candidates = (
+                    (pools.by_region[rng.choice(se2_region_select)],)
+                    if se2_region_select
+                    else ()
+                )
+            if sum(len(pool) for pool in candidates) == 0:
+                logger.warning(f" No SE2 candidates for {role} {se1}.")
+                logger.warning("  *** Kobayashi Maru. Trigger reset. ***")
+                return None
+            se2 = choice_from(rng, *candidates)
+            se2_region = pools.region[se2]
+            logger.info(f" SE2 {se2} selected from region {se2_region}.")
+
+            # Has se1 and se2 been paired before?
+            if history.paired_before(se1, se2):
+                logger.info(f" {se1} and {se2} have been paired before.")
+
+                if count == 2:
+                    logger.warning("Only one SE left and not a good match.")
+                    # Was a match made with SE1 since the waterline?
+                    if not last_match_date(se1, se2, context.target_date, history):
+                        return None
+                    logger.info(
+                        "  Previously matched longer than 2 years ago. Good match."
+                    )
+                else:
+                    # Pool of SEs that se1 has not been paired with
+                    se1_matchables = SEPool(history.unpaired(se1, pools.all.items))
+                    logger.info(f" Potential matches for se1: {len(se1_matchables)}")
+                    se2 = None
+                    while len(se1_matchables) > 0:
+                        candidate = se1_matchables.choice(rng)
+                        candidate_region = pools.region[candidate]
+                        # Not in the same region as se1, and no VIP/SSEM pairs
+                        if candidate_region != se1_region and not (
+                            se1_region == VIP_REGION and candidate_region == SSEM_REGION
+                        ):
+                            se2, se2_region = candidate, candidate_region
+                            break
+                        logger.warning(
+                            f" {se1} and {candidate} are not a good pairing. Try again."
+                        )
+                        se1_matchables.discard(candidate)
+                    if se2 is None:
+                        logger.warning(f" No more potential matches for {se1}.")
+                        logger.warning("  *** Kobayashi Maru. Trigger reset. ***")
+                        return None
+            else:
+                logger.info(f" {se1} and {se2} have not been paired before.")
+
+            # Clean up after selecting se2
+            cleanup_se(se2_region, se2, pools, region_counts)
+
+            se_pair_list.append([se1, se2])
+            report_progress(
+                progress,
+                "matching",
+                pairs=len(se_pair_list),
+                remaining=region_counts.total,
+                se1=se1,
+                se2=se2,
+            )
+            logger.debug(f"Paired {[se1, se2]}")
+
+
+class GraphEngine(MatchEngine):
+    """Maximum-weight perfect matching. Deterministic; the seed is unused."""
+
+    name = "graph"
+    seeded = False
+
+    def pair(self, context, progress=None):
+        report_progress(progress, "matching", remaining=len(context.SEs))
+        se_pair_list = graph_match.graph_match(
+            set(context.SEs),
+            context.se_dict,
+            set(context.sem_set),
+            context.history,
+            context.target_date,
+        )
+        report_progress(progress, "matching", pairs=len(se_pair_list), remaining=0)
+        return se_pair_list
+
+
+# Context shared by every attempt in a best-of worker process
+_worker_context: Optional[MatchContext] = None
+
+
+def _init_worker(context: MatchContext) -> None:
+    """Receive the context once per worker process and quiet per-step logging."""
+    global _worker_context  # pylint: disable=global-statement
+    _worker_context = context
+    logger.setLevel(logging.WARNING)
+
+
+def _run_attempt(engine_name: str, seed: int) -> Dict[str, Any]:
+    result = ENGINES[engine_name](seed=seed).match(_worker_context)
+    return {"pairs": result.pairs, "diagnostics": result.diagnostics}
+
+
+class BestOfEngine(MatchEngine):
+    """
+    Run several seeded heuristic attempts and keep the best scoring one.
+
+    Attempts run across a process pool. The context is sent to each worker
+    once and every attempt gets its own seed drawn from this engine's rng, so
+    the whole run replays from one seed. Failed attempts (too many resets) are
+    ignored; ties go to the earliest attempt.
+
+    Below PARALLEL_MIN_WORK, or with one worker, attempts run in process
+    within time_budget seconds (default: SERIAL_BUDGET_ATTEMPTS times the
+    first attempt), so a web request waits about as long as for one run.
+    """
+
+    name = "best"
+
+    def __init__(
+        self,
+        seed: Optional[int] = None,
+        attempts: int = BEST_OF_ATTEMPTS,
+        workers: Optional[int] = None,
+        engine: str = "random",
+        time_budget: Optional[float] = None,
+    ):
+        super().__init__(seed)
+        self.attempts = attempts
+        self.workers = workers or min(attempts, os.cpu_count() or 1)
+        self.engine = engine
+        self.time_budget = time_budget
+
+    def pair(self, context, progress=None):
+        seeds = [self.rng.randrange(2**32) for _ in range(self.attempts)]
+        results: Dict[int, Dict[str, Any]] = {}
+
+        parallel = len(context.SEs) * self.attempts >= PARALLEL_MIN_WORK
+        if self.workers > 1 and parallel:
+            try:
+                # spawn, not fork: the web app runs this from a worker thread
+                with ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(context,),
+                ) as executor:
+                    futures = {
+                        executor.submit(
+                            _run_attempt, self.engine, attempt_seed
+                        ): attempt
+                        for attempt, attempt_seed in enumerate(seeds)
+                    }
+                    for future in as_completed(futures):
+                        results[futures[future]] = future.result()
+                        self._report(progress, results)
+            except Exception as e:
+                logger.warning(
+                    f" Process pool failed, running attempts in process: {e}"
+                )
+                results = {}
+
+        if not results:
+            start_serial = perf_counter()
+            budget = self.time_budget
+            for attempt, attempt_seed in enumerate(seeds):
+                if attempt > 0:
+                    elapsed = perf_counter() - start_serial
+                    if budget is None:
+                        budget = SERIAL_BUDGET_ATTEMPTS * elapsed
+                    # Stop if another attempt of average length would overrun
+                    if elapsed + elapsed / attempt > budget:
+                        logger.info(
+                            f" Best-of time budget {budget:.3f}s used after "
+                            f"{attempt} attempts."
+                        )
+                        break
+                result = ENGINES[self.engine](seed=attempt_seed).match(context)
+                results[attempt] = {
+                    "pairs": result.pairs,
+                    "diagnostics": result.diagnostics,
+                }
+                self._report(progress, results)
+
+        scored = [
+            (result["diagnostics"]["score"], attempt)
+            for attempt, result in results.items()
+            if result["pairs"] is not None
+        ]
+        logger.info(
+            f" Best-of-{self.attempts}: {len(scored)} complete, scores "
+            f"{sorted(score for score, _ in scored)}"
+        )
+        self.details = {
+            "attempts": self.attempts,
+            "run": len(results),
+            "complete": len(scored),
+        }
+        if not scored:
+            self.resets = MAX_RESETS
+            return None
+        best_score, best_attempt = min(scored)
+        best = results[best_attempt]["diagnostics"]
+        self.resets = best["resets"]
+        self.details["best_seed"] = best["seed"]
+        logger.info(
+            f" Best attempt {best_attempt} (seed {best['seed']}) scored {best_score}."
+        )
+        return results[best_attempt]["pairs"]
+
+    def _report(self, progress, results) -> None:
+        scores = [
+            result["diagnostics"]["score"]
+            for result in results.values()
+            if result["pairs"] is not None
+        ]
+        report_progress(
+            progress,
+            "attempts",
+            attempts=len(results),
+            of=self.attempts,
+            best_score=min(scores) if scores else None,
+        )
+
+
+ENGINES = {
+    HeuristicEngine.name: HeuristicEngine,
+    GraphEngine.name: GraphEngine,
+    BestOfEngine.name: BestOfEngine,
+}
+
+
+def get_engine(name: str, seed: Optional[int] = None) -> MatchEngine:
+    """Return a new engine by name. Unknown names fall back to the heuristic."""
+    engine_class = ENGINES.get(name)
+    if engine_class is None:
+        logger.warning(f"Unknown match engine {name}. Using {HeuristicEngine.name}.")
+        engine_class = HeuristicEngine
+    return engine_class(seed=seed)
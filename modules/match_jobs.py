@@ -0,0 +1,414 @@
+import glob
+import hashlib
+import json
+import logging
+import os
+import re
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from threading import Condition, Lock
+from time import sleep, time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# pylint: disable=logging-fstring-interpolation, broad-exception-caught
+
+# Logging to Flask console
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MAX_WORKERS = 2
+# Finished jobs are kept this long so the status page can still read them
+JOB_TTL_SECONDS = 6 * 60 * 60
+# Progress events kept per job for the event stream
+MAX_EVENTS = 5000
+# How often a job's state file is rewritten while it runs
+STATE_SAVE_SECONDS = 0.5
+# How often a job running in another worker process is re-read
+POLL_SECONDS = 1.0
+
+# Job state lives on disk so any gunicorn worker can answer for any job:
+#   {job_id}.json    state, as to_dict() plus key, output and use_cache
+#   {job_id}.events  progress events, one JSON object per line
+#   results/{scope}-{attendee hash}.json  cached {job_id, result}
+MATCH_FOLDER = "match_files"
+JOB_FOLDER = os.path.join(MATCH_FOLDER, "jobs")
+RESULT_FOLDER = os.path.join(JOB_FOLDER, "results")
+JOB_ID_PATTERN = re.compile(r"[0-9a-f]{32}")
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_pid: Optional[int] = None
+_jobs: Dict[str, "MatchJob"] = {}
+_lock = Lock()
+
+
+def state_path(job_id: str) -> str:
+    return os.path.join(JOB_FOLDER, f"{job_id}.json")
+
+
+def events_path(job_id: str) -> str:
+    return os.path.join(JOB_FOLDER, f"{job_id}.events")
+
+
+def _write_json(path: str, data: Dict[str, Any]) -> None:
+    # Write then rename, so a reader never sees half a file
+    with open(f"{path}.tmp", "w", encoding="utf-8") as json_file:
+        json.dump(data, json_file)
+    os.replace(f"{path}.tmp", path)
+
+
+def _read_json(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, "r", encoding="utf-8") as json_file:
+            return json.load(json_file)
+    except (OSError, ValueError):
+        return None
+
+
+class MatchJob:
+    """
+    State of one background se_select run.
+
+    The worker that runs the job keeps it in memory and mirrors it to
+    JOB_FOLDER. Other workers load it from there (see get_job).
+    """
+
+    def __init__(
+        self,
+        job_id: str,
+        key: Tuple[str, str, str, str],
+        use_cache: bool = True,
+        local: bool = True,
+    ):
+        self.job_id = job_id
+        self.key = key
+        self.use_cache = use_cache
+        self.status = "queued"  # queued, running, done, failed
+        self.phase = "queued"
+        self.pairs = 0
+        self.remaining: Optional[int] = None
+        self.result: Optional[str] = None
+        self.error: Optional[str] = None
+        self.cached = False
+        self.output = os.path.join(
+            MATCH_FOLDER,
+            f"{key[2].replace('/', '_')}-{key[1]}-{job_id}-matches.csv",
+        )
+        self.submitted = time()
+        self.finished: Optional[float] = None
+        self.events: List[Dict[str, Any]] = []
+        self._event_seq = 0
+        self._saved = 0.0
+        # False for a job loaded from disk that runs in another process
+        self._local = local
+        self._changed = Condition()
+
+    def progress(self, phase: str, **details) -> None:
+        """Progress hook passed to se_select. Records a structured event."""
+        with self._changed:
+            phase_changed = phase != self.phase
+            self.phase = phase
+            if details.get("pairs") is not None:
+                self.pairs = details["pairs"]
+            if details.get("remaining") is not None:
+                self.remaining = details["remaining"]
+            self._event_seq += 1
+            event = {
+                "seq": self._event_seq,
+                "phase": phase,
+                "elapsed": round(time() - self.submitted, 2),
+                **{k: v for k, v in details.items() if v is not None},
+            }
+            self.events.append(event)
+            del self.events[:-MAX_EVENTS]
+            self._append_event(event)
+            if phase_changed or time() - self._saved >= STATE_SAVE_SECONDS:
+                self.save()
+            self._changed.notify_all()
+
+    def finish(self, status: str) -> None:
+        with self._changed:
+            self.status = status
+            self.phase = status
+            self.finished = time()
+            self.save()
+            self._changed.notify_all()
+
+    def _append_event(self, event: Dict[str, Any]) -> None:
+        try:
+            with open(events_path(self.job_id), "a", encoding="utf-8") as events:
+                events.write(json.dumps(event) + "\n")
+        except OSError as e:
+            logger.warning(f"Could not record event for match job {self.job_id}: {e}")
+
+    def save(self) -> None:
+        """Mirror the job's state to JOB_FOLDER."""
+        self._saved = time()
+        try:
+            _write_json(
+                state_path(self.job_id),
+                {
+                    **self.to_dict(),
+                    "key": list(self.key),
+                    "use_cache": self.use_cache,
+                    "output": self.output,
+                    "submitted": self.submitted,
+                    "finished": self.finished,
+                    "seq": self._event_seq,
+                },
+            )
+        except OSError as e:
+            logger.warning(f"Could not save match job {self.job_id}: {e}")
+
+    @classmethod
+    def load(cls, job_id: str) -> Optional["MatchJob"]:
+        """Read a job from JOB_FOLDER, or None if there is no such job."""
+        if not JOB_ID_PATTERN.fullmatch(job_id or ""):
+            return None
+        job = cls(job_id, ("", "", "", ""), local=False)
+        return job if job.refresh() else None
+
+    def refresh(self) -> bool:
+        """Re-read a job from JOB_FOLDER. Returns False if it is not there."""
+        state = _read_json(state_path(self.job_id))
+        if state is None:
+            return False
+        self.key = tuple(state["key"])
+        self.use_cache = state["use_cache"]
+        self.output = state["output"]
+        self.status = state["status"]
+        self.phase = state["phase"]
+        self.pairs = state["pairs"]
+        self.remaining = state["remaining"]
+        self.result = state["result"]
+        self.error = state["error"]
+        self.cached = state["cached"]
+        self.submitted = state["submitted"]
+        self.finished = state["finished"]
+        # Events are written before the state, so a finished state means
+        # every event is already in the file
+        events: List[Dict[str, Any]] = []
+        try:
+            with open(events_path(self.job_id), "r", encoding="utf-8") as lines:
+                for line in lines:
+                    try:
+                        events.append(json.loads(line))
+                    except ValueError:
+                        # The running worker may be halfway through a line
+                        break
+        except OSError:
+            pass
+        self.events = events[-MAX_EVENTS:]
+        return True
+
+    def stream(self, after: int = 0, timeout: float = 15.0) -> Iterator[Dict[str, Any]]:
+        """
+        Yield progress events with seq > after as they arrive.
+
+        Yields an empty dict every timeout seconds without news so callers can
+        send a keep-alive. Stops once the job has finished and every event has
+        been yielded.
+        """
+        if not self._local:
+            yield from self._poll(after, timeout)
+            return
+        while True:
+            with self._changed:
+                pending = [event for event in self.events if event["seq"] > after]
+                if not pending and self.finished is None:
+                    self._changed.wait(timeout)
+                    pending = [event for event in self.events if event["seq"] > after]
+                finished = self.finished is not None
+            for event in pending:
+                after = event["seq"]
+                yield event
+            if not pending and not finished:
+                yield {}
+            if finished and not pending:
+                return
+
+    def _poll(self, after: int, timeout: float) -> Iterator[Dict[str, Any]]:
+        """stream() for a job running in another worker: re-read the files."""
+        waited = 0.0
+        while self.refresh():
+            pending = [event for event in self.events if event["seq"] > after]
+            for event in pending:
+                after = event["seq"]
+                yield event
+            if self.finished is not None:
+                return
+            if pending:
+                waited = 0.0
+                continue
+            sleep(POLL_SECONDS)
+            waited += POLL_SECONDS
+            if waited >= timeout:
+                waited = 0.0
+                yield {}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "phase": self.phase,
+            "pairs": self.pairs,
+            "remaining": self.remaining,
+            "result": self.result,
+            "error": self.error,
+            "cached": self.cached,
+            "elapsed": round((self.finished or time()) - self.submitted, 2),
+        }
+
+
+def cache_key(
+    user_db: str, area: str, fuse_date: str, se_set: Iterable[str]
+) -> Tuple[str, str, str, str]:
+    """Key a match result by database, area, date and attendee set."""
+    attendees = "\n".join(sorted(se_set))
+    digest = hashlib.sha256(attendees.encode("utf-8")).hexdigest()
+    return (user_db, area, fuse_date, digest)
+
+
+def _scope(user_db: str, area: str, fuse_date: str) -> str:
+    """Prefix of the result files for one database, area and date."""
+    scope = f"{user_db}\n{area}\n{fuse_date}"
+    return hashlib.sha256(scope.encode("utf-8")).hexdigest()[:16]
+
+
+def result_path(key: Tuple[str, str, str, str]) -> str:
+    return os.path.join(RESULT_FOLDER, f"{_scope(*key[:3])}-{key[3]}.json")
+
+
+def invalidate(user_db: str, area: str, fuse_date: str) -> None:
+    """Forget every cached result for an area and date, e.g. after a save."""
+    for path in glob.glob(
+        os.path.join(RESULT_FOLDER, f"{_scope(user_db, area, fuse_date)}-*.json")
+    ):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _cached_result(key: Tuple[str, str, str, str]) -> Optional[Dict[str, Any]]:
+    """The cached {job_id, result} for key, if its match file still exists."""
+    cached = _read_json(result_path(key))
+    if cached is None:
+        return None
+    if not os.path.exists(os.path.join(MATCH_FOLDER, cached["result"])):
+        invalidate(*key[:3])
+        return None
+    return cached
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Create the worker pool lazily, once per process."""
+    global _executor, _executor_pid  # pylint: disable=global-statement
+    if _executor is None or _executor_pid != os.getpid():
+        _executor = ThreadPoolExecutor(
+            max_workers=MAX_WORKERS, thread_name_prefix="match_job"
+        )
+        _executor_pid = os.getpid()
+    return _executor
+
+
+def _expire_jobs() -> None:
+    """
+    Drop finished jobs older than JOB_TTL_SECONDS: their state and events.
+
+    Match files are kept, so download and preview links keep working.
+    """
+    cutoff = time() - JOB_TTL_SECONDS
+    for job_id in [
+        job_id
+        for job_id, job in _jobs.items()
+        if job.finished is not None and job.finished < cutoff
+    ]:
+        del _jobs[job_id]
+    for path in glob.glob(os.path.join(JOB_FOLDER, "*.json")):
+        try:
+            if os.path.getmtime(path) >= cutoff:
+                continue
+            state = _read_json(path) or {}
+            if state.get("finished") is None:
+                continue
+            job_id = os.path.basename(path)[: -len(".json")]
+            for stale in (events_path(job_id), path):
+                if os.path.exists(stale):
+                    os.remove(stale)
+        except OSError as e:
+            logger.warning(f"Could not expire match job file {path}: {e}")
+
+
+def _run(job: MatchJob, target: Callable, args: tuple, kwargs: dict) -> None:
+    job.status = "running"
+    job.phase = "starting"
+    job.save()
+    logger.info(f"Match job {job.job_id} started.")
+    try:
+        status = target(*args, progress=job.progress, output_path=job.output, **kwargs)
+    except Exception as e:
+        logger.error(f"Match job {job.job_id} failed: {e}")
+        job.error = str(e)
+        job.finish("failed")
+    else:
+        if status in (500, "500"):
+            job.error = "Matching failed. Check the se_select log."
+            job.finish("failed")
+        else:
+            job.result = status if status == "NA" else os.path.basename(status)
+            if status != "NA":
+                # The stored pairs changed, so no earlier result is current
+                invalidate(*job.key[:3])
+                if job.use_cache:
+                    try:
+                        _write_json(
+                            result_path(job.key),
+                            {"job_id": job.job_id, "result": job.result},
+                        )
+                    except OSError as e:
+                        logger.warning(f"Could not cache match job {job.job_id}: {e}")
+            job.finish("done")
+    logger.info(f"Match job {job.job_id} {job.status} in {job.to_dict()['elapsed']}s.")
+
+
+def submit(
+    key: Tuple[str, str, str, str],
+    target: Callable,
+    *args,
+    use_cache: bool = True,
+    **kwargs,
+) -> MatchJob:
+    """
+    Run target(*args, progress=..., output_path=..., **kwargs) in the background.
+
+    Returns the job straight away. The match file is written to a path unique
+    to the job. If a previous run with the same key already produced a match
+    file, the job is marked done with that file and target is not run again.
+    use_cache=False always runs target; use it for targets such as se_rematch
+    whose result depends on the stored pairs rather than only on the key.
+    Either way, a run that saves pairs invalidates the key's area and date.
+    """
+    os.makedirs(RESULT_FOLDER, exist_ok=True)
+    job = MatchJob(uuid.uuid4().hex, key, use_cache)
+    with _lock:
+        _expire_jobs()
+        _jobs[job.job_id] = job
+    cached = _cached_result(key) if use_cache else None
+    if cached is not None:
+        logger.info(f"Match job {job.job_id} served from cache: {cached['result']}")
+        job.result = cached["result"]
+        job.cached = True
+        job.finish("done")
+        return job
+    job.save()
+    _get_executor().submit(_run, job, target, args, kwargs)
+    return job
+
+
+def get_job(job_id: str) -> Optional[MatchJob]:
+    """The job with job_id, whichever worker process runs it."""
+    with _lock:
+        job = _jobs.get(job_id)
+    if job is not None:
+        return job
+    return MatchJob.load(job_id)
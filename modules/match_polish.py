@@ -0,0 +1,99 @@
+import logging
+from logging.handlers import RotatingFileHandler
+from time import perf_counter
+from typing import Dict, List, Tuple
+
+from modules.match_score import PairScorer, score_pairs
+
+# pylint: disable=logging-fstring-interpolation
+
+console_formatter = logging.Formatter(
+    "%(asctime)s - %(filename)s:%(lineno)d - %(name)s - %(levelname)s - %(message)s"
+)
+
+# Create a stream handler with the formatter
+console_handler = logging.StreamHandler()
+console_handler.setFormatter(console_formatter)
+console_handler.setLevel(logging.INFO)
+
+# Create a file handler for file logging
+file_handler = RotatingFileHandler(
+    "./logs/se_select.log", maxBytes=10 * 1024 * 1024, backupCount=5
+)  # 10 MB
+file_handler.setFormatter(console_formatter)
+file_handler.setLevel(logging.INFO)
+
+# Logging to Flask console
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+logger.addHandler(console_handler)
+logger.addHandler(file_handler)  # Add file handler to the logger
+logger.propagate = False
+
+# Wall-clock budget for polishing one pairing when polishing is asked for. The
+# web routes polish only if the area's admins record sets polish_seconds.
+POLISH_SECONDS = 1.0
+
+
+def polish(
+    pairs: List[List[str]], context, time_budget: float = POLISH_SECONDS
+) -> Tuple[List[List[str]], Dict[str, float], Dict[str, float]]:
+    """
+    Improve a complete pairing with 2-opt swaps.
+
+    For each pair that scores above zero, tries re-pairing its two SEs with
+    the two SEs of every other pair, (a, b)(c, d) -> (a, c)(b, d) or
+    (a, d)(b, c), and applies the swap that lowers the score most. Swaps that
+    would put a VIP or leader with another VIP or leader are never made.
+    Passes repeat until nothing improves or time_budget seconds run out.
+
+    Returns (pairs, score before, score after). The input list is not changed.
+    """
+    start_polish = perf_counter()
+    deadline = start_polish + time_budget
+    scorer = PairScorer(context)
+    pairs = [list(pair) for pair in pairs]
+    costs = [scorer.cost(x, y) for x, y in pairs]
+    before = score_pairs(pairs, context, scorer)
+
+    swaps = 0
+    passes = 0
+    improved = True
+    while improved and perf_counter() < deadline:
+        improved = False
+        passes += 1
+        for i in [i for i, cost in enumerate(costs) if cost > 0]:
+            if perf_counter() >= deadline:
+                break
+            if costs[i] == 0:
+                # Already fixed by an earlier swap this pass
+                continue
+            a, b = pairs[i]
+            best_delta, best_swap = 0.0, None
+            for j, (c, d) in enumerate(pairs):
+                if j == i:
+                    continue
+                current = costs[i] + costs[j]
+                for first, second in (((a, c), (b, d)), ((a, d), (b, c))):
+                    if not (scorer.allowed(*first) and scorer.allowed(*second)):
+                        continue
+                    first_cost = scorer.cost(*first)
+                    second_cost = scorer.cost(*second)
+                    delta = first_cost + second_cost - current
+                    if delta < best_delta:
+                        best_delta = delta
+                        best_swap = (j, first, second, first_cost, second_cost)
+            if best_swap is not None:
+                j, first, second, first_cost, second_cost = best_swap
+                pairs[i], pairs[j] = list(first), list(second)
+                costs[i], costs[j] = first_cost, second_cost
+                swaps += 1
+                improved = True
+
+    after = score_pairs(pairs, context, scorer)
+    end_polish = perf_counter()
+    logger.info(
+        f" Polish: score {before['score']} -> {after['score']} with {swaps} swaps "
+        f"in {passes} passes, {end_polish - start_polish:.6f} seconds."
+    )
+    return pairs, before, after
@@ -0,0 +1,91 @@
+from typing import Dict, List, Optional, Tuple
+
+from modules.graph_match import SSEM_REGION, VIP_REGION, se_regions
+from modules.pair_history import NEVER
+
+# Penalty points per pairing problem. Lower totals are better.
+REPEAT_PENALTY = 10  # paired at any time before
+RECENT_REPEAT_PENALTY = 100  # paired since the waterline date
+SAME_REGION_PENALTY = 5
+LEADER_PAIR_PENALTY = 20  # two leaders, or a VIP with a leader or VIP
+RECENCY_PENALTY = 10  # scaled by how recent an older repeat was
+
+
+class PairScorer:
+    """Score single pairs against a MatchContext. Built once per pairing."""
+
+    def __init__(self, context):
+        self.regions = se_regions(context.se_dict)
+        self.history = context.history
+        self.leaders = (
+            set(context.se_dict.get(SSEM_REGION, [[], []])[1]) | context.sem_set
+        )
+        self.waterline_days = max((self.history.today - context.target_date).days, 1)
+
+    def restricted(self, se: str) -> bool:
+        """VIPs and leaders may not be paired with each other."""
+        return self.regions.get(se) == VIP_REGION or se in self.leaders
+
+    def allowed(self, x: str, y: str) -> bool:
+        return not (self.restricted(x) and self.restricted(y))
+
+    def problems(self, x: str, y: str) -> Tuple[int, int, int, int, float]:
+        """Return (repeat, recent repeat, same region, leader pair, recency)."""
+        history = self.history
+        if x in history.index and y in history.index:
+            days = history.days_since(x, y)
+        else:
+            days = NEVER
+        repeat = recent = 0
+        recency = 0.0
+        if days != NEVER:
+            repeat = 1
+            if days <= self.waterline_days:
+                recent = 1
+            else:
+                recency = self.waterline_days / days
+        region_x = self.regions.get(x)
+        same_region = int(region_x is not None and region_x == self.regions.get(y))
+        leader_pair = int(not self.allowed(x, y))
+        return repeat, recent, same_region, leader_pair, recency
+
+    def cost(self, x: str, y: str) -> float:
+        repeat, recent, same_region, leader_pair, recency = self.problems(x, y)
+        return (
+            REPEAT_PENALTY * repeat
+            + RECENT_REPEAT_PENALTY * recent
+            + SAME_REGION_PENALTY * same_region
+            + LEADER_PAIR_PENALTY * leader_pair
+            + RECENCY_PENALTY * recency
+        )
+
+
+def score_pairs(
+    pairs: List[List[str]], context, scorer: Optional[PairScorer] = None
+) -> Dict[str, float]:
+    """
+    Score a complete pairing against a MatchContext.
+
+    Returns the count of each kind of problem and their weighted total in
+    "score". Lower is better; a pairing with no problems scores 0.
+    """
+    scorer = scorer or PairScorer(context)
+    repeats = recent_repeats = same_region = leader_pairs = 0
+    recency = 0.0
+    score = 0.0
+    for x, y in pairs:
+        repeat, recent, same, leader_pair, pair_recency = scorer.problems(x, y)
+        repeats += repeat
+        recent_repeats += recent
+        same_region += same
+        leader_pairs += leader_pair
+        recency += pair_recency
+        score += scorer.cost(x, y)
+    return {
+        "score": round(score, 3),
+        "repeats": repeats,
+        "recent_repeats": recent_repeats,
+        "same_region": same_region,
+        "leader_pairs": leader_pairs,
+        "recency": round(recency, 3),
+    }
@@ -0,0 +1,232 @@
+import logging
+from datetime import date, datetime
+from logging.handlers import RotatingFileHandler
+from time import perf_counter, sleep
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from pymongo.errors import ConnectionFailure
+
+# pylint: disable=logging-fstring-interpolation
+
+console_formatter = logging.Formatter(
+    "%(asctime)s - %(filename)s:%(lineno)d - %(name)s - %(levelname)s - %(message)s"
+)
+
+# Create a stream handler with the formatter
+console_handler = logging.StreamHandler()
+console_handler.setFormatter(console_formatter)
+console_handler.setLevel(logging.INFO)
+
+# Create a file handler for file logging
+file_handler = RotatingFileHandler(
+    "./logs/se_select.log", maxBytes=10 * 1024 * 1024, backupCount=5
+)  # 10 MB
+file_handler.setFormatter(console_formatter)
+file_handler.setLevel(logging.INFO)
+
+# Logging to Flask console
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+logger.addHandler(console_handler)
+logger.addHandler(file_handler)  # Add file handler to the logger
+logger.propagate = False
+
+# Assignment keys have been written as both MM/DD/YYYY and YYYY-MM-DD
+ASSIGNMENT_DATE_FORMATS = ("%m/%d/%Y", "%Y-%m-%d")
+
+
+def parse_assignment_date(value: str) -> Optional[date]:
+    """Parse an assignments key into a date. Returns None if unrecognised."""
+    for date_format in ASSIGNMENT_DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format).date()
+        except ValueError:
+            continue
+    return None
+
+
+class MatchSnapshot:
+    """
+    In-memory copy of everything the se_select loop reads from Mongo.
+
+    Holds the cwa_matches assignments, the cwa_SEs records and the cwa_regions
+    indexes for the attending SEs so the selection loop never goes back to the
+    database.
+    """
+
+    def __init__(
+        self,
+        assignments: Dict[str, Dict[str, str]],
+        se_info: Dict[str, Dict[str, Any]],
+        region_index: Dict[str, int],
+    ):
+        self.assignments = assignments
+        self.se_info = se_info
+        self.region_index = region_index
+
+    def partners(self, se: str) -> Set[str]:
+        """Return every SE that se has been paired with."""
+        return set(self.assignments.get(se, {}).values())
+
+    def paired_before(self, se1: str, se2: str) -> bool:
+        return se2 in self.partners(se1) or se1 in self.partners(se2)
+
+    def last_match_date(self, se1: str, se2: str) -> Optional[date]:
+        """Return the most recent date se1 and se2 were paired, if ever."""
+        last = None
+        for assignment_date, partner in self.assignments.get(se1, {}).items():
+            if partner != se2:
+                continue
+            match_date = parse_assignment_date(assignment_date)
+            if match_date is not None and (last is None or match_date > last):
+                last = match_date
+        return last
+
+    def region(self, se: str) -> Tuple[Optional[int], Optional[str]]:
+        """Return (region index, region name) for se."""
+        info = self.se_info.get(se)
+        if info is None:
+            return None, None
+        region_name = info.get("region")
+        return self.region_index.get(region_name), region_name
+
+    def se_name(self, se: str) -> Optional[str]:
+        info = self.se_info.get(se)
+        return info.get("se_name") if info else None
+
+    def merge(self, other: "MatchSnapshot") -> None:
+        """Add the records loaded in another snapshot to this one."""
+        self.assignments.update(other.assignments)
+        self.se_info.update(other.se_info)
+        self.region_index.update(other.region_index)
+
+
+def _find_with_retry(collection, query: dict, projection: dict) -> List[dict]:
+    """Run a find and drain the cursor, retrying on connection failures."""
+    for _ in range(5):
+        try:
+            return list(collection.find(query, projection))
+        except ConnectionFailure as e:
+            logger.warning(
+                f" *** Connect error reading {collection.name} collection."
+            )
+            logger.warning(f" *** Sleeping for {pow(2, _)} seconds and trying again.")
+            sleep(pow(2, _))
+            logger.warning(e)
+    logger.error(f" *** Failed to read {collection.name} collection. Mongo is down.")
+    return []
+
+
+def load_snapshot(
+    Mongo_Connection_URI,
+    user_db: str,
+    SEs: Iterable[str],
+    region_index: Optional[Dict[str, int]] = None,
+) -> MatchSnapshot:
+    """
+    Load the pairing history, SE records and regions for SEs.
+
+    Uses one $in query per collection: cwa_matches, cwa_SEs and cwa_regions.
+    A region_index from load_region_index() replaces the cwa_regions query, so
+    runs for several areas can share one read of it.
+    """
+    start_snapshot = perf_counter()
+    se_list = list(SEs)
+    db = Mongo_Connection_URI[user_db]
+
+    assignments = {
+        doc["SE"]: doc.get("assignments") or {}
+        for doc in _find_with_retry(
+            db["cwa_matches"],
+            {"SE": {"$in": se_list}},
+            {"_id": 0, "SE": 1, "assignments": 1},
+        )
+    }
+    se_info = {
+        doc["se"]: doc
+        for doc in _find_with_retry(
+            db["cwa_SEs"],
+            {"se": {"$in": se_list}},
+            {"_id": 0, "se": 1, "se_name": 1, "region": 1},
+        )
+    }
+    region_names = list({doc.get("region") for doc in se_info.values()})
+    if region_index is None:
+        region_index = {
+            doc["Region"]: doc.get("Index")
+            for doc in _find_with_retry(
+                db["cwa_regions"],
+                {"Region": {"$in": region_names}},
+                {"_id": 0, "Region": 1, "Index": 1},
+            )
+        }
+    else:
+        shared = region_index
+        region_index = {name: shared[name] for name in region_names if name in shared}
+
+    end_snapshot = perf_counter()
+    logger.info(
+        f" Loaded snapshot of {len(assignments)} match records, {len(se_info)} SEs "
+        f"and {len(region_index)} regions in {end_snapshot - start_snapshot:.6f} seconds."
+    )
+    return MatchSnapshot(assignments, se_info, region_index)
+
+
+def load_region_index(Mongo_Connection_URI, user_db: str) -> Dict[str, int]:
+    """Return {region name: index} for the whole cwa_regions collection."""
+    region_index = {
+        doc["Region"]: doc.get("Index")
+        for doc in _find_with_retry(
+            Mongo_Connection_URI[user_db]["cwa_regions"],
+            {},
+            {"_id": 0, "Region": 1, "Index": 1},
+        )
+    }
+    logger.info(f" Loaded {len(region_index)} regions from cwa_regions.")
+    return region_index
+
+
+def load_date_pairs(
+    Mongo_Connection_URI,
+    user_db: str,
+    fuse_date: str,
+    SEs: Optional[Iterable[str]] = None,
+) -> Dict[str, str]:
+    """
+    Return {SE: partner} for every SE with an assignment on fuse_date.
+
+    cwa_matches is shared by every area. With SEs, only the assignments of
+    those SEs and of SEs paired with one of them are returned.
+    """
+    field = f"assignments.{fuse_date}"
+    query: Dict[str, Any] = {field: {"$exists": True}}
+    if SEs is not None:
+        se_list = list(SEs)
+        query = {
+            "$or": [
+                {"SE": {"$in": se_list}, field: {"$exists": True}},
+                {field: {"$in": se_list}},
+            ]
+        }
+    docs = _find_with_retry(
+        Mongo_Connection_URI[user_db]["cwa_matches"],
+        query,
+        {"_id": 0, "SE": 1, field: 1},
+    )
+    pairs = {doc["SE"]: doc["assignments"][fuse_date] for doc in docs}
+    logger.info(f" Loaded {len(pairs)} stored assignments for {fuse_date}.")
+    return pairs
+
+
+def load_attendance(
+    Mongo_Connection_URI, user_db: str, area: str, fuse_date: str
+) -> Set[str]:
+    """Return the attending SEs recorded in {area}_attendance for fuse_date."""
+    docs = _find_with_retry(
+        Mongo_Connection_URI[user_db][f"{area}_attendance"],
+        {"date": fuse_date},
+        {"_id": 0, "attended": 1},
+    )
+    attended = set(docs[0].get("attended") or []) if docs else set()
+    logger.info(f" Loaded {len(attended)} attendees for {area} on {fuse_date}.")
+    return attended
@@ -0,0 +1,171 @@
+import logging
+from logging.handlers import RotatingFileHandler
+from time import perf_counter, sleep
+from typing import Any, Dict, Iterable, List
+
+from pymongo import UpdateOne
+from pymongo.errors import (
+    BulkWriteError,
+    ConfigurationError,
+    ConnectionFailure,
+    OperationFailure,
+)
+
+# pylint: disable=logging-fstring-interpolation
+
+console_formatter = logging.Formatter(
+    "%(asctime)s - %(filename)s:%(lineno)d - %(name)s - %(levelname)s - %(message)s"
+)
+
+# Create a stream handler with the formatter
+console_handler = logging.StreamHandler()
+console_handler.setFormatter(console_formatter)
+console_handler.setLevel(logging.INFO)
+
+# Create a file handler for file logging
+file_handler = RotatingFileHandler(
+    "./logs/se_select.log", maxBytes=10 * 1024 * 1024, backupCount=5
+)  # 10 MB
+file_handler.setFormatter(console_formatter)
+file_handler.setLevel(logging.INFO)
+
+# Logging to Flask console
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+logger.addHandler(console_handler)
+logger.addHandler(file_handler)  # Add file handler to the logger
+logger.propagate = False
+
+
+def pair_operations(
+    se_pair_list: List[List[str]], fuse_date: str, unset: Iterable[str] = ()
+) -> List[UpdateOne]:
+    """
+    Build one upserting UpdateOne per SE: each side of a pair records the other.
+
+    SEs in unset get their assignment for fuse_date removed instead.
+    """
+    assignment_date = f"assignments.{fuse_date}"
+    operations = [
+        UpdateOne({"SE": se}, {"$unset": {assignment_date: ""}})
+        for se in sorted(unset)
+    ]
+    for x, y in se_pair_list:
+        operations.append(
+            UpdateOne({"SE": x}, {"$set": {assignment_date: y}}, upsert=True)
+        )
+        operations.append(
+            UpdateOne({"SE": y}, {"$set": {assignment_date: x}}, upsert=True)
+        )
+    return operations
+
+
+# Raised by servers without transaction support (standalone mongod)
+TRANSACTIONS_UNSUPPORTED_CODE = 20
+TRANSACTIONS_UNSUPPORTED_MESSAGE = (
+    "Transaction numbers are only allowed on a replica set"
+)
+
+
+def _transactions_unsupported(e: OperationFailure) -> bool:
+    """True if the server rejected the transaction itself, not the writes."""
+    if isinstance(e, BulkWriteError):
+        return False
+    return (
+        e.code == TRANSACTIONS_UNSUPPORTED_CODE
+        or TRANSACTIONS_UNSUPPORTED_MESSAGE in str(e)
+    )
+
+
+def _bulk_write(collection, operations: List[UpdateOne]) -> Dict[str, Any]:
+    """
+    Write operations in one unordered bulk_write, inside a transaction when
+    the deployment supports it. Standalone servers (IllegalOperation) and
+    clients without session support fall back to a plain bulk_write, which is
+    still idempotent because every operation is a $set upsert. Any other
+    OperationFailure is raised.
+    """
+    client = collection.database.client
+    try:
+        with client.start_session() as mongo_session:
+            result = mongo_session.with_transaction(
+                lambda s: collection.bulk_write(operations, ordered=False, session=s)
+            )
+        transaction = True
+    except (ConfigurationError, OperationFailure, NotImplementedError) as e:
+        if isinstance(e, OperationFailure) and not _transactions_unsupported(e):
+            raise
+        logger.warning(f" Transactions unavailable, writing without one: {e}")
+        result = collection.bulk_write(operations, ordered=False)
+        transaction = False
+    return {
+        "matched": result.matched_count,
+        "modified": result.modified_count,
+        "upserted": result.upserted_count,
+        "transaction": transaction,
+    }
+
+
+def save_pairs(
+    Mongo_Connection_URI,
+    user_db: str,
+    fuse_date: str,
+    se_pair_list: List[List[str]],
+    unset: Iterable[str] = (),
+) -> Dict[str, Any]:
+    """
+    Persist the run's pairings to cwa_matches with a single bulk write.
+
+    SEs in unset lose their assignment for fuse_date in the same write.
+
+    Returns a summary dict. summary["ok"] is False if the write failed after
+    retries; summary["error"] then holds the reason.
+    """
+    start_save = perf_counter()
+    operations = pair_operations(se_pair_list, fuse_date, unset)
+    summary: Dict[str, Any] = {
+        "ok": False,
+        "pairs": len(se_pair_list),
+        "operations": len(operations),
+        "matched": 0,
+        "modified": 0,
+        "upserted": 0,
+        "transaction": False,
+        "error": None,
+    }
+    if not operations:
+        summary["ok"] = True
+        return summary
+
+    collection = Mongo_Connection_URI[user_db]["cwa_matches"]
+    for _ in range(5):
+        try:
+            summary.update(_bulk_write(collection, operations))
+            summary["ok"] = True
+            break
+        except ConnectionFailure as e:
+            logger.warning(" *** Connect error writing cwa_matches collection.")
+            logger.warning(f" *** Sleeping for {pow(2, _)} seconds and trying again.")
+            sleep(pow(2, _))
+            logger.warning(e)
+        except BulkWriteError as e:
+            summary["error"] = f"{len(e.details.get('writeErrors', []))} write errors"
+            logger.error(f"Error writing pairs to cwa_matches collection: {e.details}")
+            break
+        except Exception as e:
+            summary["error"] = str(e)
+            logger.error("Error writing pairs to cwa_matches collection.")
+            logger.error(e)
+            break
+    else:
+        summary["error"] = "Mongo is down."
+        logger.error(" *** Failed to write cwa_matches collection. Mongo is down.")
+
+    end_save = perf_counter()
+    logger.info(
+        f" Saved {summary['pairs']} pairs with {summary['operations']} operations "
+        f"(matched {summary['matched']}, modified {summary['modified']}, "
+        f"upserted {summary['upserted']}, transaction {summary['transaction']}) "
+        f"in {end_save - start_save:.6f} seconds."
+    )
+    return summary
@@ -0,0 +1,213 @@
+"""
+Index bootstrap for the FUSE collections.
+
+    python -m modules.mongo_indexes --db fuse-test [--mode debug] [--check]
+
+Creates any missing index in INDEXES, then explains the query each index
+serves and reports the ones that still plan a collection scan. --check only
+reports. Safe to run any number of times: existing indexes are left alone.
+Run it when deploying; the web app does not create indexes.
+"""
+import argparse
+import json
+import logging
+import sys
+from logging.handlers import RotatingFileHandler
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from modules import mongo_pool
+
+# pylint: disable=logging-fstring-interpolation
+
+console_formatter = logging.Formatter(
+    "%(asctime)s - %(filename)s:%(lineno)d - %(name)s - %(levelname)s - %(message)s"
+)
+
+# Create a stream handler with the formatter
+console_handler = logging.StreamHandler()
+console_handler.setFormatter(console_formatter)
+console_handler.setLevel(logging.INFO)
+
+# Create a file handler for file logging
+file_handler = RotatingFileHandler(
+    "./logs/se_select.log", maxBytes=10 * 1024 * 1024, backupCount=5
+)  # 10 MB
+file_handler.setFormatter(console_formatter)
+file_handler.setLevel(logging.INFO)
+
+# Logging to Flask console
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+logger.addHandler(console_handler)
+logger.addHandler(file_handler)  # Add file handler to the logger
+logger.propagate = False
+
+
+class IndexSpec:
+    """
+    An index every matching collection should have.
+
+    collection is a collection name, or "*_suffix" for the per-area
+    collections. sort marks indexes that serve a sort rather than a filter.
+    """
+
+    def __init__(
+        self,
+        collection: str,
+        keys: List[Tuple[str, int]],
+        unique: bool = False,
+        sort: bool = False,
+    ):
+        self.collection = collection
+        self.keys = keys
+        self.unique = unique
+        self.sort = sort
+
+    def matches(self, name: str) -> bool:
+        if self.collection.startswith("*"):
+            return name.endswith(self.collection[1:])
+        return name == self.collection
+
+    def query(self, sample: Optional[dict]) -> Tuple[dict, List[Tuple[str, int]]]:
+        """Return (filter, sort) for the query this index serves."""
+        if self.sort:
+            return {}, self.keys
+        sample = sample or {}
+        return {field: sample.get(field, "") for field, _ in self.keys}, []
+
+
+INDEXES: List[IndexSpec] = [
+    IndexSpec("cwa_matches", [("SE", 1)], unique=True),
+    IndexSpec("cwa_SEs", [("se", 1)], unique=True),
+    IndexSpec("cwa_SEs", [("se_name", 1)]),
+    # add_unknown_se reads the highest se_idx
+    IndexSpec("cwa_SEs", [("se_idx", -1)], sort=True),
+    IndexSpec("cwa_regions", [("Region", 1)], unique=True),
+    IndexSpec("*_prematch", [("date", 1)], unique=True),
+    IndexSpec("*_attendance", [("date", 1)], unique=True),
+    IndexSpec("*_reminders", [("date", 1), ("alias", 1)], unique=True),
+    IndexSpec("*_prematch_changes", [("date", 1), ("timestamp", 1)]),
+    # FuseDate.get_fuse_date reads the newest record; debug mode uses "date"
+    IndexSpec("*_date", [("timestamp", -1), ("_id", -1)], sort=True),
+    IndexSpec("date", [("timestamp", -1), ("_id", -1)], sort=True),
+]
+
+
+def _plan_stages(plan: Any) -> List[str]:
+    """Every "stage" in an explain plan, depth first."""
+    stages: List[str] = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages.extend(_plan_stages(value))
+    elif isinstance(plan, list):
+        for value in plan:
+            stages.extend(_plan_stages(value))
+    return stages
+
+
+def ensure_index(collection, spec: IndexSpec, create: bool = True) -> Dict[str, Any]:
+    """Create spec on collection unless an index with the same keys exists."""
+    entry: Dict[str, Any] = {
+        "collection": collection.name,
+        "keys": spec.keys,
+        "unique": spec.unique,
+        "status": "present",
+        "error": None,
+    }
+    try:
+        keys = [tuple(key) for key in spec.keys]
+        for info in collection.index_information().values():
+            if [tuple(key) for key in info["key"]] == keys:
+                return entry
+        if not create:
+            entry["status"] = "missing"
+            return entry
+        entry["name"] = collection.create_index(spec.keys, unique=spec.unique)
+        entry["status"] = "created"
+        logger.info(f" Created index {entry['name']} on {collection.name}.")
+    except OperationFailure as e:
+        # Duplicate keys block a unique index; conflicting options block any
+        entry["status"] = "error"
+        entry["error"] = str(e)
+        logger.error(f" Could not create index {spec.keys} on {collection.name}: {e}")
+    return entry
+
+
+def explain_index(collection, spec: IndexSpec) -> Dict[str, Any]:
+    """Explain the query spec serves and report whether it scans the collection."""
+    entry: Dict[str, Any] = {"collection": collection.name, "keys": spec.keys}
+    try:
+        query, sort = spec.query(collection.find_one({}, {"_id": 0}))
+        cursor = collection.find(query)
+        if sort:
+            cursor = cursor.sort(sort).limit(1)
+        plan = cursor.explain().get("queryPlanner", {}).get("winningPlan", {})
+        stages = _plan_stages(plan)
+        entry["stages"] = stages
+        entry["collscan"] = "COLLSCAN" in stages
+    except (PyMongoError, AttributeError, NotImplementedError) as e:
+        # In-process stand-ins such as mongomock have no explain()
+        entry["stages"] = []
+        entry["collscan"] = None
+        entry["error"] = str(e)
+    if entry["collscan"]:
+        logger.warning(f" Query on {collection.name} {spec.keys} is a collection scan.")
+    return entry
+
+
+def bootstrap(
+    Mongo_Connection_URI, user_db: str, create: bool = True
+) -> Dict[str, Any]:
+    """
+    Ensure INDEXES on every matching collection in user_db, then explain.
+
+    Returns {"indexes": [...], "plans": [...], "collscans": count}. With
+    create=False nothing is changed and absent indexes show as "missing".
+    """
+    db = Mongo_Connection_URI[user_db]
+    report: Dict[str, Any] = {"user_db": user_db, "indexes": [], "plans": []}
+    names = sorted(db.list_collection_names())
+    for spec in INDEXES:
+        for name in names:
+            if spec.matches(name):
+                report["indexes"].append(ensure_index(db[name], spec, create))
+                report["plans"].append(explain_index(db[name], spec))
+    report["collscans"] = sum(1 for plan in report["plans"] if plan["collscan"])
+    created = sum(1 for entry in report["indexes"] if entry["status"] == "created")
+    logger.info(
+        f" Index bootstrap for {user_db}: {len(report['indexes'])} indexes checked, "
+        f"{created} created, {report['collscans']} collection scans."
+    )
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--db", required=True, help="user database, e.g. fuse-test")
+    parser.add_argument(
+        "--mode", default="production", choices=("production", "debug")
+    )
+    parser.add_argument(
+        "--check", action="store_true", help="report only, create nothing"
+    )
+    args = parser.parse_args(argv)
+
+    Mongo_Connection_URI = mongo_pool.get_client(args.db, args.mode)
+    if Mongo_Connection_URI is None:
+        logger.error(f"Error connecting to MongoDB ({args.db}).")
+        return 1
+    try:
+        report = bootstrap(Mongo_Connection_URI, args.db, create=not args.check)
+    finally:
+        mongo_pool.close_all()
+    print(json.dumps(report, indent=2, default=str))
+    missing = any(entry["status"] != "present" for entry in report["indexes"])
+    return 1 if args.check and (missing or report["collscans"]) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
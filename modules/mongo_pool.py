@@ -0,0 +1,101 @@
+import logging
+import os
+from threading import Lock
+from typing import Dict, Optional, Tuple
+
+import certifi
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+import modules.preferences.preferences as p
+
+# pylint: disable=logging-fstring-interpolation
+
+# Logging to Flask console
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# One MongoClient per (username, bearer, host, db, mode) for the life of the process.
+# MongoClient is thread-safe and keeps its own connection pool, so every route and
+# helper shares it instead of paying the SRV lookup and TLS handshake per call.
+_clients: Dict[Tuple[str, str, str, str, str], MongoClient] = {}
+_clients_lock = Lock()
+_clients_pid = os.getpid()
+
+
+def _reset_after_fork() -> None:
+    """Drop clients inherited from the parent process (e.g. gunicorn pre-fork)."""
+    global _clients_lock, _clients_pid  # pylint: disable=global-statement
+    _clients.clear()
+    _clients_lock = Lock()
+    _clients_pid = os.getpid()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def credentials(mode: str) -> Tuple[str, str]:
+    """Return the Mongo user and bearer for the session mode."""
+    if mode == "debug":
+        return p.MONGOUN, p.MONGO_BEARER
+    return p.CWA_SE_USER, p.CWA_SE_BEARER
+
+
+def get_client(
+    user_db: str,
+    mode: str,
+    username: Optional[str] = None,
+    bearer: Optional[str] = None,
+    host: Optional[str] = None,
+) -> Optional[MongoClient]:
+    """
+    Return the shared MongoClient for the credentials, database and mode.
+
+    The client is created and pinged once per process. Credentials default to
+    the mode's user (see credentials()). Returns None if the first ping fails,
+    matching the behaviour of the per-route connection setup it replaces, so
+    every caller must check for None. Helpers take the client as an argument
+    rather than calling this themselves.
+    """
+    if username is None or bearer is None:
+        username, bearer = credentials(mode)
+    if host is None:
+        host = p.MONGOHOST
+    key = (username, bearer, host, user_db, mode)
+
+    if _clients_pid != os.getpid():
+        # Fallback for platforms without register_at_fork
+        _reset_after_fork()
+
+    client = _clients.get(key)
+    if client is not None:
+        return client
+
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is not None:
+            return client
+        client = MongoClient(
+            f"mongodb+srv://{username}:{bearer}@{host}/{user_db}"
+            f"?retryWrites=true&w=majority",
+            tlsCAFile=certifi.where(),
+            serverSelectionTimeoutMS=500,
+        )
+        try:
+            client.admin.command("ping")
+        except PyMongoError as e:
+            logger.error(f"Error connecting to MongoDB ({user_db}, {mode}): {e}")
+            client.close()
+            return None
+        logger.info(f"Connected to MongoDB ({user_db}, {mode}). Client pooled.")
+        _clients[key] = client
+        return client
+
+
+def close_all() -> None:
+    """Close every pooled client. Used on shutdown and in scripts."""
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
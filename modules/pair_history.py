@@ -0,0 +1,99 @@
+import logging
+from datetime import date
+from logging.handlers import RotatingFileHandler
+from time import perf_counter
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from modules.match_snapshot import parse_assignment_date
+
+# pylint: disable=logging-fstring-interpolation
+
+console_formatter = logging.Formatter(
+    "%(asctime)s - %(filename)s:%(lineno)d - %(name)s - %(levelname)s - %(message)s"
+)
+
+# Create a stream handler with the formatter
+console_handler = logging.StreamHandler()
+console_handler.setFormatter(console_formatter)
+console_handler.setLevel(logging.INFO)
+
+# Create a file handler for file logging
+file_handler = RotatingFileHandler(
+    "./logs/se_select.log", maxBytes=10 * 1024 * 1024, backupCount=5
+)  # 10 MB
+file_handler.setFormatter(console_formatter)
+file_handler.setLevel(logging.INFO)
+
+# Logging to Flask console
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+logger.addHandler(console_handler)
+logger.addHandler(file_handler)  # Add file handler to the logger
+logger.propagate = False
+
+# Days-since value for a pair that has never been matched
+NEVER = np.iinfo(np.int32).max
+
+
+class PairHistory:
+    """
+    Dense N x N matrix of days since each pair of attendees was last matched.
+
+    Built once per run from the match snapshot. Pairs that were never matched
+    hold NEVER. The matrix is symmetric, so a pairing recorded on either SE's
+    cwa_matches document counts for both.
+    """
+
+    def __init__(self, SEs: Iterable[str], snapshot, today: Optional[date] = None):
+        start_history = perf_counter()
+        self.today = today or date.today()
+        self.ses: List[str] = sorted(SEs)
+        self.index: Dict[str, int] = {se: i for i, se in enumerate(self.ses)}
+        size = len(self.ses)
+        self.days = np.full((size, size), NEVER, dtype=np.int32)
+
+        for se, assignments in snapshot.assignments.items():
+            i = self.index.get(se)
+            if i is None:
+                continue
+            for assignment_date, partner in assignments.items():
+                j = self.index.get(partner)
+                if j is None:
+                    continue
+                match_date = parse_assignment_date(assignment_date)
+                if match_date is None:
+                    continue
+                days = max((self.today - match_date).days, 0)
+                if days < self.days[i, j]:
+                    self.days[i, j] = days
+                    self.days[j, i] = days
+
+        end_history = perf_counter()
+        logger.info(
+            f" Pair history matrix ({size}x{size}) built in "
+            f"{end_history - start_history:.6f} seconds."
+        )
+
+    def indexes(self, SEs: Iterable[str]) -> np.ndarray:
+        """Return the matrix indexes for SEs, skipping any not in the matrix."""
+        return np.fromiter(
+            (self.index[se] for se in SEs if se in self.index), dtype=np.intp
+        )
+
+    def days_since(self, se1: str, se2: str) -> int:
+        return int(self.days[self.index[se1], self.index[se2]])
+
+    def paired_before(self, se1: str, se2: str) -> bool:
+        return self.days_since(se1, se2) != NEVER
+
+    def paired_since(self, se1: str, se2: str, target_date: date) -> bool:
+        """True if se1 and se2 were matched on or after target_date."""
+        return self.days_since(se1, se2) <= (self.today - target_date).days
+
+    def unpaired(self, se: str, candidates: Iterable[str]) -> List[str]:
+        """Return the candidates that have never been matched with se."""
+        idx = self.indexes(candidates)
+        mask = self.days[self.index[se], idx] == NEVER
+        return [self.ses[i] for i in idx[mask]]
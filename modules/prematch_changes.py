@@ -0,0 +1,197 @@
+import logging
+from datetime import datetime, timedelta
+from logging.handlers import RotatingFileHandler
+from time import sleep
+from typing import Any, Dict, List, Optional
+
+from pymongo import ASCENDING
+from pymongo.errors import ConnectionFailure
+
+from modules.fuse_date import timestamp
+
+# pylint: disable=logging-fstring-interpolation
+
+console_formatter = logging.Formatter(
+    "%(asctime)s - %(filename)s:%(lineno)d - %(name)s - %(levelname)s - %(message)s"
+)
+
+# Create a stream handler with the formatter
+console_handler = logging.StreamHandler()
+console_handler.setFormatter(console_formatter)
+console_handler.setLevel(logging.INFO)
+
+# Create a file handler for file logging
+file_handler = RotatingFileHandler(
+    "./logs/se_select.log", maxBytes=10 * 1024 * 1024, backupCount=5
+)  # 10 MB
+file_handler.setFormatter(console_formatter)
+file_handler.setLevel(logging.INFO)
+
+# Logging to Flask console
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+logger.addHandler(console_handler)
+logger.addHandler(file_handler)  # Add file handler to the logger
+logger.propagate = False
+
+# {area}_prematch_changes holds one delta document per upload that changed
+# the {area}_prematch record:
+#   {date, upload_hash, timestamp, changes: [{se, from, to}]}
+# from is None for an SE the upload added, to is None for one it removed.
+# Aliases are values, never field names, so "." or "$" in one is harmless.
+CHANGES_SUFFIX = "_prematch_changes"
+
+
+def changes_collection(Mongo_Connection_URI, user_db: str, area: str):
+    return Mongo_Connection_URI[user_db][f"{area}{CHANGES_SUFFIX}"]
+
+
+def change_entries(changes: Dict[str, dict]) -> List[Dict[str, Optional[str]]]:
+    """[{se, from, to}] from ProcessAttachment.changes, sorted by SE."""
+    entries = [
+        {"se": alias, "from": None, "to": status}
+        for alias, status in changes.get("added", {}).items()
+    ]
+    entries.extend(
+        {"se": alias, "from": status, "to": None}
+        for alias, status in changes.get("removed", {}).items()
+    )
+    entries.extend(
+        {"se": alias, "from": old, "to": new}
+        for alias, (old, new) in changes.get("changed", {}).items()
+    )
+    return sorted(entries, key=lambda entry: entry["se"])
+
+
+def _insert_with_retry(collection, document: dict) -> bool:
+    for _ in range(5):
+        try:
+            collection.insert_one(document)
+            return True
+        except ConnectionFailure as e:
+            logger.warning(f" *** Connect error writing {collection.name} collection.")
+            logger.warning(f" *** Sleeping for {pow(2, _)} seconds and trying again.")
+            sleep(pow(2, _))
+            logger.warning(e)
+    logger.error(f" *** Failed to write {collection.name} collection. Mongo is down.")
+    return False
+
+
+def record_changes(
+    Mongo_Connection_URI,
+    user_db: str,
+    area: str,
+    fuse_date: str,
+    upload_hash: Optional[str],
+    changes: Dict[str, dict],
+    baseline: Optional[Dict[str, str]] = None,
+) -> bool:
+    """
+    Store the delta one upload made to the prematch record for fuse_date.
+
+    changes is ProcessAttachment.changes, stored as [{se, from, to}]
+    entries (see change_entries). Empty deltas are not stored, so applying
+    the same upload again records nothing. baseline is {alias: status} of
+    the record before this upload; when the date has no history yet it is
+    stored first, so statuses set before the changelog existed can still be
+    rebuilt.
+
+    Returns True if anything was written.
+    """
+    entries = change_entries(changes)
+    if not entries:
+        return False
+    collection = changes_collection(Mongo_Connection_URI, user_db, area)
+    now = timestamp()
+    if baseline and collection.find_one({"date": fuse_date}, {"_id": 1}) is None:
+        _insert_with_retry(
+            collection,
+            {
+                "date": fuse_date,
+                "upload_hash": None,
+                # Just before this upload's delta, so it replays first
+                "timestamp": now - timedelta(milliseconds=1),
+                "changes": [
+                    {"se": alias, "from": None, "to": status}
+                    for alias, status in sorted(baseline.items())
+                ],
+                "baseline": True,
+            },
+        )
+    written = _insert_with_retry(
+        collection,
+        {
+            "date": fuse_date,
+            "upload_hash": upload_hash,
+            "timestamp": now,
+            "changes": entries,
+        },
+    )
+    if written:
+        logger.info(
+            f" Recorded {area} prematch changes for {fuse_date} from upload "
+            f"{upload_hash}."
+        )
+    return written
+
+
+def list_changes(
+    Mongo_Connection_URI,
+    user_db: str,
+    area: str,
+    fuse_date: str,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+) -> List[Dict[str, Any]]:
+    """Deltas for fuse_date, oldest first, optionally within (since, until]."""
+    query: Dict[str, Any] = {"date": fuse_date}
+    window: Dict[str, datetime] = {}
+    if since is not None:
+        window["$gt"] = since
+    if until is not None:
+        window["$lte"] = until
+    if window:
+        query["timestamp"] = window
+    for _ in range(5):
+        try:
+            return list(
+                changes_collection(Mongo_Connection_URI, user_db, area)
+                .find(query, {"_id": 0})
+                .sort("timestamp", ASCENDING)
+            )
+        except ConnectionFailure as e:
+            logger.warning(" *** Connect error reading prematch changes.")
+            logger.warning(f" *** Sleeping for {pow(2, _)} seconds and trying again.")
+            sleep(pow(2, _))
+            logger.warning(e)
+    logger.error(" *** Failed to read prematch changes. Mongo is down.")
+    return []
+
+
+def replay(deltas: List[Dict[str, Any]]) -> Dict[str, str]:
+    """Apply deltas in order to an empty record. Returns {alias: status}."""
+    statuses: Dict[str, str] = {}
+    for delta in deltas:
+        for entry in delta.get("changes", []):
+            if entry["to"] is None:
+                statuses.pop(entry["se"], None)
+            else:
+                statuses[entry["se"]] = entry["to"]
+    return dict(sorted(statuses.items()))
+
+
+def status_at(
+    Mongo_Connection_URI,
+    user_db: str,
+    area: str,
+    fuse_date: str,
+    at: Optional[datetime] = None,
+) -> Dict[str, str]:
+    """
+    Rebuild {alias: status} for fuse_date as it stood at time at (UTC).
+
+    at defaults to now, which gives the current prematch statuses.
+    """
+    return replay(
+        list_changes(Mongo_Connection_URI, user_db, area, fuse_date, until=at)
+    )
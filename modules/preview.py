@@ -0,0 +1,84 @@
+import csv
+import os
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+DEFAULT_PER_PAGE = 50
+MAX_PER_PAGE = 200
+
+
+def page_rows(
+    columns: List[str],
+    rows: List[Dict[str, Any]],
+    page: int = 1,
+    per_page: int = DEFAULT_PER_PAGE,
+    sort: Optional[str] = None,
+    order: str = "asc",
+    q: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Filter, sort and slice rows for one page of a preview table.
+
+    q keeps rows where any column contains it, ignoring case. sort must be
+    one of columns; anything else keeps the stored order. per_page is capped
+    at MAX_PER_PAGE and page is clamped to the pages there are.
+    """
+    per_page = max(1, min(per_page, MAX_PER_PAGE))
+    selected = rows
+    if q:
+        needle = q.lower()
+        selected = [
+            row
+            for row in rows
+            if any(needle in str(row.get(column, "")).lower() for column in columns)
+        ]
+    if sort in columns:
+        selected = sorted(
+            selected,
+            key=lambda row: str(row.get(sort, "")).lower(),
+            reverse=order == "desc",
+        )
+    else:
+        sort = None
+    pages = max(1, -(-len(selected) // per_page))
+    page = max(1, min(page, pages))
+    start = (page - 1) * per_page
+    return {
+        "columns": columns,
+        "rows": [
+            [row.get(column, "") for column in columns]
+            for row in selected[start : start + per_page]
+        ],
+        "page": page,
+        "per_page": per_page,
+        "pages": pages,
+        "total": len(rows),
+        "filtered": len(selected),
+        "sort": sort,
+        "order": "desc" if order == "desc" else "asc",
+    }
+
+
+def upload_rows(parsed: Dict[str, Any]) -> Tuple[List[str], List[Dict[str, Any]]]:
+    """Columns and rows of a parsed upload (see upload_cache.parse_upload)."""
+    return ["Alias", "Status"], [
+        {"Alias": alias, "Status": status}
+        for alias, status in parsed["responses"].items()
+    ]
+
+
+@lru_cache(maxsize=8)
+def _csv_rows(
+    path: str, mtime: float, size: int
+) -> Tuple[List[str], List[Dict[str, Any]]]:
+    # mtime and size are part of the cache key, so a rewritten file is re-read
+    with open(path, newline="", encoding="utf-8") as csv_file:
+        reader = csv.DictReader(csv_file)
+        rows = list(reader)
+        return list(reader.fieldnames or []), rows
+
+
+def csv_rows(path: str) -> Tuple[List[str], List[Dict[str, Any]]]:
+    """Columns and rows of a CSV file, parsed once per version of the file."""
+    stat = os.stat(path)
+    return _csv_rows(path, stat.st_mtime, stat.st_size)
@@ -1,10 +1,14 @@
+import csv
 import logging
 import re
 from time import sleep
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 
+from pymongo import ReturnDocument
 from pymongo.errors import ConnectionFailure
 
 import modules.preferences.preferences as pref
+from modules import prematch_changes
 
 # pylint: disable=logging-fstring-interpolation
 
@@ -23,6 +27,95 @@ logging.basicConfig(level=logging.INFO)
 logger.addHandler(console_handler)
 
 
+# The alias in an Outlook name, e.g. "Jane Doe (jdoe)" -> "jdoe"
+ALIAS_PATTERN = re.compile(r"\(([^()]*)\)")
+
+# Prematch field for each Outlook response. Anything else counts as no_response.
+RESPONSE_STATUSES = {
+    "Accepted": "accepted",
+    "Declined": "declined",
+    "Tentative": "tentative",
+}
+STATUSES = ("accepted", "declined", "tentative", "no_response")
+
+# Columns used when the header does not name them
+NAME_COLUMN = 0
+RESPONSE_COLUMN = 2
+
+
+def _column(header: List[str], name: str, default: int) -> int:
+    cells = [cell.strip().lower() for cell in header]
+    return cells.index(name) if name in cells else default
+
+
+def parse_responses(
+    data_file: Iterable[str],
+) -> Tuple[Dict[str, Set[str]], List[Tuple[int, str]]]:
+    """
+    Read an Outlook meeting tracking CSV in a single pass.
+
+    Finds the Name and Response columns from the header row and adds each
+    alias straight to its status set, so only the sets are held in memory.
+    Rows without an alias or with too few columns are skipped.
+
+    Returns ({status: aliases} for STATUSES, [(line number, problem)]).
+    """
+    responses: Dict[str, Set[str]] = {status: set() for status in STATUSES}
+    errors: List[Tuple[int, str]] = []
+    reader = csv.reader(data_file)
+    header = next(reader, None)
+    if header is None:
+        return responses, errors
+    name_column = _column(header, "name", NAME_COLUMN)
+    response_column = _column(header, "response", RESPONSE_COLUMN)
+    columns = max(name_column, response_column) + 1
+
+    for row in reader:
+        if not any(cell.strip() for cell in row):
+            continue
+        if len(row) < columns:
+            errors.append(
+                (reader.line_num, f"expected {columns} columns, found {len(row)}")
+            )
+            continue
+        alias = ALIAS_PATTERN.search(row[name_column])
+        if alias is None or not alias.group(1).strip():
+            errors.append((reader.line_num, f"no alias in {row[name_column]!r}"))
+            continue
+        status = RESPONSE_STATUSES.get(row[response_column].strip(), "no_response")
+        responses[status].add(alias.group(1).strip())
+    return responses, errors
+
+
+def alias_statuses(record: Optional[dict]) -> Dict[str, str]:
+    """{alias: status} from a prematch record's status arrays."""
+    statuses: Dict[str, str] = {}
+    for status in STATUSES:
+        for alias in (record or {}).get(status) or []:
+            statuses[alias] = status
+    return statuses
+
+
+def status_changes(before: Optional[dict], after: Optional[dict]) -> Dict[str, dict]:
+    """
+    Compare two prematch records.
+
+    Returns {"added": {alias: status}, "removed": {alias: status}, "changed":
+    {alias: [old status, new status]}}.
+    """
+    old = alias_statuses(before)
+    new = alias_statuses(after)
+    return {
+        "added": {alias: new[alias] for alias in sorted(new.keys() - old.keys())},
+        "removed": {alias: old[alias] for alias in sorted(old.keys() - new.keys())},
+        "changed": {
+            alias: [old[alias], new[alias]]
+            for alias in sorted(old.keys() & new.keys())
+            if old[alias] != new[alias]
+        },
+    }
+
+
 class ProcessAttachment:
     """
     Class to process attachments
@@ -36,44 +129,48 @@ class ProcessAttachment:
         self.attachment = attachment
         self.mongo_connect_uri = mongo_connect_uri
         self.db = db
+        self.area = area
         self.prematch = area + "_prematch"
         self.logger = logging.getLogger(__name__)
+        # (line number, problem) for rows process() could not read
+        self.errors = []
+        # What the last apply() changed, see status_changes()
+        self.changes = {"added": {}, "removed": {}, "changed": {}}
 
     def process(self):
         """
         Process attachment
         """
+        self.logger.info(f"Processing attachment {self.attachment}")
         try:
-            self.logger.info(f"Processing attachment {self.attachment}")
-            # Open the attachment file properly
-            with open(f"./uploads/{self.attachment}", "r", encoding="utf-8-sig") as data_file:
-                lines = data_file.read().splitlines()
-                remaining_lines = lines[1:]  # Skip first line if needed
-        except ConnectionFailure as err:
+            # newline="" lets the csv module handle quoted line breaks
+            with open(
+                f"./uploads/{self.attachment}", "r", encoding="utf-8-sig", newline=""
+            ) as data_file:
+                responses, self.errors = parse_responses(data_file)
+        except OSError as err:
             self.logger.error(f"Unable to open {self.attachment}: {err}")
             # TODO: Add proper error handling to let the user know the file is not there
-            return
-
-        pre_attendees = []
-        for line in remaining_lines:
-            transformed_line = re.sub(r"\((.*?)\)", r", \1", line)
-            line_list = [item.strip() for item in transformed_line.split(",")]
-            pre_attendees.append(line_list)
-
-        accept = set()
-        decline = set()
-        tentative = set()
-        no_response = set()
-
-        for attendee in pre_attendees:
-            if attendee[3] == "Accepted":
-                accept.add(attendee[1])
-            elif attendee[3] == "Declined":
-                decline.add(attendee[1])
-            elif attendee[3] == "Tentative":
-                tentative.add(attendee[1])
-            else:
-                no_response.add(attendee[1])
+            return (0, 0, 0, 0)
+
+        for line_number, problem in self.errors:
+            self.logger.warning(
+                f" Skipped line {line_number} of {self.attachment}: {problem}"
+            )
+        return self.apply(responses)
+
+    def apply(self, responses, upload_hash=None):
+        """
+        Write parsed responses ({status: aliases}) to the prematch record.
+
+        The record is replaced with the four status arrays and upload_hash in
+        one round trip, and self.changes holds who was added, removed or
+        changed status. Applying the same upload twice changes nothing.
+        """
+        accept = responses["accepted"]
+        decline = responses["declined"]
+        tentative = responses["tentative"]
+        no_response = responses["no_response"]
 
         self.logger.info(
             f"Attendees:\n"
@@ -83,90 +180,52 @@ class ProcessAttachment:
             f" No response: {len(no_response)}"
         )
 
-        # Does cwa_attendees record exist for this date?
-        for _ in range(5):
-            try:
-                if self.mongo_connect_uri[self.db][self.prematch].find_one(
-                    {"date": self.fuse_date}
-                ):
-                    self.logger.info(f" Record for {self.fuse_date} exists in prematch table.")
-                else:
-                    # Create the record
-                    self.mongo_connect_uri[self.db][self.prematch].insert_one(
-                        {"date": self.fuse_date}
-                    )
-                    self.logger.info(f" Record for {self.fuse_date} created in prematch table.")
-                break
-            except ConnectionFailure as cf:
-                self.logger.error(f" Connection Failure looking up attendees record: {cf}")
-                self.logger.warning("  *** Sleeping for {pow(2, _)} seconds and trying again ***")
-                sleep(pow(2, _))
-
-        # Add responses to the database
+        # Write the four status arrays in one upserted $set. Sorted arrays
+        # make a repeat of the same upload a no-op write. The record as it
+        # was before the write comes back for the diff.
         self.logger.info("Adding SE responses to attendees database")
+        after = {status: sorted(responses[status]) for status in STATUSES}
+        before = None
         for _ in range(5):
             try:
-                # Convert sets to lists for MongoDB update
-                accept_list = list(accept)
-                decline_list = list(decline)
-                tentative_list = list(tentative)
-                no_response_list = list(no_response)
-
-                # Combine all entries to ensure removal from all statuses
-                all_entries = accept_list + decline_list + tentative_list + no_response_list
-
-                # First, remove entries from all statuses
-                update_result = self.mongo_connect_uri[self.db][
+                before = self.mongo_connect_uri[self.db][
                     self.prematch
-                ].update_one(
+                ].find_one_and_update(
                     {"date": self.fuse_date},
-                    {
-                        "$pull": {
-                            "accepted": {"$in": all_entries},
-                            "declined": {"$in": all_entries},
-                            "tentative": {"$in": all_entries},
-                            "no_response": {"$in": all_entries},
-                        }
-                    },
+                    {"$set": {**after, "upload_hash": upload_hash}},
+                    projection={"_id": 0},
+                    upsert=True,
+                    return_document=ReturnDocument.BEFORE,
                 )
-                self.logger.info(f"Updated {update_result.modified_count} documents.")
-
-                # Remove any documents that are not in any of the lists
-                update_result = self.mongo_connect_uri[self.db][
-                    self.prematch
-                ].update_many(
-                    {"date": self.fuse_date},
-                    {
-                        "$pull": {
-                            "accepted": {"$nin": accept_list},
-                            "declined": {"$nin": decline_list},
-                            "tentative": {"$nin": tentative_list},
-                            "no_response": {"$nin": no_response_list},
-                        }
-                    },
-                )
-                self.logger.info(f"Updated {update_result.modified_count} documents.")
-
-                # Next, add entries to their respective current status using $addToSet
-                update_result = self.mongo_connect_uri[self.db][
-                    self.prematch
-                ].update_one(
-                    {"date": self.fuse_date},
-                    {
-                        "$addToSet": {
-                            "accepted": {"$each": accept_list},
-                            "declined": {"$each": decline_list},
-                            "tentative": {"$each": tentative_list},
-                            "no_response": {"$each": no_response_list},
-                        }
-                    },
-                )
-                self.logger.info(f"Updated {update_result.modified_count} documents.")
                 break
             except ConnectionFailure as cf:
                 self.logger.error(
                     f" Connection Failure adding responses to attendees database: {cf}"
                 )
-                self.logger.warning("  *** Sleeping for {pow(2, _)} seconds and trying again ***")
+                self.logger.warning(f"  *** Sleeping for {pow(2, _)} seconds and trying again ***")
                 sleep(pow(2, _))
+        else:
+            self.logger.error(" *** Failed to update prematch record. Mongo is down.")
+            return (len(accept), len(decline), len(tentative), len(no_response))
+
+        if before is None:
+            self.logger.info(f" Record for {self.fuse_date} created in prematch table.")
+        elif upload_hash is not None and before.get("upload_hash") == upload_hash:
+            self.logger.info(f" Upload {upload_hash} already applied. Nothing to do.")
+        self.changes = status_changes(before, after)
+        self.logger.info(
+            f" Prematch changes: {len(self.changes['added'])} added, "
+            f"{len(self.changes['removed'])} removed, "
+            f"{len(self.changes['changed'])} changed status."
+        )
+        # Keep the delta so statuses can be rebuilt for any point in time
+        prematch_changes.record_changes(
+            self.mongo_connect_uri,
+            self.db,
+            self.area,
+            self.fuse_date,
+            upload_hash,
+            self.changes,
+            baseline=alias_statuses(before),
+        )
         return (len(accept), len(decline), len(tentative), len(no_response))
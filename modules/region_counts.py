@@ -0,0 +1,84 @@
+import heapq
+from bisect import bisect_left
+from typing import Dict, List, Optional, Tuple
+
+
+def _remove_sorted(values: List[int], value: int) -> None:
+    i = bisect_left(values, value)
+    if i < len(values) and values[i] == value:
+        del values[i]
+
+
+class RegionCounts:
+    """
+    Running count of unmatched SEs per region.
+
+    Replaces rebuilding and re-sorting the region counts from se_dict on every
+    selection. discard() is O(log R) plus a shift of at most R region ids; the
+    total, the number of regions and the busiest region are O(1) or amortised
+    O(log R). Regions with no SEs left are dropped.
+
+    The median is fixed for the run. Regions with more than median + 2 SEs (or,
+    if none, at least median SEs) are listed twice by plus_median() so they
+    are picked more often.
+    """
+
+    def __init__(self, se_dict: Dict[int, list], median: Optional[int] = None):
+        self.counts: Dict[int, int] = {
+            region: len(values[1]) for region, values in se_dict.items() if values[1]
+        }
+        self.total = sum(self.counts.values())
+        self.median = median
+        self.regions: List[int] = sorted(self.counts)
+        self._heap: List[Tuple[int, int]] = [
+            (-count, region) for region, count in self.counts.items()
+        ]
+        heapq.heapify(self._heap)
+        if median is None:
+            self.above: List[int] = []
+            self.at_least: List[int] = []
+        else:
+            self.above = [r for r in self.regions if self.counts[r] > median + 2]
+            self.at_least = [r for r in self.regions if self.counts[r] >= median]
+
+    def __len__(self) -> int:
+        return len(self.regions)
+
+    def __contains__(self, region: int) -> bool:
+        return region in self.counts
+
+    def discard(self, region: int) -> None:
+        """Record that one SE from region has been matched."""
+        count = self.counts[region] - 1
+        self.total -= 1
+        if count == 0:
+            del self.counts[region]
+            _remove_sorted(self.regions, region)
+            _remove_sorted(self.above, region)
+            _remove_sorted(self.at_least, region)
+            return
+        self.counts[region] = count
+        heapq.heappush(self._heap, (-count, region))
+        if self.median is not None:
+            if count == self.median + 2:
+                _remove_sorted(self.above, region)
+            if count == self.median - 1:
+                _remove_sorted(self.at_least, region)
+
+    def busiest(self) -> Tuple[int, int]:
+        """Return (region, count) with the most SEs, lowest region on a tie."""
+        while True:
+            negative_count, region = self._heap[0]
+            if self.counts.get(region) == -negative_count:
+                return region, -negative_count
+            # Stale entry from before a discard
+            heapq.heappop(self._heap)
+
+    def plus_median(self, pad: bool = True) -> List[int]:
+        """Regions in index order, followed by the median pad when pad is True."""
+        if not pad or self.median is None:
+            return list(self.regions)
+        return self.regions + (self.above if self.above else self.at_least)
+
+    def as_dict(self) -> Dict[int, int]:
+        return {region: self.counts[region] for region in self.regions}
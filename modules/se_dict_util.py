@@ -1,13 +1,11 @@
 import logging
 from logging.handlers import RotatingFileHandler
-from threading import current_thread
 from time import perf_counter, sleep
-from typing import Any, Dict, List
+from typing import Dict, Iterable, List, Tuple
 
 from pymongo.errors import ConnectionFailure
 
 import modules.preferences.preferences as p
-from modules import se_info_util
 
 # pylint: disable=logging-fstring-interpolation, undefined-variable
 
@@ -37,48 +35,73 @@ logger.propagate = False
 se_dict: Dict[int, list] = {}
 
 
-def make_se_dict(x: str, se_dict: dict, user_db: str, mode: str) -> Any:
-    # Look up the SE in the SE info collection and return the SE info.
-    # get_se_info does the lookup and builds an entry in the se_dict
-    se_info_result = se_info_util.get_se_info(x, se_dict, user_db, mode)
-    if se_info_result is not None:
-        return se_info_result
-    else:
-        return None
+def build_se_dict(SEs: Iterable[str], snapshot) -> Tuple[Dict[int, list], List[str]]:
+    """
+    Build the region -> SE dict for all SEs from the match snapshot.
+
+    The snapshot already holds the cwa_SEs records and cwa_regions indexes
+    (two $in queries), so this makes no database calls. Returns the dict and
+    the SEs that have no cwa_SEs record.
+    """
+    bulk_se_dict: Dict[int, list] = {}
+    unknown_SEs: List[str] = []
+    for x in SEs:
+        region_numb, se_region = snapshot.region(x)
+        if se_region is None:
+            unknown_SEs.append(x)
+            continue
+        if region_numb is None:
+            logger.warning(f"Region {se_region} for SE {x} not found in cwa_regions.")
+            continue
+        if region_numb in bulk_se_dict:
+            # Append se_dict with se
+            bulk_se_dict[region_numb][1].append(x)
+        else:
+            # Add se_dict with se_region and se
+            bulk_se_dict[region_numb] = [[se_region], [x]]
+    return bulk_se_dict, unknown_SEs
 
 
-def se_count_dict(SEs: List[str]) -> Dict[str, int]:
-    # Create a dict of se:match_count
+def se_count_dict(SEs: Iterable[str], cwa_matches=None) -> Dict[str, int]:
+    """
+    Create a dict of se:match_count.
+
+    The assignment counts are computed server-side with $size over the
+    assignments object, so only {SE, count} comes back for the attendee set.
+    cwa_matches defaults to the shared collection in preferences.
+    """
+    if cwa_matches is None:
+        cwa_matches = p.cwa_matches
     se_assignment_count: Dict[str, int] = {}
     start_se_assignment_dict = perf_counter()
-    for x in SEs:
-        if current_thread().name == "MainThread":
-            for _ in range(5):
-                try:
-                    y = p.cwa_matches.find_one({"SE": x})
-                    break
-                except ConnectionFailure as e:
-                    logger.warning(
-                        f" *** Connect error getting SE {x} from cwa_matches collection."
-                    )
-                    logger.warning(
-                        f" *** Sleeping for {pow(2, _)} seconds and trying again."
-                    )
-                    sleep(pow(2, _))
-                    logger.warning(e)
-            logger.error(
-                " *** Failed attempt to connect to cwa_matches collection. Mongo is down."
-            )
-        else:
-            y = p.cwa_matches.find_one({"SE": x})
-        if y is not None:
-            # count the number of assignments for x
-            count_assignments = len(y["assignments"])
-            # add the se and count to the dict
-            se_assignment_count[x] = count_assignments
+    pipeline = [
+        {"$match": {"SE": {"$in": list(SEs)}}},
+        {
+            "$project": {
+                "_id": 0,
+                "SE": 1,
+                "count": {
+                    "$size": {"$objectToArray": {"$ifNull": ["$assignments", {}]}}
+                },
+            }
+        },
+    ]
+    for _ in range(5):
+        try:
+            se_assignment_count = {
+                y["SE"]: y["count"] for y in cwa_matches.aggregate(pipeline)
+            }
+            break
+        except ConnectionFailure as e:
+            logger.warning(" *** Connect error counting SE assignments in cwa_matches.")
+            logger.warning(f" *** Sleeping for {pow(2, _)} seconds and trying again.")
+            sleep(pow(2, _))
+            logger.warning(e)
+    else:
+        logger.error(
+            " *** Failed attempt to connect to cwa_matches collection. Mongo is down."
+        )
     end_se_assignment_dict = perf_counter()
-    # clear temp variables: x, y, count_assignments
-    del count_assignments, x, y
     logger.info(
         f" Time to create se_assignment_count: {end_se_assignment_dict - start_se_assignment_dict:.6f} seconds."
     )
@@ -1,12 +1,10 @@
 import logging
-from concurrent.futures import ThreadPoolExecutor, as_completed
 from logging.handlers import RotatingFileHandler
 from random import randint
 from threading import current_thread
 from time import sleep
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Set, Tuple
 
-import certifi
 from pymongo import MongoClient
 from pymongo.errors import ConnectionFailure
 
@@ -38,80 +36,50 @@ logger.addHandler(file_handler)  # Add file handler to the logger
 logger.propagate = False
 
 
-def get_se_name(Mongo_Connection_URI, x, user_db):
-    """Helper function to get SE name with retry logic."""
-    # log contents of session
+def get_full_se_list(
+    Mongo_Connection_URI, SEs, user_db
+) -> Tuple[List[List[str]], Set[str]]:
+    """
+    Get full list of SEs from se_info collection.
+
+    Returns ([[se, se_name]] for the SEs found, set of SEs not in cwa_SEs),
+    so callers can drop the unknown SEs or report them.
+    """
+    logger.info("Getting full SE list")
+    full_SEs = []
+    se_list = list(SEs)
+
+    # One projected $in query for every SE, retried as a batch
     for _ in range(5):
         try:
-            # Lookup name from cwa_SEs collection
-            se_name = Mongo_Connection_URI[user_db]["cwa_SEs"].find_one({"se": x})
-            if se_name is not None:
-                return [x, se_name["se_name"]]
-            else:
-                logger.warning(f"Unknown SE: {x}")
-                return None
+            full_SEs = [
+                [doc["se"], doc["se_name"]]
+                for doc in Mongo_Connection_URI[user_db]["cwa_SEs"].find(
+                    {"se": {"$in": se_list}}, {"_id": 0, "se": 1, "se_name": 1}
+                )
+            ]
+            break
         except ConnectionFailure as e:
-            logger.error(f"Connect error getting SE {x} from cwa_SEs collection.")
+            logger.error("Connect error getting SE names from cwa_SEs collection.")
             logger.error(f"Sleeping for {pow(2, _)} seconds and trying again.")
             sleep(pow(2, _))
             logger.error(e)
-    return None
-
-
-def get_full_se_list(Mongo_Connection_URI, SEs, user_db) -> list:
-    """Get full list of SEs from se_info collection."""
-    logger.info("Getting full SE list")
-    full_SEs = []
-
-    # Test MongoDB connection
-    try:
-        Mongo_Connection_URI.admin.command("ping")
-        logger.info("MongoDB connection successful.")
-    except ConnectionFailure as e:
-        logger.error("MongoDB connection failed.")
-        logger.error(e)
-
-    logger.info("Launching ThreadPoolExecutor to get SE names.")
+    else:
+        logger.error("Failed to get SE names from cwa_SEs collection.")
 
-    with ThreadPoolExecutor(max_workers=10) as executor:
-        future_to_se = {
-            executor.submit(get_se_name, Mongo_Connection_URI, x, user_db): x
-            for x in SEs
-        }
-        for future in as_completed(future_to_se):
-            se_name = future.result()
-            if se_name:
-                full_SEs.append(se_name)
-                logger.info(f"Added SE name to full_SEs: {se_name}")
+    unknown_SEs = set(se_list) - {se for se, _ in full_SEs}
+    if unknown_SEs:
+        logger.warning(f"Unknown SEs: {sorted(unknown_SEs)}")
+    logger.info(f"Found {len(full_SEs)} of {len(se_list)} SE names.")
 
-    return full_SEs
+    return full_SEs, unknown_SEs
 
 
 def get_se_info(
-    x: str, se_dict: dict, mode: str, user_db: str
+    x: str, se_dict: dict, Mongo_Connection_URI: MongoClient, user_db: str
 ) -> Optional[Dict[str, Any]]:
 
-    logger.info(f"Start get_se_info for {x} in mode {mode}.")
-
-    # MongoDB connection setup
-    if mode == "debug":
-        Mongo_Uri = (
-            f"mongodb+srv://{p.MONGOUN}:{p.MONGO_BEARER}@{p.MONGOHOST}/{user_db}"
-        )
-        Mongo_Connection_URI: MongoClient = MongoClient(
-            f"{Mongo_Uri}?retryWrites=true&w=majority",
-            tlsCAFile=certifi.where(),
-            serverSelectionTimeoutMS=500,
-        )
-    else:
-        Mongo_Uri = (
-            f"mongodb+srv://{p.CWA_SE_USER}:{p.CWA_SE_BEARER}@{p.MONGOHOST}/{user_db}"
-        )
-        Mongo_Connection_URI: MongoClient = MongoClient(
-            f"{Mongo_Uri}?retryWrites=true&w=majority",
-            tlsCAFile=certifi.where(),
-            serverSelectionTimeoutMS=500,
-        )
+    logger.info(f"Start get_se_info for {x} in {user_db}.")
 
     # Get SE info from se_info collection and add SE/Region details to se_dict.
 
@@ -131,9 +99,11 @@ def get_se_info(
                 )
                 sleep(pow(2, _))
                 logger.warning(e)
-        logger.error(
-            " *** Failed attempt to connect to se_info collection. Mongo is down."
-        )
+        else:
+            logger.error(
+                " *** Failed attempt to connect to se_info collection. Mongo is down."
+            )
+            se_info_result = None
     else:
         # logger.info(x)
         se_info_result = Mongo_Connection_URI[user_db]["cwa_SEs"].find_one({"se": x})
@@ -154,13 +124,17 @@ def get_se_info(
                     )
                     sleep(pow(2, _))
                     logger.warning(e)
-            logger.error(
-                " *** Failed attempt to connect to cwa_regions collection. Mongo is down."
-            )
+            else:
+                logger.error(
+                    " *** Failed attempt to connect to cwa_regions collection. Mongo is down."
+                )
+                region_numb_result = None
         else:
             region_numb_result = p.cwa_regions.find_one({"Region": se_region})
-        if region_numb_result is not None:
-            region_numb = region_numb_result["Index"]
+        if region_numb_result is None:
+            logger.warning(f"Region {se_region} for SE {x} not found in cwa_regions.")
+            return se_info_result
+        region_numb = region_numb_result["Index"]
         if region_numb in se_dict:
             # Append se_dict with se_region and se
             se_dict[region_numb][1].append(x)
@@ -174,37 +148,17 @@ def add_unknown_se(
     x: str,
     full_SEs: List[List[str]],
     se_dict: Dict[int, List[List[str]]],
-    mode: str,
+    Mongo_Connection_URI: MongoClient,
     user_db: str,
 ) -> Optional[Dict[str, Any]]:
 
-    logger.info(f"Start add_unknown_se for {x} in mode {mode}.")
+    logger.info(f"Start add_unknown_se for {x}.")
     logger.info(f"user_db: {user_db}")
 
     logger.info(f"full_SEs: {full_SEs}")
 
-    # MongoDB connection setup
-    if mode == "debug":
-        Mongo_Uri = (
-            f"mongodb+srv://{p.MONGOUN}:{p.MONGO_BEARER}@{p.MONGOHOST}/{user_db}"
-        )
-        Mongo_Connection_URI: MongoClient = MongoClient(
-            f"{Mongo_Uri}?retryWrites=true&w=majority",
-            tlsCAFile=certifi.where(),
-            serverSelectionTimeoutMS=500,
-        )
-    else:
-        Mongo_Uri = (
-            f"mongodb+srv://{p.CWA_SE_USER}:{p.CWA_SE_BEARER}@{p.MONGOHOST}/{user_db}"
-        )
-        Mongo_Connection_URI = MongoClient(
-            f"{Mongo_Uri}?retryWrites=true&w=majority",
-            tlsCAFile=certifi.where(),
-            serverSelectionTimeoutMS=500,
-        )
-
-    # find x in full_SEs and get the name
-    unknown_se = [y for y in full_SEs if y[1] == x]
+    # find x in full_SEs ([se, se_name] entries) and get the name
+    unknown_se = [y for y in full_SEs if y[0] == x]
 
     # Get highest se_idx from se_info collection and return it
     for _ in range(5):
@@ -221,6 +175,8 @@ def add_unknown_se(
             logger.warning(f" *** Sleeping for {pow(2, _)} seconds and trying again.")
             sleep(pow(2, _))
             logger.warning(e)
+    else:
+        hi_idx = None
     if hi_idx is not None:
         next_se_idx = int(hi_idx["se_idx"]) + 1
     else:
@@ -239,7 +195,7 @@ def add_unknown_se(
                 {
                     "se_idx": next_se_idx,
                     "se": x,
-                    "se_name": unknown_se[0][0],
+                    "se_name": unknown_se[0][1],
                     "op": "VIP",
                     "region": "VIP",
                 }
@@ -276,6 +232,6 @@ def add_unknown_se(
     # logger.error(f"Error adding SE {x} to cwa_matches collection.")
 
     # Add SE to se_dict
-    se_info_result = get_se_info(x, se_dict, mode, user_db)
+    se_info_result = get_se_info(x, se_dict, Mongo_Connection_URI, user_db)
 
     return se_info_result
@@ -0,0 +1,101 @@
+from typing import Dict, Iterable, Iterator, List, Set
+
+from modules.graph_match import SSEM_REGION, VIP_REGION
+
+
+class SEPool:
+    """
+    Set of SEs with O(1) add, discard and uniform random choice.
+
+    SEs live in a list with an SE -> position map; discard moves the last SE
+    into the freed slot. Iteration order depends only on the starting order and
+    the discards made, so a seeded run draws the same SEs every time.
+    """
+
+    def __init__(self, ses: Iterable[str] = ()):
+        self.items: List[str] = []
+        self.position: Dict[str, int] = {}
+        for se in ses:
+            self.add(se)
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def __contains__(self, se: str) -> bool:
+        return se in self.position
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.items)
+
+    def add(self, se: str) -> None:
+        if se not in self.position:
+            self.position[se] = len(self.items)
+            self.items.append(se)
+
+    def discard(self, se: str) -> None:
+        i = self.position.pop(se, None)
+        if i is None:
+            return
+        last = self.items.pop()
+        if i < len(self.items):
+            self.items[i] = last
+            self.position[last] = i
+
+    def choice(self, rng) -> str:
+        return self.items[rng.randrange(len(self.items))]
+
+
+def choice_from(rng, *pools: SEPool) -> str:
+    """Pick uniformly from the union of disjoint pools without building it."""
+    i = rng.randrange(sum(len(pool) for pool in pools))
+    for pool in pools:
+        if i < len(pool):
+            return pool.items[i]
+        i -= len(pool)
+    raise IndexError("choice from empty pools")
+
+
+class RolePools:
+    """
+    The unmatched SEs of one heuristic attempt, indexed by region and role.
+
+    Roles: VIPs (region 100), SSEMs (region 0), SEMs, top SEs and regular SEs
+    (neither VIP nor leader). Only SEs with a region in se_dict are pooled.
+    """
+
+    def __init__(
+        self, se_dict: Dict[int, list], sem_set: Set[str], top_ses: Set[str]
+    ):
+        self.region: Dict[str, int] = {
+            se: region for region, values in se_dict.items() for se in values[1]
+        }
+        ordered = sorted(self.region)
+        self.all = SEPool(ordered)
+        self.by_region: Dict[int, SEPool] = {
+            region: SEPool(sorted(values[1]))
+            for region, values in sorted(se_dict.items())
+            if values[1]
+        }
+        self.ssems = {se for se in ordered if self.region[se] == SSEM_REGION}
+        self.sems = {se for se in ordered if se in sem_set}
+        self.leaders = SEPool(
+            se for se in ordered if se in self.ssems or se in self.sems
+        )
+        self.top = SEPool(se for se in ordered if se in top_ses)
+        self.regular = SEPool(
+            se
+            for se in ordered
+            if self.region[se] != VIP_REGION and se not in self.leaders
+        )
+        self.vips = self.by_region.get(VIP_REGION, SEPool())
+
+    def discard(self, se: str) -> None:
+        region = self.region[se]
+        pool = self.by_region[region]
+        pool.discard(se)
+        if not pool:
+            del self.by_region[region]
+        for role_pool in (self.all, self.leaders, self.top, self.regular, self.vips):
+            role_pool.discard(se)
+        self.ssems.discard(se)
+        self.sems.discard(se)
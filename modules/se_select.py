@@ -1,27 +1,29 @@
 import logging
-import sys
+import os
 from datetime import datetime
 from logging.handlers import RotatingFileHandler
-from random import choice, randint
-from statistics import median_high
+from random import randint
 from threading import Thread
 from time import perf_counter, sleep
 from typing import Dict
 
-import certifi
-from pymongo import MongoClient
 from pymongo.errors import ConnectionFailure
 
 import modules.preferences.preferences as p
-from modules import fuse_host, kobayashi_reset, se_dict_util, se_info_util, top_ses_util
+from modules import (
+    fuse_host,
+    match_engine,
+    match_polish,
+    match_snapshot,
+    match_writer,
+    pair_history,
+    se_dict_util,
+    se_info_util,
+    top_ses_util,
+)
 
 # pylint: disable=logging-fstring-interpolation, undefined-variable, pointless-string-statement
 
-count = 0
-kobayashi_counter = 0
-vips: set[str] = set()
-region_index_cache = {}
-
 
 console_formatter = logging.Formatter(
     "%(asctime)s - %(filename)s:%(lineno)d - %(name)s - %(levelname)s - %(message)s"
@@ -97,33 +99,35 @@ class CustomThread(Thread):
         return self.result
 
 
-def create_se_dict(SEs, full_SEs, mode, user_db) -> Dict[int, list]:
+def create_se_dict(
+    SEs, full_SEs, Mongo_Connection_URI, user_db, snapshot
+) -> Dict[int, list]:
     # Create a dict of all SEs and their regions
-    se_dict: Dict[int, list] = {}
     start_se_dict = perf_counter()
-    for x in SEs:
-        se_info_result = se_dict_util.make_se_dict(x, se_dict, mode, user_db)
-        if se_info_result is None:
-            logger.warning(f"Unknown SE: {x}")
-            se_info_result = se_info_util.add_unknown_se(
-                x, full_SEs, se_dict, mode, user_db
-            )
-    # clear the temp lists, dicts, variables
-    del_vars = ["x", "se_info_result"]
-    for var in del_vars:
-        if var in locals():
-            del var
+    se_dict, unknown_SEs = se_dict_util.build_se_dict(SEs, snapshot)
+    for x in unknown_SEs:
+        logger.warning(f"Unknown SE: {x}")
+        se_info_util.add_unknown_se(
+            x, full_SEs, se_dict, Mongo_Connection_URI, user_db
+        )
+    if unknown_SEs:
+        # Pick up the records add_unknown_se just created
+        snapshot.merge(
+            match_snapshot.load_snapshot(Mongo_Connection_URI, user_db, unknown_SEs)
+        )
     end_se_dict = perf_counter()
     logger.info(f" Time to create se_dict: {end_se_dict - start_se_dict:.6f} seconds.")
     return se_dict
 
 
-def make_sem_set(ses):
-    # Create a list of SEs with SEM
+def make_sem_set(ses, se_info=None):
+    # Create a list of SEs with SEM, from the shared se_info unless one is given
+    if se_info is None:
+        se_info = p.se_info
     sem_set = set()
     for _ in range(5):
         try:
-            sem = p.se_info.find({"sem": {"$eq": True}}, {"se": 1, "_id": 0})
+            sem = se_info.find({"sem": {"$eq": True}}, {"se": 1, "_id": 0})
             break
         except ConnectionFailure as e:
             logger.warning(" *** Connect error getting SEMs from se_info collection.")
@@ -141,196 +145,6 @@ def make_sem_set(ses):
     return sem_set
 
 
-'''def calculate_count(se_dict) -> int:
-    """Calculate the count of SEs remaining."""
-    # Only recalculate the count using this method
-    counting = 0
-    for _ in se_dict.values():
-        counting += len(_[1])
-    return counting'''
-
-"""
-This code ⬆️ replaced by this code ⬇️
-"""
-
-
-def calculate_count(se_dict) -> int:
-    """Calculate the count of SEs remaining."""
-    logger.info("Calculating count of SEs remaining.")
-    counting = 0
-    if se_dict is None or len(se_dict) == 0:
-        logger.warning("se_dict is empty or None.")
-        logger.info(f"Contents of se_dict: {se_dict}")
-    else:
-        for value in se_dict.values():
-            if (
-                isinstance(value, (list, tuple))
-                and len(value) > 1
-                and isinstance(value[1], list)
-            ):
-                counting += len(value[1])
-            else:
-                raise ValueError(
-                    "Each value in se_dict must be a list or tuple with a list as the second element."
-                )
-    return counting
-
-
-def sorted_running_count_func(se_dict) -> Dict[int, int]:
-    # Create a dict of region:se_count -> sorted_running_count
-    running_count: Dict[int, int] = {}
-    for r in se_dict:
-        if len(se_dict[r][1]) > 0:
-            try:
-                for x in se_dict[r][1]:
-                    continue
-                running_count[r] = len(se_dict[r][1])
-            except KeyError:
-                logger.error("KeyError")
-                logger.error(f"Region: {r}")
-                logger.error(f"SEs: {se_dict[r][1]}")
-                logger.error(f"se_dict: {se_dict}")
-                logger.error(f"SE: {x}")
-                sys.exit(1)  # TODO: Handle this error more gracefully
-    # sort running_count by key
-    sorted_running_count: Dict[int, int] = dict(
-        sorted(running_count.items(), key=lambda x: x[0])
-    )
-    # clear temp variables
-    del r, x
-    # clear running_count
-    running_count = {}
-    return sorted_running_count
-
-
-def region_plus_median_func(sorted_running_count, se_median) -> list[int]:
-    """Create a list of SE/Region above the median + 2."""
-    median_pad = [
-        x for x in sorted_running_count if sorted_running_count[x] > se_median + 2
-    ]
-    if len(median_pad) > 0:
-        logger.info(f"Regions above median + 2: {median_pad}")
-    else:
-        logger.info(" No regions are above median + 2. Using calculated high_median.")
-        median_pad = [
-            x for x in sorted_running_count if sorted_running_count[x] >= se_median
-        ]
-
-    # Create a list of keys from sorted_running_count and add the median_pad list
-    region_plus_median = [key for key in sorted_running_count.keys()] + median_pad
-    logger.info(f" Region plus median pad: {region_plus_median}")
-    clear_temp_vars = ["key", "x", "median_pad"]
-    for var in clear_temp_vars:
-        if var in locals():
-            del var
-    return region_plus_median
-
-
-def cleanup_se(
-    region: int, se: str, se_dict, sem_set, SEs, top_ses, vips, zero_set
-) -> None:
-    """Remove se1 from se_dict, region_plus_median, and sorted_running_count."""
-    # Remove se1 from se_dict
-    try:
-        se_dict[region][1].remove(se)
-    except ValueError:
-        logger.error(f"ValueError: {se} not found in se_dict.")
-        logger.error(f"Region: {region}")
-        logger.error(f"SEs: {se_dict[region][1]}")
-        logger.error(f"se_dict: {se_dict}")
-        sys.exit(1)  # TODO: Handle this error more gracefully
-    # Remove se1 from SEs
-    # Verify that se is not in se_dict
-    if se in se_dict[region][1]:
-        logger.warning(f" {se} still in se_dict.")
-    else:
-        logger.info(f" {se} removed from se_dict.")
-
-    sem_set.discard(se)
-    SEs.discard(se)
-    top_ses.discard(se)
-    vips.discard(se)
-    zero_set.discard(se)
-
-    if len(se_dict[region][1]) == 0:
-        print(f" Region {region} has no SEs.")
-        se_dict.pop(region)
-
-
-def lookup_region(se2, user_db, mode):
-
-    # MongoDB connection setup
-    if mode == "debug":
-        Mongo_Uri = (
-            f"mongodb+srv://{p.MONGOUN}:{p.MONGO_BEARER}@{p.MONGOHOST}/{user_db}"
-        )
-        Mongo_Connection_URI = MongoClient(
-            f"{Mongo_Uri}?retryWrites=true&w=majority",
-            tlsCAFile=certifi.where(),
-            serverSelectionTimeoutMS=500,
-        )
-    else:
-        Mongo_Uri = (
-            f"mongodb+srv://{p.CWA_SE_USER}:{p.CWA_SE_BEARER}@{p.MONGOHOST}/{user_db}"
-        )
-        Mongo_Connection_URI = MongoClient(
-            f"{Mongo_Uri}?retryWrites=true&w=majority",
-            tlsCAFile=certifi.where(),
-            serverSelectionTimeoutMS=500,
-        )
-
-    # lookup region for se2
-    for _ in range(5):
-        try:
-            se2_info = Mongo_Connection_URI[user_db]["cwa_SEs"].find_one({"se": se2})
-            break
-        except ConnectionFailure as e:
-            logger.warning(
-                f" *** Connect error getting SE {se2} from se_info collection."
-            )
-            logger.warning(f" *** Sleeping for {pow(2, _)} seconds and trying again.")
-            sleep(pow(2, _))
-            logger.error(e)
-    if se2_info:
-        for _ in range(5):
-            try:
-                se2_region_name = se2_info.get("region")
-                break
-            except ConnectionFailure as e:
-                logger.warning(
-                    f" *** Connect error getting SE {se2} from se_info collection."
-                )
-                logger.warning(
-                    f" *** Sleeping for {pow(2, _)} seconds and trying again."
-                )
-                sleep(pow(2, _))
-                logger.error(e)
-        if se2_region_name:
-            # Use the cached value if available
-            if se2_region_name not in region_index_cache:
-                # Lookup and cache the region index if not already done
-                for _ in range(5):
-                    try:
-                        se2_region_doc = Mongo_Connection_URI[user_db][
-                            "cwa_regions"
-                        ].find_one({"Region": se2_region_name})
-                        break
-                    except ConnectionFailure as e:
-                        logger.error(
-                            f" *** Connect error getting SE {se2} from cwa_regions collection."
-                        )
-                        logger.error(
-                            f" *** Sleeping for {pow(2, _)} seconds and trying again."
-                        )
-                        sleep(pow(2, _))
-                        logger.warning(e)
-                if se2_region_doc:
-                    region_index_cache[se2_region_name] = se2_region_doc.get("Index")
-        # Get the region index from the cache
-        se2_region = region_index_cache.get(se2_region_name)
-        return se2_region, se2_region_name
-
-
 def waterline_target():
     """Determine the target date for a non unique match that's older than 2 years."""
     current_date = datetime.today().strftime("%m/%d/%Y")
@@ -344,124 +158,14 @@ def waterline_target():
     return target_date
 
 
-def last_match_date(se1, se2, target_date, user_db, mode):
-
-    # MongoDB connection setup
-    if mode == "debug":
-        Mongo_Uri = (
-            f"mongodb+srv://{p.MONGOUN}:{p.MONGO_BEARER}@{p.MONGOHOST}/{user_db}"
-        )
-        Mongo_Connection_URI = MongoClient(
-            f"{Mongo_Uri}?retryWrites=true&w=majority",
-            tlsCAFile=certifi.where(),
-            serverSelectionTimeoutMS=500,
-        )
-    else:
-        Mongo_Uri = (
-            f"mongodb+srv://{p.CWA_SE_USER}:{p.CWA_SE_BEARER}@{p.MONGOHOST}/{user_db}"
-        )
-        Mongo_Connection_URI = MongoClient(
-            f"{Mongo_Uri}?retryWrites=true&w=majority",
-            tlsCAFile=certifi.where(),
-            serverSelectionTimeoutMS=500,
-        )
-
-    # Get the last match date for se1 and se2
-    for _ in range(5):
-        try:
-            match_check = Mongo_Connection_URI[user_db]["cwa_matches"].find_one(
-                {"SE": se1}
-            )["assignments"]
-            break
-        except ConnectionFailure as e:
-            logger.error(
-                " *** Connect error getting last match date from cwa_matches collection."
-            )
-            logger.info(f" *** Sleeping for {pow(2, _)} seconds and trying again.")
-            sleep(pow(2, _))
-            logger.error(e)
-    for x, y in match_check.items():
-        if y == se2:
-            match_date = x
-            logger.info(f" {se1} was matched with {se2} on {match_date}.")
-            break
-    # Convert match_date to datetime object
-    match_date = datetime.strptime(match_date, "%m/%d/%Y").date()
-    # If the match_date older than target_date, allow the match
-    if match_date < target_date:
-        return True
-    else:
-        logger.warning(f" {se1} and {se2} cannot be matched.")
-        return False
-
-
-def update_cwa_matches(se, other_value, assignment_date, mode, user_db, max_retries=5):
-
-    # MongoDB connection setup
-    if mode == "debug":
-        Mongo_Uri = (
-            f"mongodb+srv://{p.MONGOUN}:{p.MONGO_BEARER}@{p.MONGOHOST}/{user_db}"
-        )
-        Mongo_Connection_URI = MongoClient(
-            f"{Mongo_Uri}?retryWrites=true&w=majority",
-            tlsCAFile=certifi.where(),
-            serverSelectionTimeoutMS=500,
-        )
-    else:
-        Mongo_Uri = (
-            f"mongodb+srv://{p.CWA_SE_USER}:{p.CWA_SE_BEARER}@{p.MONGOHOST}/{user_db}"
-        )
-        Mongo_Connection_URI = MongoClient(
-            f"{Mongo_Uri}?retryWrites=true&w=majority",
-            tlsCAFile=certifi.where(),
-            serverSelectionTimeoutMS=500,
-        )
-
-    attempts = 0
-    while attempts < max_retries:
-        try:
-            Mongo_Connection_URI[user_db]["cwa_matches"].update_one(
-                {"SE": se}, {"$set": {assignment_date: other_value}}, upsert=True
-            )
-            logger.info(f" Added {se} match to database.")
-            return True  # Update successful
-        except Exception as e:
-            attempts += 1
-            logger.error(
-                f"Error updating {se} to cwa_matches collection on attempt {attempts}."
-            )
-            logger.error(e)
-            if attempts == max_retries:
-                # Decide how to handle the error after all retries fail
-                logger.error(f"Failed to update {se} after {max_retries} attempts.")
-                return False  # Update failed after retries
-
-
-def write_matches_to_file(matches_filename, se_pair_list, mode, user_db):
-
-    # MongoDB connection setup
-    if mode == "debug":
-        Mongo_Uri = (
-            f"mongodb+srv://{p.MONGOUN}:{p.MONGO_BEARER}@{p.MONGOHOST}/{user_db}"
-        )
-        Mongo_Connection_URI = MongoClient(
-            f"{Mongo_Uri}?retryWrites=true&w=majority",
-            tlsCAFile=certifi.where(),
-            serverSelectionTimeoutMS=500,
-        )
-    else:
-        Mongo_Uri = (
-            f"mongodb+srv://{p.CWA_SE_USER}:{p.CWA_SE_BEARER}@{p.MONGOHOST}/{user_db}"
-        )
-        Mongo_Connection_URI = MongoClient(
-            f"{Mongo_Uri}?retryWrites=true&w=majority",
-            tlsCAFile=certifi.where(),
-            serverSelectionTimeoutMS=500,
-        )
-
-    """Write matches to file"""
-    logger.info(f"Writing matches to {matches_filename}")
-    matches_file = open(f".\\match_files\\{matches_filename}", "w", encoding="utf-8")
+def write_matches_to_file(
+    matches_filename, se_pair_list, Mongo_Connection_URI, user_db, output_path=None
+):
+    """Write matches to file, or to output_path when given"""
+    if output_path is None:
+        output_path = f".\\match_files\\{matches_filename}"
+    logger.info(f"Writing matches to {output_path}")
+    matches_file = open(output_path, "w", encoding="utf-8")
     matches_file.write("SE1_NAME,SE1_CCO,SE2_CCO,SE2_NAME\n")
     # Pre-fetch all SE info in a single query and create a dictionary for quick lookup.
     se_ids = {se for pair in se_pair_list for se in pair}
@@ -483,9 +187,7 @@ def write_matches_to_file(matches_filename, se_pair_list, mode, user_db):
             logger.error(e)
 
     # Use a context manager to handle the file writing.
-    with open(
-        f".\\match_files\\{matches_filename}", "a", encoding="utf-8"
-    ) as matches_file:
+    with open(output_path, "a", encoding="utf-8") as matches_file:
         for x, y in se_pair_list:
             # Lookup SE names from the pre-fetched dictionary.
             x_name = se_info_dict.get(x, "Unknown")
@@ -495,37 +197,26 @@ def write_matches_to_file(matches_filename, se_pair_list, mode, user_db):
     logger.info(" File written.")
 
 
-def se_select(fuse_date, Mongo_Connection_URI, se_set, user_db, mode, test_mode=False):
-
-    # MongoDB connection setup
-    if mode == "debug":
-        Mongo_Uri = (
-            f"mongodb+srv://{p.MONGOUN}:{p.MONGO_BEARER}@{p.MONGOHOST}/{user_db}"
-        )
-        Mongo_Connection_URI = MongoClient(
-            f"{Mongo_Uri}?retryWrites=true&w=majority",
-            tlsCAFile=certifi.where(),
-            serverSelectionTimeoutMS=500,
-        )
-    else:
-        Mongo_Uri = (
-            f"mongodb+srv://{p.CWA_SE_USER}:{p.CWA_SE_BEARER}@{p.MONGOHOST}/{user_db}"
-        )
-        Mongo_Connection_URI = MongoClient(
-            f"{Mongo_Uri}?retryWrites=true&w=majority",
-            tlsCAFile=certifi.where(),
-            serverSelectionTimeoutMS=500,
-        )
+def build_context(
+    se_set, Mongo_Connection_URI, user_db, progress=None, region_index=None
+) -> match_engine.MatchContext:
+    """
+    Load everything a match engine needs for se_set in one go.
 
-    start_time = perf_counter()
-    logger.info("SE select function...")
-    logger.info(f"Tracking {len(se_set)} SEs.")
-    kobayashi_se_set = se_set.copy()
-    SEs = se_set
-    full_SEs = se_info_util.get_full_se_list(Mongo_Connection_URI, SEs, user_db)
+    Adds the FUSE host if the count is odd, then loads the snapshot, assignment
+    counts, se_dict, top SEs, SEM set and pair history. A shared region_index
+    (see match_snapshot.load_region_index) saves the cwa_regions read.
+    """
+    SEs = set(se_set)
+    full_SEs, unknown_SEs = se_info_util.get_full_se_list(
+        Mongo_Connection_URI, SEs, user_db
+    )
     logger.info("Returned from get_full_se_list.")
-    kobayashi_full_SEs = full_SEs.copy()
-    se_pair_list = []
+    if unknown_SEs:
+        # create_se_dict adds them to cwa_SEs as VIPs; let the caller know
+        match_engine.report_progress(
+            progress, "unknown SEs", remaining=len(SEs), ses=sorted(unknown_SEs)
+        )
 
     # Add FUSE host if odd number of SEs
     SEs = fuse_host.fuse_host(SEs)
@@ -535,11 +226,12 @@ def se_select(fuse_date, Mongo_Connection_URI, se_set, user_db, mode, test_mode=
 
     logger.info(f"Tracking {count} SEs.")
 
-    # Create a dict of all SEs and their regions using threading
-    se_dict_thread = CustomThread(
-        target=create_se_dict,
-        args=(SEs, full_SEs, mode, user_db),
-        name="se_dict_thread",
+    # Load pairing history, SE records and regions once using threading. The
+    # main loop reads only from this snapshot and makes no database round-trips.
+    snapshot_thread = CustomThread(
+        target=match_snapshot.load_snapshot,
+        args=(Mongo_Connection_URI, user_db, SEs, region_index),
+        name="snapshot_thread",
     )
     # Create a dict of se:match_count using threading
     se_assignment_count_thread = CustomThread(
@@ -548,11 +240,29 @@ def se_select(fuse_date, Mongo_Connection_URI, se_set, user_db, mode, test_mode=
         name="se_assignment_count_thread",
     )
 
-    se_dict_thread.start()
+    start_snapshot = perf_counter()
+    snapshot_thread.start()
     se_assignment_count_thread.start()
 
-    se_dict = se_dict_thread.join()
+    snapshot = snapshot_thread.join()
     se_assignment_count = se_assignment_count_thread.join()
+    match_engine.report_progress(
+        progress,
+        "snapshot",
+        remaining=count,
+        seconds=round(perf_counter() - start_snapshot, 3),
+    )
+
+    # Create a dict of all SEs and their regions from the snapshot
+    start_se_dict = perf_counter()
+    se_dict = create_se_dict(SEs, full_SEs, Mongo_Connection_URI, user_db, snapshot)
+    match_engine.report_progress(
+        progress,
+        "se_dict",
+        remaining=count,
+        regions=len(se_dict),
+        seconds=round(perf_counter() - start_se_dict, 3),
+    )
 
     # Get the 80th percentile of the se_assignment_count
     unformatted_percentile = top_ses_util.top_percentile(se_assignment_count)
@@ -565,611 +275,151 @@ def se_select(fuse_date, Mongo_Connection_URI, se_set, user_db, mode, test_mode=
     # Create the sem_set
     sem_set = make_sem_set(SEs)
 
-    """ Main Loop Starts Here"""
-
-    while count > 0 and kobayashi_counter < 5:
-        logger.info(f"Count: {count}")
-        kobayashi = False
-        priority_region_select = False
-        matchability = True
-
-        count = calculate_count(se_dict)
-        logger.info(f"SEs remaining: {count}")
-        if count == 0:
-            break
+    # Days since each pair of attendees last met, for O(1) pairing checks
+    history = pair_history.PairHistory(SEs, snapshot)
+
+    # Everything the engine needs, so matching makes no database calls
+    return match_engine.MatchContext(
+        SEs,
+        se_dict,
+        sem_set,
+        se_assignment_count,
+        top_ses,
+        history,
+        snapshot,
+        waterline_target(),
+    )
 
-        # Using se_dict, create a dict of region:se_count -> sorted_running_count
-        sorted_running_count = sorted_running_count_func(se_dict)
 
-        logger.info(f"Number of regions: {len(sorted_running_count)}")
-        logger.info(f" Running count of region/SEs: {sorted_running_count}")
+def pair_context(context, engine, seed, polish_seconds, progress=None):
+    """Run the engine, then polish. Returns the pairs, or None on failure."""
+    result = match_engine.get_engine(engine, seed=seed).match(context, progress)
+    if result.ok is False:
+        logger.error(f"No pairing found: {result.diagnostics}")
+        return None
+    se_pair_list = result.pairs
 
-        # The priority_region is the first region in sorted_running_count that has the most SEs
-        # If there is a tie, the first region with the lowest index in sorted_running_count is selected.
-        # On subsequent loops, the other regions will be selected.
-        priority_region = max(sorted_running_count, key=sorted_running_count.get)
-        logger.info(
-            f"Region {str(priority_region)} has the most SEs: {sorted_running_count[priority_region]}"
+    # Polish the pairing with swaps that lower repeats and same-region pairs
+    if polish_seconds > 0:
+        match_engine.report_progress(progress, "polishing", pairs=len(se_pair_list))
+        se_pair_list, score_before, score_after = match_polish.polish(
+            se_pair_list, context, time_budget=polish_seconds
         )
-
-        # What is the total number of SEs minus highest_region_se_count?
-        all_other_regions_se_count = count - sorted_running_count[priority_region]
-        logger.info(
-            f"Total number of SEs in all other regions: {all_other_regions_se_count}"
+        match_engine.report_progress(
+            progress,
+            "polished",
+            pairs=len(se_pair_list),
+            score_before=score_before["score"],
+            score_after=score_after["score"],
         )
+    return se_pair_list
 
-        # if number of regions > 2 and priority region selection conditions are met, select SE from priority region
-        if (
-            len(sorted_running_count) > 2
-            and sorted_running_count[priority_region]
-            == all_other_regions_se_count  # noqa: W503
-        ):
-            logger.warning(
-                f"Region {priority_region} has the same number of SEs as all other regions combined."
-            )
-            logger.warning(f"Select next SE from region {priority_region}.")
-            priority_region_select = True
-
-        # clean up temporary variables
-        del all_other_regions_se_count
-
-        # Create a set of SEs in region 0 representing SE leadership
-        zero_set = set()
-        if 0 in se_dict:
-            zero_set = set(se_dict[0][1])
-
-        # calculate the percentage of SSEMs and SEMs to SEs
-        if len(SEs) > 0:
-            leader_percent = round((len(zero_set) + len(sem_set)) / len(SEs) * 100, 2)
-            logger.info(f" {leader_percent}% of SEs are leaders.")
-
-        if len(sorted_running_count) == 1 and count >= 1:
-            logger.warning(f"---> Remaining SEs are in one region: {SEs}")
-            logger.warning("  *** Kobayashi Maru. Trigger reset. ***")
-            kobayashi = True
-
-        if kobayashi is False:
-            # Calculate the SE/Region median and pad the sorted_running_count
-            if count > 10:
-                se_median = median_high(list(se_assignment_count.values()))
-                logger.info(f"SE/Region median: {se_median}")
-                region_plus_median = region_plus_median_func(
-                    sorted_running_count, se_median
-                )
-            else:
-                se_median = 0
-                # Create a list of keys from sorted_running_count
-                region_plus_median = list(sorted_running_count.keys())
-                logger.info(f"Regions: {region_plus_median}")
-
-            """
-            SE1 section steps
-
-            If a VIP is attending, select first and second SE not in region 0.
-            """
-
-            logger.info("SE1 selection begins.")
-
-            # Is a VIP attending?
-            if 100 in region_plus_median:
-                logger.info(f" VIPs in region 100: {len(se_dict[100][1])}")
-                # Randomly select VIP in region 100
-                se_choice = randint(0, len(se_dict[100][1]) - 1)
-                se1 = se_dict[100][1][se_choice]
-                logger.info(f" SE1 {se1} selected as VIP from region 100.")
-                se1_region = 100
-
-            # Select an SE from top_ses
-            elif len(top_ses) > 0 and leader_percent <= 30:
-                se1 = choice(list(top_ses))
-                # lookup region for se1
-                for se_region, se_values in se_dict.items():
-                    if se1 in se_values[1]:
-                        se1_region = se_region
-                        logger.info(
-                            f" SE1 {se1} in region {str(se1_region)} {se_values[0]} selected from top_ses."
-                        )
-                        if len(top_ses) > 0:
-                            logger.info(f" Remaining top SEs: {top_ses}")
-                        break
-
-            # If leader percentage is greater than 20%, select a leader
-            elif leader_percent > 20:
-                # Select a random leader from zero_set or sem_set
-                leader_set = zero_set.union(sem_set)
-                se1 = choice(list(leader_set))
-                # lookup region for se1
-                for se_region, se_values in se_dict.items():
-                    if se1 in se_values[1]:
-                        se1_region = se_region
-                        logger.info(
-                            " ---> High percentage of leaders. Selecting leader."
-                        )
-                        logger.info(
-                            f"        SE1 {se1} selected from region {se1_region}."
-                        )
-                        break
-
-            # If priority_region_select is True, select SE1 from priority_region
-            elif priority_region_select is True:
-                se1_region = priority_region
-                # Select a random SE from the selected region
-                se1 = choice(se_dict[se1_region][1])
-                logger.info(" ----> Priority selection:")
-                logger.info(f"         SE1 {se1} from region {se1_region}.")
-                # Clean up temporary variables
-                del priority_region
-
-            else:
-                # Select a random SE of those remaining from region_plus_median
-                se1_region = choice(region_plus_median)
-                logger.info(
-                    f"Selected region {se1_region} with {len(se_dict[se1_region][1])} SEs."
-                )
-                # Select a random SE from the selected region
-                se1 = choice(se_dict[se1_region][1])
-                logger.info(f"SE1 {se1} selected from region {se1_region}.")
-
-            """ End of SE1 section steps """
-
-            """ Profile SE1 """
-
-            VIP = False
-            SSEM = False
-            SEM = False
-            SE = False
-
-            # If SEM not attending, remove from sem_present_set
-            sem_set = sem_set.intersection(SEs)
-
-            # Is se1 a VIP?
-            if se1_region == 100:
-                VIP = True
-                # create a set of SEs in region 100
-                # vips = set()
-                if 100 in se_dict:
-                    vips = set(se_dict[100][1])
-                logger.info(f" --> {se1} is a VIP.")
-
-            # Is se1 a senior leader?
-            elif se1 in zero_set:
-                SSEM = True
-                logger.info(f" --> {se1} is a senior leader.")
-                logger.info(f" SSEM's in region 0: {zero_set}")
-
-            # Is se1 a SEM?
-            elif se1 in sem_set:
-                SEM = True
-                logger.info(f" --> {se1} is a SEM.")
-                logger.info(f" SEM's to match: {sem_set}")
-
-            else:
-                SE = True
-                logger.info(f" --> {se1} is a regular SE.")
-
-            """ Clean up se_dict and region_plus_median list before selecting SE2 """
-            logger.info("Clean up before selecting SE2.")
-
-            # Check if vips exists, if it doesn't, create an empty set
-            if "vips" not in locals():
-                vips = set()
-            elif not vips:
-                vips = set()
-
-            # Clean up after selecting se1
-            cleanup_se(se1_region, se1, se_dict, sem_set, SEs, top_ses, vips, zero_set)
-
-            # Using se_dict, recreate sorted_running_count -> a dict of region:se_count
-            sorted_running_count = {}
-            sorted_running_count = sorted_running_count_func(se_dict)
-            logger.info(f" Running count of region/SEs: {sorted_running_count}")
-
-            # Calculate the SE/Region median and pad the sorted_running_count
-            if count > 10:
-                se_median = median_high(list(se_assignment_count.values()))
-                logger.info(f"SE/Region median: {se_median}")
-                region_plus_median = region_plus_median_func(
-                    sorted_running_count, se_median
-                )
-            else:
-                se_median = 0
-                region_plus_median = [key for key in sorted_running_count.keys()]
-                logger.info(f"Regions: {region_plus_median}")
-
-            """ Begin SE2 section steps """
-            logger.info("SE2 selection begins.")
-
-            # Select a random SE from the selected region
-            if VIP is True:
-                logger.info(" SE2 selection for SE1 VIP.")
-                # if se1 is VIP, select an se not in sem_list
-                se2 = choice(list(SEs - sem_set - zero_set - vips))
-                # lookup region for se2
-                se2_region, se2_region_name = lookup_region(se2, user_db, mode)
-                logger.info(f" SE2 {se2} selected from region {se2_region}.")
-                del se2_region_name
-                # del vips, valid_ses, zero_set <- TODO: Move this down, after selecting SE2
-            elif SSEM is True:
-                logger.info(" SE2 selection for SE1 SSEM.")
-                # if se1 is SSEM, select an se not in sem_list
-                se2 = choice(list(SEs - sem_set - zero_set))
-                # lookup region for se2
-                se2_region, se2_region_name = lookup_region(se2, user_db, mode)
-                logger.info(f" SE2 {se2} selected from region {se2_region}.")
-            elif SEM is True:
-                logger.info(" SE2 selection for SE1 SEM.")
-                # if se1 is SEM, select an se not in sem_list
-                se2 = choice(list(SEs - sem_set - zero_set))
-                # lookup region for se2
-                se2_region, se2_region_name = lookup_region(se2, user_db, mode)
-                logger.info(f" SE2 {se2} selected from region {se2_region}.")
-            elif SE is True:
-                logger.info(" SE2 selection for SE1 SE.")
-                # if se1 is SE, select from SSEM, SEM, or SE
-                se2_region_select = [
-                    region for region in region_plus_median if region != se1_region
-                ]
-                se2_region = choice(se2_region_select)
-                # Select a random region from se2_region_select
-                se2 = choice(se_dict[se2_region][1])
-                logger.info(f" SE2 {se2} selected from region {se2_region}.")
-
-            if kobayashi is False:
-                # Has se1 and se2 been paired before?
-                for _ in range(5):
-                    try:
-                        check_pairing_se2 = Mongo_Connection_URI[user_db][
-                            "cwa_matches"
-                        ].find_one({"SE": se2})
-                        break
-                    except ConnectionFailure as e:
-                        logger.error(
-                            " *** Connect error getting SE2 from cwa_matches collection."
-                        )
-                        logger.warning(
-                            f" *** Sleeping for {pow(2, _)} seconds and trying again."
-                        )
-                        sleep(pow(2, _))
-                        logger.error(e)
-
-                # TODO: Fix the code above to handle a situation where there is no record for the SE
-
-                logger.info(f"check_pairing_se2: {check_pairing_se2}")
-
-                """# Check if assignments is empty or None
-                if check_pairing_se2 and not check_pairing_se2.get("assignments"):
-                    logger.info(f"{se2} has no assignment history.")
-                    logger.info(f"SE1 {se1} and SE2 {se2} have not been paired before.")
-                    del check_pairing_se2
-                else:
-                    # Create a set of previous matches for se2
-                    se2_assignments = {
-                        x for x in check_pairing_se2.get("assignments", {}).values()
-                    }
-                    del check_pairing_se2"""
-
-                # is assignments empty?
-                if not check_pairing_se2["assignments"]:
-                    logger.info(
-                        f"{se2} has no assignment history. {len(check_pairing_se2["assignments"])}"
-                    )
-                    logger.info(f"SE1 {se1} and SE2 {se2} have not been paired before.")
-                    del check_pairing_se2
-                else:
-                    # Create a set of previous matches for se2
-                    se2_assignments = {
-                        x for x in check_pairing_se2["assignments"].values()
-                    }
-                    del check_pairing_se2
-
-                    # check if se1 is in se2_assignment
-                    if se1 not in se2_assignments:
-                        logger.info(f" {se1} and {se2} have not been paired before.")
-
-                    # Paired before. Logic to select a different SE2.
-                    else:
-                        logger.info(f" {se1} and {se2} have been paired before.")
-
-                        # Can a unique match be made?
-                        if len(SEs) == 1:
-                            logger.warning("Only one SE left and not a good match.")
-                            # Was a match made with SE1 in the last 2 years?
-                            target_date = waterline_target()
-                            # Check if se1 and se2 were matched in the last 2 years
-                            match_check = last_match_date(
-                                se1, se2, target_date, user_db, mode
-                            )
-                            if match_check is False:
-                                kobayashi = True
-                            else:
-                                print(
-                                    "  Previously matched longer than 2 years ago. Good match."
-                                )
-
-                        else:
-                            # Create a list of previous matches for se1
-                            for _ in range(5):
-                                try:
-                                    se1_matches = list(
-                                        Mongo_Connection_URI[user_db]["cwa_matches"]
-                                        .find_one({"SE": se1})["assignments"]
-                                        .values()
-                                    )
-                                    break
-                                except ConnectionFailure as e:
-                                    logger.error(
-                                        " *** Connect error getting SE1 from cwa_matches collection."
-                                    )
-                                    logger.info(
-                                        f" *** Sleeping for {pow(2, _)} seconds and trying again."
-                                    )
-                                    sleep(pow(2, _))
-                                    logger.debug(e)
-                            # Create a list of SEs that se1 has not been paired with
-                            se1_matchables = [x for x in SEs if x not in se1_matches]
-                            logger.info(
-                                f" Potential matches for se1: {len(se1_matchables)}"
-                            )
-
-                            if len(se1_matchables) > 0:
-                                # Select new se2 from se1_matchables
-                                se2 = choice(se1_matchables)
-                                se2_region, se2_region_name = lookup_region(
-                                    se2, user_db, mode
-                                )
-                                logger.info(
-                                    f" SE2 {se2} selected from region {se2_region_name}."
-                                )
-                                try_count = 1
-
-                                # Is se2 in the same region as se1?
-                                while se2_region == se1_region or (
-                                    se1_region == 100 and se2_region == 0
-                                ):
-                                    logger.warning(
-                                        f" {se1} and {se2} are not a good pairing. Try again."
-                                    )
-                                    # Remove previous se2 selection from se1_matchables
-                                    se1_matchables.remove(se2)
-                                    logger.info(
-                                        f" Potential matches: {len(se1_matchables)}"
-                                    )
-
-                                    if len(se1_matchables) == 0:
-                                        # No more potential matches for se1
-                                        logger.warning(
-                                            f" No more potential matches for {se1}."
-                                        )
-                                        logger.warning(
-                                            "  *** Kobayashi Maru. Trigger reset. ***"
-                                        )
-                                        kobayashi = True
-                                        break
-
-                                    # Select a random SE from se1_matchables
-                                    se2 = choice(se1_matchables)
-                                    # lookup region for se2
-                                    se2_region, se2_region_name = lookup_region(
-                                        se2, user_db, mode
-                                    )
-                                    logger.info(
-                                        f" Selected region {se2_region} with {len(se_dict[se2_region][1])} SEs."
-                                    )
-                                    logger.info(
-                                        f" SE2 {se2} selected from region {se2_region_name}."
-                                    )
-                                    try_count += 1
-
-                                logger.info(f" Selected {se2} in {try_count} attempts.")
-                            else:
-                                # No more potential matches for se1
-                                logger.warning(f" No more potential matches for {se1}.")
-                                logger.warning(
-                                    "  *** Kobayashi Maru. Trigger reset. ***"
-                                )
-                                kobayashi = True
-                                break
-
-                            # clear temp variables
-                            se1_matches = []
-                            se1_matchables = []
-
-                    # Clear temp variables
-                    se2_assignments = []
-
-                if kobayashi is False:
-                    """Profile SE2"""
-
-                    VIP2 = False
-                    SSEM2 = False
-                    SEM2 = False
-                    SE2 = False
-
-                    # If SEM not attending, remove from sem_present_set
-                    sem_set = sem_set.intersection(SEs)
-
-                    # Is se1 a VIP?
-                    if se2 in vips:
-                        VIP2 = True
-                        logger.info(f" --> {se2} is a VIP.")
-
-                    # Is se2 a senior leader?
-                    elif se2 in zero_set:
-                        SSEM2 = True
-                        logger.info(f" --> {se2} is a senior leader.")
-                        logger.info(f" SSEM's in region 0: {zero_set}")
-
-                    # Is se2 a SEM?
-                    elif se2 in sem_set:
-                        SEM2 = True
-                        logger.info(f" --> {se2} is a SEM.")
-
-                    else:
-                        SE = True
-                        logger.info(f" --> {se2} is a regular SE.")
-
-                    # Clean up after selecting se2
-                    logger.info("Clean up after selecting SE2.")
-                    cleanup_se(
-                        se2_region, se2, se_dict, sem_set, SEs, top_ses, vips, zero_set
-                    )
-                    if se2 in top_ses:
-                        top_ses.discard(se2)
-                        logger.info(f" Removed {se2} from top_ses.")
-
-            # Clean up region_plus_median list
-            region_plus_median = []
-
-            if kobayashi is False:
-                # recalculate count
-                count = calculate_count(se_dict)
-                logger.info(f"SEs remaining: {count}")
-
-                # Create a list of SE pairs and append to se_pair_list
-                se_pair = [se1, se2]
-                se_pair_list.append(se_pair)
-                logger.debug(f"Paired {se_pair}")
-                se_pair = []
-
-            # Clear se1 and se2 temp variables
-            temp_vars = [
-                "se1",
-                "se2",
-                "se1_region",
-                "se2_region",
-                "se2_region_name",
-                "se_pair",
-                "se2_assignments",
-                "se_choice",
-                "se_median",
-                "region_plus_median",
-                "se2_region_select",
-                "se_region",
-                "priority_region",
-            ]
-
-            for _ in temp_vars:
-                try:
-                    del globals()[_]
-                except KeyError:
-                    pass
-
-            if len(SEs) > 0:
-                logger.info("~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~")
-                logger.info(f"  {len(SEs - sem_set - zero_set - vips)} SEs to match.")
-                logger.info(f"  SSEM's to match: {zero_set}")
-                logger.info(f"  {len(sem_set)} SEM's to match: {sem_set}")
-                # calculate the percentage of SSEMs and SEMs to SEs
-                if len(SEs) > 0:
-                    leader_percent = round(
-                        (len(zero_set) + len(sem_set)) / len(SEs) * 100, 2
-                    )
-                if leader_percent:
-                    logger.info(f"  {leader_percent}% of SEs are leaders.")
-                logger.info(f"  Total number of SEs: {len(SEs)}")
-                logger.info("~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~")
-
-        if kobayashi is True:
-            # Reset and start over
-            if kobayashi_counter == 5:
-                logger.warning("Kobayashi Maru scenario encountered 5 times. Exiting.")
-                return 500
-            se_pair_list = []
-            # SEs is a set of SEs to be tracked
-            SEs, full_SEs, se_assignment_count, percentile, top_ses = (
-                kobayashi_reset.kobayashi(
-                    kobayashi_counter, kobayashi_se_set, kobayashi_full_SEs
-                )
-            )
 
-            # Create se_dict
-            se_dict = create_se_dict(SEs, full_SEs, mode, user_db)
-
-            # Create the sem_set
-            sem_set = make_sem_set(SEs)
-            logger.info(f"Reset number {kobayashi_counter} complete.")
-
-    if kobayashi is False:
-
-        logger.info("No more SEs remaining.")
-
-        logger.info(se_pair_list)
-        logger.info(f"Number of pairs: {len(se_pair_list)}")
-
-        collection_updates = 0
-
-        if test_mode is False:
-            # Add se_pair_list to cwa_matches collection
-            for x, y in se_pair_list:
-                # Add se1 and se2 to cwa_matches collection
-                assignment_date = f"assignments.{fuse_date}"
-
-                for _ in range(5):
-                    try:
-                        add_se = Mongo_Connection_URI[user_db][
-                            "cwa_matches"
-                        ].update_one(
-                            {"SE": x},
-                            {"$set": {assignment_date: y}},
-                            upsert=True,
-                        )
-                        logger.info(f" Added {x} match to database.")
-                        collection_updates += 1
-                        break
-                    except Exception as e:
-                        logger.error(f"Error updating {x} to cwa_matches collection.")
-                        logger.error(e)
-                        return 500
-
-                for _ in range(5):
-                    try:
-                        add_se = Mongo_Connection_URI[user_db][
-                            "cwa_matches"
-                        ].update_one(
-                            {"SE": y},
-                            {"$set": {assignment_date: x}},
-                            upsert=True,
-                        )
-                        logger.info(f" Added {y} match to database.")
-                        collection_updates += 1
-                    except Exception as e:
-                        logger.error(f"Error adding {y} to cwa_matches collection.")
-                        logger.error(e)
-                        return 500
-
-                # Update SE x
-                if update_cwa_matches(x, y, assignment_date, mode, user_db):
-                    collection_updates += 1
-                else:
-                    # Decide how to handle the cumulative error case
-                    pass
-
-                # Update SE y
-                if update_cwa_matches(y, x, assignment_date, mode, user_db):
-                    collection_updates += 1
-                else:
-                    # Decide how to handle the cumulative error case
-                    pass
-
-                logger.info(f"Collection updates: {collection_updates}")
-
-        # remove / from fuse_date
-        f_date = fuse_date.replace("/", "")
-
-        # create a csv file of the matches
+def save_matches_file(
+    fuse_date,
+    se_pair_list,
+    Mongo_Connection_URI,
+    user_db,
+    progress=None,
+    output_path=None,
+):
+    """
+    Write the match CSV. Returns the filename, or 500 on failure.
+
+    With output_path the CSV is written there and output_path is returned.
+    """
+    # remove / from fuse_date
+    f_date = fuse_date.replace("/", "")
+
+    # create a csv file of the matches
+    match_engine.report_progress(progress, "writing file", pairs=len(se_pair_list))
+    if output_path is not None:
         try:
-            date_name = fuse_date.replace("/", "_")
-            matches_filename = f"{date_name}-matches.csv"
-            write_matches_to_file(matches_filename, se_pair_list, mode, user_db)
-        except PermissionError:
-            logger.error("PermissionError writing matches to file.")
-            filename_count = randint(1, 100)
-            matches_filename = f"{f_date}-matches-PE{filename_count}.csv"
-            write_matches_to_file(matches_filename, se_pair_list, mode, user_db)
-        except Exception as e:
-            logger.error("Error writing matches to file.")
+            write_matches_to_file(
+                os.path.basename(output_path),
+                se_pair_list,
+                Mongo_Connection_URI,
+                user_db,
+                output_path,
+            )
+        except OSError as e:
+            logger.error(f"Error writing matches to {output_path}.")
             logger.error(e)
             return 500
+        return output_path
+    try:
+        date_name = fuse_date.replace("/", "_")
+        matches_filename = f"{date_name}-matches.csv"
+        write_matches_to_file(
+            matches_filename, se_pair_list, Mongo_Connection_URI, user_db
+        )
+    except PermissionError:
+        logger.error("PermissionError writing matches to file.")
+        filename_count = randint(1, 100)
+        matches_filename = f"{f_date}-matches-PE{filename_count}.csv"
+        write_matches_to_file(
+            matches_filename, se_pair_list, Mongo_Connection_URI, user_db
+        )
+    except Exception as e:
+        logger.error("Error writing matches to file.")
+        logger.error(e)
+        return 500
+    return matches_filename
+
+
+def se_select(
+    fuse_date,
+    Mongo_Connection_URI,
+    se_set,
+    user_db,
+    mode,
+    test_mode=False,
+    engine="random",
+    progress=None,
+    seed=None,
+    polish_seconds=0,
+    output_path=None,
+    region_index=None,
+):
+
+    start_time = perf_counter()
+    logger.info("SE select function...")
+    logger.info(f"Tracking {len(se_set)} SEs.")
+
+    context = build_context(
+        se_set, Mongo_Connection_URI, user_db, progress, region_index
+    )
+    se_pair_list = pair_context(context, engine, seed, polish_seconds, progress)
+    if se_pair_list is None:
+        return 500
+
+    logger.info("No more SEs remaining.")
+
+    logger.info(se_pair_list)
+    logger.info(f"Number of pairs: {len(se_pair_list)}")
+
+    if test_mode is False:
+        match_engine.report_progress(progress, "saving", pairs=len(se_pair_list))
+        # Add se_pair_list to cwa_matches collection in one bulk write
+        save_summary = match_writer.save_pairs(
+            Mongo_Connection_URI, user_db, fuse_date, se_pair_list
+        )
+        if save_summary["ok"] is False:
+            logger.error(f"Error saving pairs: {save_summary['error']}")
+            return 500
+        match_engine.report_progress(
+            progress,
+            "saved",
+            pairs=len(se_pair_list),
+            operations=save_summary["operations"],
+            upserted=save_summary["upserted"],
+        )
+
+    matches_filename = save_matches_file(
+        fuse_date, se_pair_list, Mongo_Connection_URI, user_db, progress, output_path
+    )
+    if matches_filename == 500:
+        return 500
 
     end_time = perf_counter()
     logger.info(f"Total time to complete: {end_time - start_time:.6f} seconds.")
@@ -1182,3 +432,114 @@ def se_select(fuse_date, Mongo_Connection_URI, se_set, user_db, mode, test_mode=
     logger.info("test mode is True. Return NA.")
     logger.info("SE select function complete.")
     return "NA"
+
+
+def attendance_delta(assignments, se_set):
+    """
+    Compare the stored pairs for a date with the current attendance.
+
+    assignments maps each stored SE to its partner. Returns (kept pairs,
+    orphans, dropped): pairs where both SEs still attend, attending SEs that
+    need a new partner (new attendees and partners of anyone who left or of
+    the FUSE host), and stored SEs that no longer attend.
+
+    cwa_matches is shared by every area, so only this area's pairs count:
+    SEs in se_set and SEs whose stored partner is in se_set. An SE paired
+    elsewhere, the FUSE host included, is never dropped.
+    """
+    assignments = {
+        se: partner
+        for se, partner in assignments.items()
+        if se in se_set or partner in se_set
+    }
+    kept_pairs = [
+        [se, partner]
+        for se, partner in sorted(assignments.items())
+        if se < partner
+        and assignments.get(partner) == se
+        and se in se_set
+        and partner in se_set
+        and p.host not in (se, partner)
+    ]
+    kept = {se for pair in kept_pairs for se in pair}
+    orphans = set(se_set) - kept - {p.host}
+    dropped = set(assignments) - kept - orphans
+    return kept_pairs, orphans, dropped
+
+
+def se_rematch(
+    fuse_date,
+    Mongo_Connection_URI,
+    se_set,
+    user_db,
+    mode,
+    engine="random",
+    progress=None,
+    seed=None,
+    polish_seconds=0,
+    output_path=None,
+):
+    """
+    Re-pair only the SEs affected by an attendance change since the last run.
+
+    Pairs whose SEs both still attend are kept as stored. SEs who no longer
+    attend, and the FUSE host, lose their assignment for fuse_date; everyone
+    left without a partner is matched afresh, with the graph engine if the
+    chosen engine finds no pairing. Other areas' pairs are not touched.
+    Returns the match filename (output_path when given), or 500 on failure.
+    """
+    start_time = perf_counter()
+    logger.info("SE re-match function...")
+    assignments = match_snapshot.load_date_pairs(
+        Mongo_Connection_URI, user_db, fuse_date, se_set
+    )
+    kept_pairs, orphans, dropped = attendance_delta(assignments, se_set)
+    logger.info(
+        f"Re-match: keeping {len(kept_pairs)} pairs, re-pairing {len(orphans)} SEs, "
+        f"dropping {len(dropped)} SEs."
+    )
+    match_engine.report_progress(
+        progress,
+        "delta",
+        pairs=len(kept_pairs),
+        remaining=len(orphans),
+        dropped=len(dropped),
+    )
+
+    new_pairs = []
+    if orphans:
+        context = build_context(orphans, Mongo_Connection_URI, user_db, progress)
+        new_pairs = pair_context(context, engine, seed, polish_seconds, progress)
+        if new_pairs is None and engine != match_engine.GraphEngine.name:
+            # A handful of orphans can leave the region heuristic no way out
+            logger.warning(
+                f"Engine {engine} found no re-match. Trying "
+                f"{match_engine.GraphEngine.name}."
+            )
+            new_pairs = pair_context(
+                context, match_engine.GraphEngine.name, seed, polish_seconds, progress
+            )
+        if new_pairs is None:
+            return 500
+        logger.info(f"New pairs: {new_pairs}")
+
+    if new_pairs or dropped:
+        match_engine.report_progress(progress, "saving", pairs=len(new_pairs))
+        # Only the changed SEs are written; kept pairs are left as they are.
+        # The FUSE host may be dropped from an old pair and placed in a new one.
+        unset = dropped - {se for pair in new_pairs for se in pair}
+        save_summary = match_writer.save_pairs(
+            Mongo_Connection_URI, user_db, fuse_date, new_pairs, unset=unset
+        )
+        if save_summary["ok"] is False:
+            logger.error(f"Error saving pairs: {save_summary['error']}")
+            return 500
+
+    se_pair_list = sorted(kept_pairs + new_pairs)
+    matches_filename = save_matches_file(
+        fuse_date, se_pair_list, Mongo_Connection_URI, user_db, progress, output_path
+    )
+
+    end_time = perf_counter()
+    logger.info(f"Total time to re-match: {end_time - start_time:.6f} seconds.")
+    return matches_filename
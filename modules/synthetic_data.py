@@ -0,0 +1,128 @@
+from datetime import date, timedelta
+from random import Random
+from typing import Dict, List, Optional, Set
+
+from modules.graph_match import SSEM_REGION, VIP_REGION
+from modules.match_snapshot import MatchSnapshot
+
+# Extra attendee added when the count is odd, standing in for the FUSE host
+SYNTHETIC_HOST = "fuse-host"
+
+# Days between synthetic FUSE sessions
+SESSION_DAYS = 14
+
+
+class SyntheticFuse:
+    """
+    Generated SEs, regions and pairing history for benchmarks.
+
+    Builds attendees SEs spread across regions numbered 1..regions, plus vips
+    SEs in the VIP region and ssems in the SSEM region. The first sems regular
+    SEs are flagged as SEMs. sessions past FUSE sessions, SESSION_DAYS apart,
+    pair a random share (attendance) of the SEs each time. The same seed always
+    gives the same data.
+
+    The records match the cwa_SEs, cwa_regions and cwa_matches layouts, so they
+    can be loaded into a Mongo database with load(), or used directly through
+    snapshot(), se_dict() and assignment_counts() with no database at all.
+    """
+
+    def __init__(
+        self,
+        attendees: int,
+        regions: int = 10,
+        vips: int = 2,
+        ssems: int = 4,
+        sems: int = 6,
+        sessions: int = 24,
+        attendance: float = 0.7,
+        seed: int = 0,
+        today: Optional[date] = None,
+    ):
+        if vips + ssems > attendees:
+            raise ValueError("More VIPs and SSEMs than attendees.")
+        rng = Random(seed)
+        self.today = today or date.today()
+
+        self.region_docs: List[dict] = [
+            {"Region": f"Region {i}", "Index": i} for i in range(1, regions + 1)
+        ]
+        self.region_docs.append({"Region": "VIP", "Index": VIP_REGION})
+        self.region_docs.append({"Region": "SSEM", "Index": SSEM_REGION})
+
+        self.SEs: List[str] = [f"se{i:05d}" for i in range(attendees)]
+        if attendees % 2:
+            self.SEs.append(SYNTHETIC_HOST)
+
+        self.sem_set: Set[str] = set()
+        self.se_docs: List[dict] = []
+        for i, se in enumerate(self.SEs):
+            if i < vips:
+                region = "VIP"
+            elif i < vips + ssems:
+                region = "SSEM"
+            else:
+                region = f"Region {rng.randint(1, regions)}"
+                if i < vips + ssems + sems:
+                    self.sem_set.add(se)
+            self.se_docs.append(
+                {
+                    "se_idx": i,
+                    "se": se,
+                    "se_name": f"Synthetic {se}",
+                    "region": region,
+                    "sem": se in self.sem_set,
+                }
+            )
+
+        self.assignments: Dict[str, Dict[str, str]] = {se: {} for se in self.SEs}
+        for session in range(sessions, 0, -1):
+            session_date = self.today - timedelta(days=SESSION_DAYS * session)
+            fuse_date = session_date.strftime("%m/%d/%Y")
+            present = [se for se in self.SEs if rng.random() < attendance]
+            rng.shuffle(present)
+            for x, y in zip(present[::2], present[1::2]):
+                self.assignments[x][fuse_date] = y
+                self.assignments[y][fuse_date] = x
+
+    def match_docs(self) -> List[dict]:
+        """cwa_matches records, one per SE."""
+        return [
+            {"SE": se, "assignments": assignments}
+            for se, assignments in self.assignments.items()
+        ]
+
+    def load(self, db) -> None:
+        """Replace the cwa_SEs, cwa_regions and cwa_matches collections in db."""
+        for name, docs in (
+            ("cwa_regions", self.region_docs),
+            ("cwa_SEs", self.se_docs),
+            ("cwa_matches", self.match_docs()),
+        ):
+            db[name].delete_many({})
+            # insert_many adds _id to the documents it is given
+            db[name].insert_many([dict(doc) for doc in docs])
+
+    def snapshot(self) -> MatchSnapshot:
+        """The MatchSnapshot load_snapshot would return for all SEs."""
+        return MatchSnapshot(
+            {se: dict(assignments) for se, assignments in self.assignments.items()},
+            {doc["se"]: dict(doc) for doc in self.se_docs},
+            {doc["Region"]: doc["Index"] for doc in self.region_docs},
+        )
+
+    def se_dict(self) -> Dict[int, list]:
+        """{region index: [[region name], [SEs]]}, as create_se_dict builds it."""
+        index = {doc["Region"]: doc["Index"] for doc in self.region_docs}
+        se_dict: Dict[int, list] = {}
+        for doc in self.se_docs:
+            region_numb = index[doc["region"]]
+            if region_numb in se_dict:
+                se_dict[region_numb][1].append(doc["se"])
+            else:
+                se_dict[region_numb] = [[doc["region"]], [doc["se"]]]
+        return se_dict
+
+    def assignment_counts(self) -> Dict[str, int]:
+        """{SE: number of past matches}, as se_count_dict returns it."""
+        return {se: len(assignments) for se, assignments in self.assignments.items()}
@@ -0,0 +1,175 @@
+import glob
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+from time import sleep
+from typing import Any, BinaryIO, Dict, Optional, Set, Tuple
+
+from pymongo.errors import ConnectionFailure
+
+from modules.process_attachment import STATUSES, parse_responses
+
+# pylint: disable=logging-fstring-interpolation
+
+logger = logging.getLogger(__name__)
+
+# One JSON file per distinct upload, named by the SHA-256 of its content
+PARSED_FOLDER = os.path.join("uploads", "parsed")
+HASH_PATTERN = re.compile(r"[0-9a-f]{64}")
+# Uploads are copied to disk in chunks of this size, never read whole
+CHUNK_SIZE = 64 * 1024
+# Parsed uploads kept; the least recently used beyond this are removed
+MAX_PARSED = 200
+
+
+def spool_upload(stream: BinaryIO, max_bytes: int) -> Tuple[str, str, int]:
+    """
+    Copy an upload stream to a temporary file, hashing it on the way.
+
+    Returns (temporary path, SHA-256, size). Reading stops once the upload
+    passes max_bytes, so for an upload that is too large only the size can
+    be trusted. The caller removes the temporary file.
+    """
+    os.makedirs(PARSED_FOLDER, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    with tempfile.NamedTemporaryFile(
+        "wb", dir=PARSED_FOLDER, suffix=".upload", delete=False
+    ) as spool:
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                break
+            digest.update(chunk)
+            spool.write(chunk)
+    return spool.name, digest.hexdigest(), size
+
+
+def parsed_path(upload_hash: str) -> str:
+    return os.path.join(PARSED_FOLDER, f"{upload_hash}.json")
+
+
+def parse_upload(path: str, upload_hash: str, filename: str) -> Dict[str, Any]:
+    """
+    Parse an uploaded Outlook tracking CSV saved at path into its normalized form.
+
+    The file is read row by row. Returns {"sha256", "filename", "responses":
+    {alias: status}, "counts": {status: n}, "errors": [[line number,
+    problem]]}. Raises UnicodeDecodeError if the upload is not UTF-8 text.
+    """
+    with open(path, "r", encoding="utf-8-sig", newline="") as data_file:
+        responses, errors = parse_responses(data_file)
+    by_alias = {
+        alias: status for status in STATUSES for alias in sorted(responses[status])
+    }
+    return {
+        "sha256": upload_hash,
+        "filename": filename,
+        "responses": dict(sorted(by_alias.items())),
+        "counts": {
+            status: sum(1 for value in by_alias.values() if value == status)
+            for status in STATUSES
+        },
+        "errors": [list(error) for error in errors],
+    }
+
+
+def load_parsed(upload_hash: str) -> Optional[Dict[str, Any]]:
+    """Return the parsed upload for upload_hash, or None if there is none."""
+    if not HASH_PATTERN.fullmatch(upload_hash or ""):
+        return None
+    try:
+        with open(parsed_path(upload_hash), "r", encoding="utf-8") as parsed_file:
+            return json.load(parsed_file)
+    except (OSError, ValueError):
+        return None
+
+
+def save_parsed(parsed: Dict[str, Any]) -> None:
+    os.makedirs(PARSED_FOLDER, exist_ok=True)
+    path = parsed_path(parsed["sha256"])
+    # Write then rename, so a reader never sees half a file
+    with open(f"{path}.tmp", "w", encoding="utf-8") as parsed_file:
+        json.dump(parsed, parsed_file)
+    os.replace(f"{path}.tmp", path)
+    evict_parsed()
+
+
+def evict_parsed(keep: int = MAX_PARSED) -> None:
+    """Remove all but the keep most recently used parsed uploads."""
+    paths = glob.glob(os.path.join(PARSED_FOLDER, "*.json"))
+    if len(paths) <= keep:
+        return
+    try:
+        paths.sort(key=os.path.getmtime, reverse=True)
+    except OSError:
+        # Another worker evicted a file while sorting; it will run again
+        return
+    for path in paths[keep:]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    logger.info(f"Evicted {len(paths) - keep} parsed uploads.")
+
+
+def load_or_parse(
+    path: str, upload_hash: str, filename: str
+) -> Tuple[Dict[str, Any], bool]:
+    """
+    Return (parsed upload, True if it came from the cache).
+
+    path is the upload as written by spool_upload. An upload whose content
+    was parsed before is not parsed again.
+    """
+    parsed = load_parsed(upload_hash)
+    if parsed is not None:
+        logger.info(f"Upload {filename} matches parsed upload {upload_hash}.")
+        try:
+            # Mark it recently used, so eviction keeps it
+            os.utime(parsed_path(upload_hash))
+        except OSError:
+            pass
+        return parsed, True
+    parsed = parse_upload(path, upload_hash, filename)
+    save_parsed(parsed)
+    logger.info(
+        f"Parsed upload {filename} ({upload_hash}): {parsed['counts']}, "
+        f"{len(parsed['errors'])} rows skipped."
+    )
+    return parsed, False
+
+
+def applied(
+    Mongo_Connection_URI, user_db: str, area: str, fuse_date: str, upload_hash: str
+) -> bool:
+    """True if the upload was already applied to the area's record for fuse_date."""
+    for _ in range(5):
+        try:
+            return (
+                Mongo_Connection_URI[user_db][f"{area}_prematch"].find_one(
+                    {"date": fuse_date, "upload_hash": upload_hash}, {"_id": 1}
+                )
+                is not None
+            )
+        except ConnectionFailure as e:
+            logger.warning(f" *** Connect error reading {area}_prematch collection.")
+            logger.warning(f" *** Sleeping for {pow(2, _)} seconds and trying again.")
+            sleep(pow(2, _))
+            logger.warning(e)
+    logger.error(f" *** Failed to read {area}_prematch collection. Mongo is down.")
+    return False
+
+
+def response_sets(parsed: Dict[str, Any]) -> Dict[str, Set[str]]:
+    """{status: aliases} from a parsed upload, as ProcessAttachment.apply takes."""
+    responses: Dict[str, Set[str]] = {status: set() for status in STATUSES}
+    for alias, status in parsed["responses"].items():
+        responses[status].add(alias)
+    return responses
@@ -110,3 +110,96 @@ document.addEventListener('DOMContentLoaded', function() {
     if (parts.length === 2) return parts.pop().split(';').shift();
   }
 });
+
+// Preview tables: a <div data-preview-url="..."> loads one page of rows at a
+// time from the JSON preview API, with sortable headers and a filter box.
+function initPreviewTable(container) {
+  const state = { page: 1, sort: null, order: 'asc', q: '' };
+
+  const filter = document.createElement('input');
+  filter.className = 'input is-small mb-2';
+  filter.type = 'search';
+  filter.placeholder = 'Filter rows...';
+  const table = document.createElement('table');
+  table.className = 'table table-striped is-fullwidth';
+  const pager = document.createElement('div');
+  pager.className = 'buttons has-addons is-centered mt-2';
+  const prev = document.createElement('button');
+  prev.className = 'button is-small';
+  prev.textContent = 'Previous';
+  const pageInfo = document.createElement('span');
+  pageInfo.className = 'button is-small is-static';
+  const next = document.createElement('button');
+  next.className = 'button is-small';
+  next.textContent = 'Next';
+  pager.append(prev, pageInfo, next);
+  container.append(filter, table, pager);
+
+  let filterTimer;
+  filter.addEventListener('input', () => {
+    clearTimeout(filterTimer);
+    filterTimer = setTimeout(() => {
+      state.q = filter.value;
+      state.page = 1;
+      load();
+    }, 250);
+  });
+  prev.addEventListener('click', () => {
+    state.page -= 1;
+    load();
+  });
+  next.addEventListener('click', () => {
+    state.page += 1;
+    load();
+  });
+
+  function render(data) {
+    table.replaceChildren();
+    const headRow = table.createTHead().insertRow();
+    data.columns.forEach(column => {
+      const th = document.createElement('th');
+      const arrow = data.sort === column ? (data.order === 'asc' ? ' ▲' : ' ▼') : '';
+      th.textContent = column + arrow;
+      th.style.cursor = 'pointer';
+      th.addEventListener('click', () => {
+        state.order = state.sort === column && state.order === 'asc' ? 'desc' : 'asc';
+        state.sort = column;
+        state.page = 1;
+        load();
+      });
+      headRow.appendChild(th);
+    });
+    const body = table.createTBody();
+    data.rows.forEach(row => {
+      const tr = body.insertRow();
+      row.forEach(cell => {
+        tr.insertCell().textContent = cell;
+      });
+    });
+    state.page = data.page;
+    pageInfo.textContent = `Page ${data.page} of ${data.pages} (${data.filtered} of ${data.total} rows)`;
+    prev.disabled = data.page <= 1;
+    next.disabled = data.page >= data.pages;
+  }
+
+  function load() {
+    const params = new URLSearchParams({ page: state.page, order: state.order, q: state.q });
+    if (state.sort) params.set('sort', state.sort);
+    fetch(`${container.dataset.previewUrl}?${params}`)
+      .then(response => {
+        if (!response.ok) throw new Error(`Preview request failed (${response.status})`);
+        return response.json();
+      })
+      .then(render)
+      .catch(error => {
+        console.error('Error:', error);
+        pageInfo.textContent = 'Preview unavailable';
+      });
+  }
+
+  load();
+}
+
+document.addEventListener('DOMContentLoaded', () => {
+  document.querySelectorAll('[data-preview-url]').forEach(initPreviewTable);
+});
@@ -0,0 +1,44 @@
+"""
+Shared pytest setup.
+
+Tests run from the repository root, where the modules' logging handlers
+open ./logs/se_select.log. modules.preferences holds the deployment's
+credentials and is not in the repository; when it cannot be imported, a
+stand-in with in-memory mongomock collections takes its place.
+"""
+import os
+import sys
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+os.makedirs("logs", exist_ok=True)
+
+FUSE_HOST = "fuse-host"
+
+
+def _preferences_stand_in() -> types.ModuleType:
+    preferences = types.ModuleType("modules.preferences.preferences")
+    preferences.host = FUSE_HOST
+    preferences.client = None
+    preferences.cwa_matches = preferences.cwa_regions = preferences.se_info = None
+    try:
+        import mongomock
+    except ImportError:
+        return preferences
+    preferences.client = mongomock.MongoClient()
+    db = preferences.client["fuse-test"]
+    preferences.cwa_matches = db["cwa_matches"]
+    preferences.cwa_regions = db["cwa_regions"]
+    preferences.se_info = db["cwa_SEs"]
+    return preferences
+
+
+try:
+    import modules.preferences.preferences  # noqa: F401 pylint: disable=unused-import
+except ImportError:
+    package = types.ModuleType("modules.preferences")
+    package.preferences = _preferences_stand_in()
+    sys.modules["modules.preferences"] = package
+    sys.modules["modules.preferences.preferences"] = package.preferences
@@ -0,0 +1,30 @@
+from modules import match_areas
+
+
+def test_areas_without_shared_ses_run_apart():
+    attendance = {"west": {"a", "b"}, "east": {"c", "d"}, "cwa": {"e", "f"}}
+    assert match_areas.overlap_groups(attendance) == [["cwa"], ["east"], ["west"]]
+
+
+def test_areas_sharing_an_se_are_grouped():
+    attendance = {
+        "west": {"a", "b"},
+        "east": {"b", "c"},
+        "south": {"c", "d"},
+        "cwa": {"e", "f"},
+    }
+    assert match_areas.overlap_groups(attendance) == [
+        ["cwa"],
+        ["east", "south", "west"],
+    ]
+
+
+def test_odd_areas_share_the_fuse_host():
+    attendance = {"west": {"a", "b", "c"}, "east": {"d", "e", "f"}, "cwa": {"g"}}
+    assert match_areas.overlap_groups(attendance) == [["cwa", "east", "west"]]
+
+
+def test_matched_ses_adds_the_host_to_odd_sets_only():
+    host = match_areas.p.host
+    assert match_areas.matched_ses({"a", "b", "c"}) == {"a", "b", "c", host}
+    assert match_areas.matched_ses({"a", "b"}) == {"a", "b"}
@@ -0,0 +1,70 @@
+from statistics import median
+from time import perf_counter
+
+from modules import match_engine, pair_history
+from modules.synthetic_data import SyntheticFuse
+
+# A large FUSE session
+ATTENDEES = 300
+
+
+def make_context(attendees=ATTENDEES, seed=1):
+    data = SyntheticFuse(attendees, seed=seed)
+    snapshot = data.snapshot()
+    return match_engine.MatchContext(
+        data.SEs,
+        data.se_dict(),
+        data.sem_set,
+        data.assignment_counts(),
+        set(),
+        pair_history.PairHistory(set(data.SEs), snapshot, today=data.today),
+        snapshot,
+        data.today.replace(year=data.today.year - 1),
+    )
+
+
+def timed(engine, context):
+    start = perf_counter()
+    result = engine.match(context)
+    return perf_counter() - start, result
+
+
+def test_best_of_pairs_everyone():
+    context = make_context()
+    result = match_engine.BestOfEngine(seed=3, workers=1).match(context)
+    assert result.ok
+    assert sorted(se for pair in result.pairs for se in pair) == sorted(context.SEs)
+
+
+def test_best_of_serial_run_stays_within_one_attempts_time():
+    context = make_context()
+    one_attempt = median(
+        timed(match_engine.HeuristicEngine(seed=seed), context)[0]
+        for seed in range(5)
+    )
+    seconds, result = timed(match_engine.BestOfEngine(seed=3, workers=1), context)
+    assert result.ok
+    assert result.diagnostics["run"] < match_engine.BEST_OF_ATTEMPTS
+    # The budget allows SERIAL_BUDGET_ATTEMPTS attempts; allow one more for
+    # attempts that run long, plus scheduling noise
+    limit = (match_engine.SERIAL_BUDGET_ATTEMPTS + 1) * one_attempt + 0.05
+    assert seconds <= limit
+
+
+def test_best_of_time_budget_is_respected():
+    context = make_context()
+    result = match_engine.BestOfEngine(seed=3, workers=1, time_budget=0).match(
+        context
+    )
+    # The first attempt always runs
+    assert result.ok
+    assert result.diagnostics["run"] == 1
+
+
+def test_graph_diagnostics_leave_out_the_seed():
+    context = make_context(attendees=40)
+    graph = match_engine.GraphEngine(seed=3).match(context)
+    heuristic = match_engine.HeuristicEngine(seed=3).match(context)
+    assert graph.ok
+    assert "seed" not in graph.diagnostics
+    assert heuristic.diagnostics["seed"] == 3
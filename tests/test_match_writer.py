@@ -0,0 +1,109 @@
+import pytest
+from pymongo.errors import OperationFailure
+
+from modules import match_writer
+
+
+class FakeResult:
+    matched_count = 0
+    modified_count = 0
+    upserted_count = 2
+
+
+class FakeCollection:
+    """A cwa_matches collection whose client's sessions raise session_error."""
+
+    def __init__(self, session_error):
+        self.writes = []
+        self.database = self
+        self.client = self
+        self.session_error = session_error
+
+    def start_session(self):
+        raise self.session_error
+
+    def bulk_write(self, operations, ordered=True, session=None):
+        self.writes.append(operations)
+        return FakeResult()
+
+
+def test_standalone_server_falls_back_to_plain_bulk_write():
+    error = OperationFailure(
+        "Transaction numbers are only allowed on a replica set member or mongos",
+        code=match_writer.TRANSACTIONS_UNSUPPORTED_CODE,
+    )
+    collection = FakeCollection(error)
+    operations = match_writer.pair_operations([["a", "b"]], "10/17/2026")
+
+    summary = match_writer._bulk_write(collection, operations)
+
+    assert collection.writes == [operations]
+    assert summary["transaction"] is False
+
+
+def test_other_operation_failures_are_raised():
+    collection = FakeCollection(OperationFailure("not authorized", code=13))
+    operations = match_writer.pair_operations([["a", "b"]], "10/17/2026")
+
+    with pytest.raises(OperationFailure):
+        match_writer._bulk_write(collection, operations)
+    assert collection.writes == []
+
+
+class AppliedResult:
+    def __init__(self, results):
+        self.matched_count = sum(r.matched_count for r in results)
+        self.modified_count = sum(r.modified_count for r in results)
+        self.upserted_count = sum(r.upserted_id is not None for r in results)
+
+
+@pytest.fixture
+def cwa_matches(monkeypatch):
+    mongomock = pytest.importorskip("mongomock")
+
+    # mongomock's bulk_write does not take the UpdateOne fields newer pymongo
+    # sends, so apply each operation on its own
+    def bulk_write(self, operations, ordered=True, session=None):
+        return AppliedResult(
+            [self.update_one(o._filter, o._doc, upsert=o._upsert) for o in operations]
+        )
+
+    monkeypatch.setattr(mongomock.Collection, "bulk_write", bulk_write)
+    client = mongomock.MongoClient()
+    return client, client["fuse-test"]["cwa_matches"]
+
+
+def test_save_pairs_records_each_pair_on_both_sides(cwa_matches):
+    client, collection = cwa_matches
+    collection.insert_one({"SE": "a", "assignments": {"10/03/2026": "c"}})
+
+    summary = match_writer.save_pairs(
+        client, "fuse-test", "10/17/2026", [["a", "b"], ["c", "d"]]
+    )
+
+    assert summary["ok"] is True
+    assert summary["operations"] == 4
+    assignments = {doc["SE"]: doc["assignments"] for doc in collection.find()}
+    assert assignments == {
+        "a": {"10/03/2026": "c", "10/17/2026": "b"},
+        "b": {"10/17/2026": "a"},
+        "c": {"10/17/2026": "d"},
+        "d": {"10/17/2026": "c"},
+    }
+
+
+def test_save_pairs_unsets_dropped_ses(cwa_matches):
+    client, collection = cwa_matches
+    match_writer.save_pairs(client, "fuse-test", "10/17/2026", [["a", "b"]])
+
+    summary = match_writer.save_pairs(
+        client, "fuse-test", "10/17/2026", [["a", "c"]], unset=["b"]
+    )
+
+    assert summary["ok"] is True
+    assignments = {doc["SE"]: doc["assignments"] for doc in collection.find()}
+    assert assignments == {
+        "a": {"10/17/2026": "c"},
+        "b": {},
+        "c": {"10/17/2026": "a"},
+    }
@@ -0,0 +1,110 @@
+from datetime import datetime
+
+import pytest
+
+from modules import prematch_changes
+
+FUSE_DATE = "10/17/2026"
+
+
+def delta(*entries, **fields):
+    return {
+        "changes": [{"se": se, "from": old, "to": new} for se, old, new in entries],
+        **fields,
+    }
+
+
+def test_replay_applies_adds_changes_and_removals_in_order():
+    deltas = [
+        delta(("jdoe", None, "accepted"), ("sroe", None, "tentative")),
+        delta(("sroe", "tentative", "declined"), ("apoe", None, "no_response")),
+        delta(("jdoe", "accepted", None)),
+    ]
+    assert prematch_changes.replay(deltas) == {
+        "apoe": "no_response",
+        "sroe": "declined",
+    }
+
+
+def test_replay_of_nothing_is_empty():
+    assert prematch_changes.replay([]) == {}
+    assert prematch_changes.replay([{"changes": []}]) == {}
+
+
+def test_change_entries_round_trip_through_replay():
+    changes = {
+        "added": {"kloe": "accepted"},
+        "removed": {"jdoe": "declined"},
+        "changed": {"sroe": ["tentative", "accepted"]},
+    }
+    entries = prematch_changes.change_entries(changes)
+    assert [entry["se"] for entry in entries] == ["jdoe", "kloe", "sroe"]
+    before = {"jdoe": "declined", "sroe": "tentative"}
+    baseline = delta(*[(se, None, status) for se, status in before.items()])
+    assert prematch_changes.replay([baseline, {"changes": entries}]) == {
+        "kloe": "accepted",
+        "sroe": "accepted",
+    }
+
+
+@pytest.fixture
+def client():
+    mongomock = pytest.importorskip("mongomock")
+    return mongomock.MongoClient()
+
+
+def test_status_at_rebuilds_the_record_at_each_upload(client):
+    collection = prematch_changes.changes_collection(client, "fuse-test", "cwa")
+    collection.insert_many(
+        [
+            delta(
+                ("jdoe", None, "accepted"),
+                date=FUSE_DATE,
+                timestamp=datetime(2026, 10, 1, 9),
+            ),
+            delta(
+                ("jdoe", "accepted", "declined"),
+                ("sroe", None, "accepted"),
+                date=FUSE_DATE,
+                timestamp=datetime(2026, 10, 8, 9),
+            ),
+            delta(
+                ("kloe", None, "accepted"),
+                date="10/03/2026",
+                timestamp=datetime(2026, 10, 2, 9),
+            ),
+        ]
+    )
+
+    def status_at(at=None):
+        return prematch_changes.status_at(client, "fuse-test", "cwa", FUSE_DATE, at)
+
+    assert status_at(datetime(2026, 9, 30)) == {}
+    assert status_at(datetime(2026, 10, 1, 9)) == {"jdoe": "accepted"}
+    assert status_at(datetime(2026, 10, 5)) == {"jdoe": "accepted"}
+    assert status_at() == {"jdoe": "declined", "sroe": "accepted"}
+
+
+def test_record_changes_stores_the_baseline_first(client):
+    recorded = prematch_changes.record_changes(
+        client,
+        "fuse-test",
+        "cwa",
+        FUSE_DATE,
+        "a" * 64,
+        {"added": {"sroe": "accepted"}, "changed": {"jdoe": ["accepted", "declined"]}},
+        baseline={"jdoe": "accepted"},
+    )
+    # The same upload again changes nothing, so nothing is stored
+    repeated = prematch_changes.record_changes(
+        client, "fuse-test", "cwa", FUSE_DATE, "a" * 64, {}
+    )
+
+    assert recorded is True
+    assert repeated is False
+    deltas = prematch_changes.list_changes(client, "fuse-test", "cwa", FUSE_DATE)
+    assert [d.get("baseline", False) for d in deltas] == [True, False]
+    assert prematch_changes.status_at(client, "fuse-test", "cwa", FUSE_DATE) == {
+        "jdoe": "declined",
+        "sroe": "accepted",
+    }
@@ -0,0 +1,42 @@
+from modules import preview
+
+COLUMNS = ["Alias", "Status"]
+ROWS = [{"Alias": f"se{n:03}", "Status": "accepted"} for n in range(25)]
+
+
+def test_page_past_the_end_shows_the_last_page():
+    table = preview.page_rows(COLUMNS, ROWS, page=9, per_page=10)
+    assert table["page"] == 3
+    assert table["pages"] == 3
+    assert table["rows"] == [[f"se{n:03}", "accepted"] for n in range(20, 25)]
+
+
+def test_page_before_the_start_shows_the_first_page():
+    table = preview.page_rows(COLUMNS, ROWS, page=-2, per_page=10)
+    assert table["page"] == 1
+    assert table["rows"][0] == ["se000", "accepted"]
+
+
+def test_per_page_is_clamped():
+    assert preview.page_rows(COLUMNS, ROWS, per_page=0)["per_page"] == 1
+    table = preview.page_rows(COLUMNS, ROWS, per_page=preview.MAX_PER_PAGE + 1)
+    assert table["per_page"] == preview.MAX_PER_PAGE
+
+
+def test_no_matching_rows_is_one_empty_page():
+    table = preview.page_rows(COLUMNS, ROWS, page=4, q="nobody")
+    assert table["page"] == 1
+    assert table["pages"] == 1
+    assert table["rows"] == []
+    assert table["total"] == 25
+    assert table["filtered"] == 0
+
+
+def test_unknown_sort_column_keeps_the_stored_order():
+    rows = [{"Alias": "b"}, {"Alias": "a"}]
+    table = preview.page_rows(["Alias"], rows, sort="Region", order="desc")
+    assert table["sort"] is None
+    assert table["rows"] == [["b"], ["a"]]
+    table = preview.page_rows(["Alias"], rows, sort="Alias", order="desc")
+    assert table["rows"] == [["b"], ["a"]]
+    assert preview.page_rows(["Alias"], rows, sort="Alias")["rows"] == [["a"], ["b"]]
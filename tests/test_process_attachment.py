@@ -0,0 +1,50 @@
+from modules.process_attachment import parse_responses
+
+
+def test_responses_are_sorted_by_status():
+    rows = [
+        "Name,Attendance,Response",
+        "Jane Doe (jdoe),Required Attendee,Accepted",
+        "Sam Roe (sroe),Optional Attendee,Declined",
+        "Ann Poe (apoe),Required Attendee,Tentative",
+        "Kim Loe (kloe),Required Attendee,None",
+    ]
+    responses, errors = parse_responses(rows)
+    assert errors == []
+    assert responses == {
+        "accepted": {"jdoe"},
+        "declined": {"sroe"},
+        "tentative": {"apoe"},
+        "no_response": {"kloe"},
+    }
+
+
+def test_columns_are_found_from_the_header():
+    rows = ["Response,Name", "Accepted,Jane Doe (jdoe)"]
+    responses, errors = parse_responses(rows)
+    assert errors == []
+    assert responses["accepted"] == {"jdoe"}
+
+
+def test_bad_rows_are_reported_with_their_line_numbers():
+    rows = [
+        "Name,Attendance,Response",
+        "Jane Doe (jdoe),Required Attendee,Accepted",
+        "Sam Roe (sroe),Required Attendee",
+        "",
+        "Organizer without alias,Required Attendee,Accepted",
+        "Empty alias (),Required Attendee,Accepted",
+    ]
+    responses, errors = parse_responses(rows)
+    assert responses["accepted"] == {"jdoe"}
+    assert errors == [
+        (3, "expected 3 columns, found 2"),
+        (5, "no alias in 'Organizer without alias'"),
+        (6, "no alias in 'Empty alias ()'"),
+    ]
+
+
+def test_an_empty_file_has_no_responses():
+    responses, errors = parse_responses([])
+    assert errors == []
+    assert all(not aliases for aliases in responses.values())
@@ -0,0 +1,56 @@
+import os
+
+import pytest
+
+from modules import upload_cache
+
+
+@pytest.fixture
+def parsed_folder(tmp_path, monkeypatch):
+    monkeypatch.setattr(upload_cache, "PARSED_FOLDER", str(tmp_path))
+    return tmp_path
+
+
+def write_parsed(folder, name, mtime):
+    path = folder / f"{name}.json"
+    path.write_text("{}", encoding="utf-8")
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_evict_keeps_the_most_recently_used(parsed_folder):
+    for age, name in enumerate("abcde"):
+        write_parsed(parsed_folder, name, 1_000_000 - age)
+
+    upload_cache.evict_parsed(keep=2)
+
+    assert sorted(path.name for path in parsed_folder.iterdir()) == [
+        "a.json",
+        "b.json",
+    ]
+
+
+def test_evict_leaves_a_folder_under_the_limit_alone(parsed_folder):
+    for age, name in enumerate("abc"):
+        write_parsed(parsed_folder, name, 1_000_000 - age)
+
+    upload_cache.evict_parsed(keep=3)
+
+    assert len(list(parsed_folder.iterdir())) == 3
+
+
+def test_a_cache_hit_is_kept_over_newer_uploads(parsed_folder):
+    upload_hash = "0" * 64
+    write_parsed(parsed_folder, upload_hash, 1)
+    for age, name in enumerate("ab"):
+        write_parsed(parsed_folder, name, 1_000_000 - age)
+
+    parsed, cached = upload_cache.load_or_parse("unused.csv", upload_hash, "x.csv")
+    upload_cache.evict_parsed(keep=2)
+
+    assert cached is True
+    assert parsed == {}
+    assert sorted(path.name for path in parsed_folder.iterdir()) == [
+        f"{upload_hash}.json",
+        "a.json",
+    ]